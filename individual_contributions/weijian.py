@@ -28,23 +28,30 @@ def get_total(records, value_func):
     values = map(value_func, records)
     return reduce(lambda acc, x: acc + x, values)
 
-def find_max_recursive(data_list, key_func):
+def find_max_recursive(data_list, key_func, start=0, end=None):
     """
     Finds the item with the highest value recursively.
+    Splits the [start, end) range in halves, so it is only log2(n) calls deep and never copies the list.
     """
+    if end is None:
+        end = len(data_list)
+    if end - start < 1:
+        raise ValueError("find_max_recursive() of an empty list")
+
     # Base case: if only one item is left, it's the max
-    if len(data_list) == 1:
-        return data_list[0]
+    if end - start == 1:
+        return data_list[start]
     
-    # Recursive step: find max of the rest of the list
-    rest_max = find_max_recursive(data_list[1:], key_func)
-    current = data_list[0]
+    # Recursive step: find max of each half of the range
+    middle = (start + end) // 2
+    left_max = find_max_recursive(data_list, key_func, start, middle)
+    right_max = find_max_recursive(data_list, key_func, middle, end)
     
-    # Compare current item vs the max of the remaining items
-    if key_func(current) > key_func(rest_max):
-        return current
+    # Compare the max of both halves (on a tie the later item wins, the same as before)
+    if key_func(left_max) > key_func(right_max):
+        return left_max
     else:
-        return rest_max
+        return right_max
 
 # === Main Execution ===
 
@@ -7,6 +7,7 @@
 # More cleanup later
 
 from functools import reduce
+import heapq
 import re
 import csv
 
@@ -260,16 +261,16 @@ def main():
     # aggregate_product_result = zip(unique_product_values, sum_of_quantity_for_products, total_revenue_for_products)
     # We can't reuse the above collection to produce multiple sorted ones, cuz the first call to sorted() would exhaust the iterator for the collection already
     # making the next one return an [] empty list
-    # also use sorted() instead of list.sort() for immutability
-    sorted_product_aggregate_on_quantity = sorted(
+    # also use heapq.nlargest() instead of sorting every product, since only the top 3 are needed (same order as sorted(..., reverse=True)[:3])
+    sorted_product_aggregate_on_quantity = heapq.nlargest(
+        3,
         zip(product_unique_values, product_quantity_sum, product_total_revenue), 
-        key = lambda x: x[1], 
-        reverse=True
+        key = lambda x: x[1]
     )
-    sorted_product_aggregate_on_revenue = sorted(
+    sorted_product_aggregate_on_revenue = heapq.nlargest(
+        3,
         zip(product_unique_values, product_quantity_sum, product_total_revenue), 
-        key = lambda x: x[2], 
-        reverse=True
+        key = lambda x: x[2]
     ) 
 
     print("Top 3 best-selling products in terms of quantity sold across all citites")
@@ -1,90 +1,90 @@
-import csv
-from functools import reduce
-import re
+from sales_data import create_analysis_context, fixed_to_float, QUANTITY_SCALE, REVENUE_SCALE
+from instrumentation import instrument_analysis, instrument_function
 
-# === Helper Functions ===
+# The only columns the analysis reads, the others are never sanitised or kept when loading the file on its own
+REQUIRED_COLUMNS = ("Product", "Price", "Quantity")
 
-def load_csv_file(filename):
-    """ Reads the CSV file directly. """
-    with open(filename, 'r') as f:
-        reader = csv.DictReader(f)
-        # Return headers and data list directly
-        return reader.fieldnames, list(reader)
+# === Helper Functions ===
 
-def clean_text(text):
-    """ Removes extra spaces from strings. """
-    return " ".join(re.split(r"\s+", text)).strip()
+@instrument_function("Question1", "filter construction")
+def get_product_filters(context):
+    """ Returns the sorted product names and the filter function of each one, from the filter registry of the context. """
+    # The registry builds one filter function per unique product (once, then shared with the other analyses)
+    product_filters = dict(zip(context["get_unique_values"]("Product"), context["get_value_filter_functions"]("Product")))
+    products = sorted(product_filters)
+    return products, list(map(lambda prod_name: product_filters[prod_name], products))
 
-def get_product_filter(prod_name):
-    """ Returns a function that filters data for a specific product name. """
-    # This closure 'remembers' the product name
-    return lambda data_list: list(filter(lambda x: x["Product"] == prod_name, data_list))
+@instrument_function("Question1", "filtering", len)
+def apply_filter(data_list, filter_func):
+    """ Applies a filter function to the data, returning the matching records. """
+    return filter_func(data_list)
 
-def get_total(records, value_func):
-    """ Calculates sum of a specific field using map and reduce. """
+@instrument_function("Question1", "calculate_totals", len)
+def get_total(records, total_func):
+    """ Calculates the (fixed-point) sum of a specific field with a total function of the context. """
     if not records:
-        return 0.0
-    # Map the records to values, then reduce to a sum
-    values = map(value_func, records)
-    return reduce(lambda acc, x: acc + x, values)
+        return 0
+    # The context sums the field of the records (map & reduce over dictionaries, or a column of a table)
+    return total_func(records)
 
-def find_max_recursive(data_list, key_func):
+def find_max_recursive(data_list, key_func, start=0, end=None):
     """
     Finds the item with the highest value recursively.
+    Splits the [start, end) range in halves, so it is only log2(n) calls deep and never copies the list.
     """
+    if end is None:
+        end = len(data_list)
+    if end - start < 1:
+        raise ValueError("find_max_recursive() of an empty list")
+
     # Base case: if only one item is left, it's the max
-    if len(data_list) == 1:
-        return data_list[0]
+    if end - start == 1:
+        return data_list[start]
     
-    # Recursive step: find max of the rest of the list
-    rest_max = find_max_recursive(data_list[1:], key_func)
-    current = data_list[0]
+    # Recursive step: find max of each half of the range
+    middle = (start + end) // 2
+    left_max = find_max_recursive(data_list, key_func, start, middle)
+    right_max = find_max_recursive(data_list, key_func, middle, end)
     
-    # Compare current item vs the max of the remaining items
-    if key_func(current) > key_func(rest_max):
-        return current
+    # Compare the max of both halves (on a tie the later item wins, the same as before)
+    if key_func(left_max) > key_func(right_max):
+        return left_max
     else:
-        return rest_max
+        return right_max
 
 # === Main Execution ===
 
-def main():
+@instrument_analysis("Question1")
+def run_analysis(context):
+    """ Answers Question 1 from the data loaded by create_analysis_context(). """
     # 1. Load Data
-    # Separating function (load_csv_file) from data
-    headers, raw_rows = load_csv_file("restaurant_sales_data.csv")
+    # 2. Clean Data
+    # The rows come from the shared context, already cleaned
+    clean_rows = context["data"]
     
-    if not raw_rows:
+    if not clean_rows:
         return
-
-    # 2. Clean Data
-    # Using list comprehension to clean every value in the dictionary
-    clean_rows = [
-        {clean_text(k): clean_text(v) for k, v in row.items()} 
-        for row in raw_rows
-    ]
     
     # 3. Get List of Unique Products
-    products = sorted(list(set(map(lambda x: x["Product"], clean_rows))))
+    # 4. Create Filter Functions
+    # A list of functions (one for each product), from the filter registry of the context
+    products, filters = get_product_filters(context)
     
     print(f"--- Restaurant Sales Analysis ---")
     print(f"Processing {len(products)} unique product categories...\n")
     
-    # 4. Create Filter Functions
-    # Making a list of functions (one for each product)
-    filters = list(map(get_product_filter, products))
-    
     # 5. Apply Filters
     # Map the filter functions to the data to get groups
-    grouped_data = list(map(lambda f: f(clean_rows), filters))
+    grouped_data = list(map(lambda f: apply_filter(clean_rows, f), filters))
     
     # 6. Calculate Totals
-    # Define simple lambdas to extract the numbers we need
-    get_qty = lambda r: float(r["Quantity"])
-    get_rev = lambda r: float(r["Price"]) * float(r["Quantity"])
+    # The numbers are summed exactly as fixed-point integers, and only the totals are converted back to float
+    get_qty = context["get_total_quantity_fixed"]
+    get_rev = context["get_total_revenue_fixed"]
     
     # Map our calculation function across the grouped data
-    total_qtys = list(map(lambda rows: get_total(rows, get_qty), grouped_data))
-    total_revs = list(map(lambda rows: get_total(rows, get_rev), grouped_data))
+    total_qtys = list(map(lambda rows: fixed_to_float(get_total(rows, get_qty), QUANTITY_SCALE), grouped_data))
+    total_revs = list(map(lambda rows: fixed_to_float(get_total(rows, get_rev), REVENUE_SCALE), grouped_data))
     
     # Combine results into tuples: (Product, Quantity, Revenue)
     results = list(zip(products, total_qtys, total_revs))
@@ -115,8 +115,13 @@ def main():
     # For outlier in Products' Prices
     print("\nProducts' Unique Prices")
     print(products)
-    unique_prices = list(map(lambda record: set((entry["Price"]) for entry in record), grouped_data))
+    unique_prices = list(map(lambda record: set(context["get_field_values"](record, "Price")), grouped_data))
     print(unique_prices)
 
+def main():
+    # Separating function (create_analysis_context) from data, the rows come back already cleaned
+    # (header keys once per file, repeated values through a cache)
+    run_analysis(create_analysis_context("restaurant_sales_data.csv", REQUIRED_COLUMNS))
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
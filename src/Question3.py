@@ -5,37 +5,15 @@
 
 
 from functools import reduce
-import re
-import csv
 
-
-def parse_CSV(path):
-    """
-    Parse a CSV file given a file path
-
-    :param path: The file path to the CSV file
-    :return: A tuple of two elements, (a list of headers, a list of dictionaries containing the data)
-    """
-    read_dictionary = csv.DictReader(open(path))
-    return (read_dictionary.fieldnames, list(read_dictionary))
+from instrumentation import instrument_analysis, instrument_function, timed_stage
+from sales_data import (
+    create_analysis_context, fixed_to_float, get_record_quantity_fixed, get_total_revenue_fixed, QUANTITY_SCALE, REVENUE_SCALE,
+)
 
 
-def sanitise_data_input(entry: str):
-    """
-    Sanitise the input string parameter
-
-    :param entry: A string to be sanitised
-    :return: A string argument, with any leading & trailing whitespaces removed and also any additional whitespaces between words removed
-
-    Example:
-    Pass in: "   Hello   World!        "
-    Returns: "Hello World!"
-    """
-
-    # Split the input string based on 1 or more whitespaces "\s+" to obtain an array of strings that form the words in the input
-    # Join the list of strings with a single whitespace as the delimiter, thereby eliminating additional whitespaces in between
-    # Strip() on the resultant string to remove leading & trailing whitespaces
-    return " ".join(re.split("\s+", entry)).strip()
+# The only columns the analysis reads, the others are never sanitised or kept when loading the file on its own
+REQUIRED_COLUMNS = ("Manager", "Price", "Quantity")
 
 
 def calculate_sum(accumulator, value):
@@ -50,164 +28,87 @@ def calculate_total_quantity(record):
     Calculate the total quantity from the "Quantity" field/header from the record parameter
 
     :param record: A collection in the form of list of dictionaries like [{...}, {....}, {....}]
-    :return: The sum of values (in float) for the "Quantity" header for all dictionaries in the collection
+    :return: The sum of values (in float, summed exactly in fixed-point) for the "Quantity" header for all dictionaries in the collection
     """
-    return reduce(calculate_sum, [float(entry["Quantity"]) for entry in record])
+    return fixed_to_float(reduce(calculate_sum, [get_record_quantity_fixed(entry) for entry in record]), QUANTITY_SCALE)
 
 
-def calculate_total_revenue(record):
+@instrument_function("Question3", "calculate_total_revenue", len)
+def calculate_total_revenue(record, get_total_fixed=get_total_revenue_fixed):
     """
     Calculate the total revenue by summing the products of the values for "Quantity" and "Price" from the record parameter
 
-    :param record: A collection in the form of list of dictionaries like [{...}, {...}, {...}]
-    :return: The sum of revenue for all dictionaries in the collection, or 0 if 'record' is an empty collection
+    :param record: A collection in the form of list of dictionaries like [{...}, {...}, {...}] (or of row positions of a columnar table)
+    :param get_total_fixed: The function summing the revenue of the collection in fixed-point, the "get_total_revenue_fixed" of the context the records come from
+    :return: The sum of revenue (in float, summed exactly in fixed-point) for all dictionaries in the collection, or 0 if 'record' is an empty collection
     """
     if len(record) > 0:
-        return reduce(
-            calculate_sum,
-            [float(entry["Quantity"]) * float(entry["Price"]) for entry in record],
-        )
+        return fixed_to_float(get_total_fixed(record), REVENUE_SCALE)
     return 0
 
 
-"""
-This function is used to create various functions to be applied to the csv data for filtering purposes
-
-Function currying is utilised, where the outer function(?) returns another function reference to be applied for
-more specification of the filtering criteria
-
-create_filter_function_by_header() is to designate the header (or column of the csv file) where the filtering is to be performed.
-create_filter_function_by_value() is to designate the value to be compared against the entries of the csv file to filter the records.
-get_filtered_list() is the actual function that returns the actual filtered list based on the specified predicates/criteria
-"""
-
-
-def create_filter_function_by_header(header):
-    """
-    Create a function to filter the data of the csv file based on the designated header
-
-    :param header: The header to be used as a predicate for filtering the records
-    :return: A function for filtering the data of the csv file based on the designated value
-    """
-
-    def create_filter_function_by_value(value):
-        """
-        Create a function to filter the data of the csv file based on the designated value
-
-        :param value: The value to be used as a predicate for filtering the records
-        :return: A function to obtain a list of dictionaries containing the filtered records
-        """
-
-        def get_filtered_list(data):
-            """
-            Filter the data parameter (list of dictionaries) based on the predicates designated by the two outer functions
-
-            :param data: The data of the csv file to be filtered (in the form of a list of dictionaries)
-            :return: A list of dictionaries containing only the records for the designated header and value
-            """
-            return list((filter(lambda x: x[header] == value, data)))
-
-        return get_filtered_list
-
-    return create_filter_function_by_value
-
-
-# An exception to the primary data filtering approach, as it uses a different predicate for comparing the entries
-# It filters on the "Date" field based on the specified month, which is a specific slice from the string of the actual data entries
-def create_date_filter_function_on_month(month):
-    """
-    Create a function to filter the data of the csv file on the "Date" field, based on the designated month value
-
-    :param month: The month value to be used as a predicate for filtering the records
-    :return: A function to obtain a list of dictionaries containing the filtered records
-    """
-
-    def get_filtered_list(data):
-        """
-        Filter the data parameter based on the 'month' predicated designated by the outer function
-
-        :param data: The data of the csv file to be filtered (in the form of a list of dictionaries)
-        :return: A list of dictionaries containing only the records for the designated header and value
-        """
-        return list(
-            filter(lambda record: int(record["Date"][3:5]) == int(month), data)
-        )  # or just compare the string?
-
-    return get_filtered_list
-
-
 """ These two functions are extracted to fulfill the recursive requirement """
 
 
-def print_quantity_based_summary(zip_list):
+def print_quantity_based_summary(zip_list, start=0, end=None):
     """
     Print a summary based on the "Quantity" header from the zip_list parameter recursively
+
+    The recursion splits the [start, end) range of zip_list in halves instead of slicing off the first element, so it is
+    only log2(n) calls deep and never copies the list (safe for thousands of groups, like grouping by "Date")
     """
-    if len(zip_list) == 0:
+    if end is None:
+        print_quantity_based_summary(zip_list, 0, len(zip_list))
         print()
-    else:
-        print(f"{zip_list[0][0]}: {zip_list[0][1]:.2f} units sold")
-        print_quantity_based_summary(zip_list[1:])
+    elif end - start == 1:
+        print(f"{zip_list[start][0]}: {zip_list[start][1]:.2f} units sold")
+    elif end - start > 1:
+        middle = (start + end) // 2
+        print_quantity_based_summary(zip_list, start, middle)
+        print_quantity_based_summary(zip_list, middle, end)
 
 
-def print_revenue_based_summary(zip_list):
+def print_revenue_based_summary(zip_list, start=0, end=None):
     """
     Print a summary based on the calculated revenue from the zip_list parameter recursively
+
+    Same as print_quantity_based_summary(), the [start, end) range is split in halves to keep the recursion shallow
     """
-    if len(zip_list) == 0:
+    if end is None:
+        print_revenue_based_summary(zip_list, 0, len(zip_list))
         print()
-    else:
-        print(f"{zip_list[0][0]}: ${zip_list[0][1]:.2f} generated")
-        print_revenue_based_summary(zip_list[1:])
+    elif end - start == 1:
+        print(f"{zip_list[start][0]}: ${zip_list[start][1]:.2f} generated")
+    elif end - start > 1:
+        middle = (start + end) // 2
+        print_revenue_based_summary(zip_list, start, middle)
+        print_revenue_based_summary(zip_list, middle, end)
 
 
-def main():
-
-    header, data = parse_CSV("restaurant_sales_data.csv")
-    sanitised_data = [
-        {
-            sanitise_data_input(key): sanitise_data_input(value)
-            for key, value in record.items()
-        }
-        for record in data
-    ]
-
-    # Overall Summary
-    # print_list = apply_function_for_list(print)
-    # map(print_list, header)
-    print("Header of the dataset")
-    print("---------------------")
-    print(*header, sep=" | ")
-    print()
+@instrument_analysis("Question3")
+def run_analysis(context):
+    """
+    Answer Question 3 (revenue generated by each manager) from the loaded context
 
-    # Dict of header -> set of unique values of the column
-    header_to_values = {
-        h: set([record[h] for record in sanitised_data]) for h in header
-    }
-    # List of filter functions on header
-    header_filter_functions = list(map(create_filter_function_by_header, header))
-    # Dict of header to the respective filter function on header
-    header_to_header_filter_func = {
-        header_key: header_func
-        for header_key, header_func in zip(header, header_filter_functions)
-    }
-    # Dict of header to the respective list of filter functions on their unique values
-    header_to_unique_value_filter_func = {
-        key: list(map(value, header_to_values[key]))
-        for key, value in header_to_header_filter_func.items()
-    }
-    # Function variable(?) for mapping
-    filter_from_dataset = lambda func: func(sanitised_data)
+    :param context: The dataset loaded by create_analysis_context(), shared with the other questions
+    """
+    sanitised_data = context["data"]
+    if not sanitised_data:
+        return
 
     """ Question 3: Who is the best performing manager in terms of revenue """
     print("Analysis based on Manager")
     print("-------------------------")
 
-    manager_unique_values = header_to_values["Manager"]
-    manager_filtered_records = list(
-        map(filter_from_dataset, header_to_unique_value_filter_func["Manager"])
+    # Dict of manager -> list of records for the manager, grouped in a single pass over the dataset (by the context, so
+    # the analysis runs on a columnar table as well)
+    with timed_stage("Question3", "filtering", len(sanitised_data)):
+        manager_grouped_records = context["group_by_header"]("Manager")(sanitised_data)
+    manager_unique_values = list(manager_grouped_records.keys())
+    manager_filtered_records = list(manager_grouped_records.values())
+    manager_total_revenue = list(
+        map(lambda records: calculate_total_revenue(records, context["get_total_revenue_fixed"]), manager_filtered_records)
     )
-    manager_total_revenue = list(map(calculate_total_revenue, manager_filtered_records))
     manager_revenue_pairs = list(zip(manager_unique_values, manager_total_revenue))
 
     print("Managers employed by the restaurant company: ")
@@ -225,5 +126,22 @@ def main():
     )
 
 
+def main():
+
+    # Header keys are sanitised once for the file, and repeated values are sanitised once through a cache
+    context = create_analysis_context("restaurant_sales_data.csv", REQUIRED_COLUMNS)
+    header = context["header"]
+
+    # Overall Summary
+    # print_list = apply_function_for_list(print)
+    # map(print_list, header)
+    print("Header of the dataset")
+    print("---------------------")
+    print(*header, sep=" | ")
+    print()
+
+    run_analysis(context)
+
+
 if __name__ == "__main__":
     main()
@@ -1,37 +1,51 @@
-import csv
 from functools import reduce
-import re
+
+from sales_data import create_analysis_context
+from instrumentation import instrument_analysis, instrument_function
+
+
+# The only columns the analysis reads, the others are never sanitised or kept when loading the file on its own
+REQUIRED_COLUMNS = ("Payment Method", "Purchase Type")
 
 
 # Concept: Separating functions and data
-def parse_CSV(path):
+# The records come back already sanitised (header keys once per file, repeated values through a cache)
+def load_context(path):
     try:
-        with open(path, mode='r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            return (reader.fieldnames, [row for row in reader])
+        return create_analysis_context(path, REQUIRED_COLUMNS)
     except FileNotFoundError:
         print(f"Error: File {path} not found.")
-        return ([], [])
+        return {"path": path, "header": [], "data": []}
 
 
-# Concept: Pure function
-def sanitise_data_input(entry):
-    if entry is None:
-        return ""
-    return " ".join(re.split(r"\s+", str(entry))).strip()
+# Concept: Returning functions
+# The filter registry of the context builds one filter function per unique value of the column (once, then shared)
+@instrument_function("Question4", "filter construction")
+def get_filter_functions(context, column):
+    value_to_filter = dict(zip(context["get_unique_values"](column), context["get_value_filter_functions"](column)))
+    unique_values = sorted(value_to_filter)
+    return unique_values, list(map(lambda val: value_to_filter[val], unique_values))
 
 
-# Concept: Returning functions
-def create_filter_function(column, value):
-    return lambda data: list(filter(lambda row: row.get(column, "") == value, data))  # Concept: Lambdas + Filtering
+@instrument_function("Question4", "filtering", len)
+def apply_filter(data, filter_func):
+    return filter_func(data)
 
 
 # Concept: Recursion
-def recursive_find_best(items, compare_func):
-    if len(items) == 1:
-        return items[0]
-    rest_best = recursive_find_best(items[1:], compare_func)
-    return compare_func(items[0], rest_best)
+# Divide & conquer on the [start, end) range of items: log2(n) deep and no copies of the list, unlike recursing on items[1:]
+def recursive_find_best(items, compare_func, start=0, end=None):
+    if end is None:
+        end = len(items)
+    if end - start < 1:
+        raise ValueError("recursive_find_best() of an empty list")
+    if end - start == 1:
+        return items[start]
+    middle = (start + end) // 2
+    return compare_func(
+        recursive_find_best(items, compare_func, start, middle),
+        recursive_find_best(items, compare_func, middle, end),
+    )
 
 
 # Concept: Reducing
@@ -39,34 +53,23 @@ def calculate_sum(acc, val):
     return acc + val
 
 
-def main():
-    import os
-    csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_sales_data.csv") \
-        if '__file__' in globals() else "restaurant_sales_data.csv"
-
-    header, raw_data = parse_CSV(csv_path)
-    if not raw_data:
+# Concept: Separating functions and data (the data comes from the context shared with the other questions)
+@instrument_analysis("Question4")
+def run_analysis(context):
+    data = context["data"]
+    if not data:
         return
 
-    # Concept: List Comprehension
-    data = [
-        {sanitise_data_input(k): sanitise_data_input(v) for k, v in record.items()}
-        for record in raw_data
-    ]
-
     categories = ["Payment Method", "Purchase Type"]
 
     for category in categories:
         print(f"\n=== CUSTOMER PREFERENCE BY {category.upper()} ===")
 
-        # Concept: Mapping
-        unique_values = sorted(list(set(map(lambda r: r.get(category, ""), data))))
-
-        # Concept: Creating a list of functions
-        filter_funcs = list(map(lambda val: create_filter_function(category, val), unique_values))
+        # Concept: Creating a list of functions (one for each unique value)
+        unique_values, filter_funcs = get_filter_functions(context, category)
 
         # Concept: Passing functions as arguments
-        grouped_data = list(map(lambda func: func(data), filter_funcs))
+        grouped_data = list(map(lambda func: apply_filter(data, func), filter_funcs))
 
         # Concept: Mapping
         counts = list(map(len, grouped_data))
@@ -89,7 +92,13 @@ def main():
             print(f"{val:15} | {count:4d} customers | {pct:6.2f}%")
 
 
+def main():
+    import os
+    csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_sales_data.csv") \
+        if '__file__' in globals() else "restaurant_sales_data.csv"
+
+    run_analysis(load_context(csv_path))
+
 
 if __name__ == "__main__":
     main()
-
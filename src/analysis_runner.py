@@ -0,0 +1,301 @@
+'''
+Single entry point to run any of the five questions against the same dataset
+
+Running Question1.py to Question5.py one after another parses & sanitises the csv file five times. Here the file is
+loaded once with create_analysis_context() and the same context is passed to the run_analysis() of every selected
+question (or, with --columnar, the same run_analysis() of every selected question runs on the columnar table of the
+file instead of its records, with --stream, every selected question is printed from the aggregates of a single
+streamed pass, with --snapshot, from the columnar table memory-mapped from its snapshot file, with --cube, from the
+roll-ups of the saved cube, and with --cache, from the results of the previous runs as long as the columns they read
+are unchanged).
+
+Usage: python analysis_runner.py [--path PATH] [--questions 1 2 5] [--columnar | --stream | --snapshot | --cube | --cache] [--instrument [OUTPUT]]
+       [--where HEADER=VALUE[,VALUE...]] [--from-date DAY] [--to-date DAY]
+'''
+
+from datetime import date
+from functools import reduce
+import argparse
+
+from instrumentation import enable_instrumentation, timed_stage
+
+from columnar import parse_CSV_columnar
+from sales_data import create_analysis_context, create_value_filter, parse_CSV_stream, combine_accumulators
+from pipeline import check_condition_headers, parse_condition
+from time_index import create_date_range_filter
+import Question1
+import Question2
+import Question3
+import Question4
+import Question5
+import cube
+import result_cache
+import snapshot
+import stream_analysis
+import vectorized
+
+# Dict of question number -> function answering the question from a loaded context
+question_analyses = {
+    1: Question1.run_analysis,
+    2: Question2.run_analysis,
+    3: Question3.run_analysis,
+    4: Question4.run_analysis,
+    5: Question5.run_analysis,
+}
+
+# Dict of question number -> the columns its analysis reads
+question_columns = {
+    1: Question1.REQUIRED_COLUMNS,
+    2: Question2.REQUIRED_COLUMNS,
+    3: Question3.REQUIRED_COLUMNS,
+    4: Question4.REQUIRED_COLUMNS,
+    5: Question5.REQUIRED_COLUMNS,
+}
+
+def get_required_columns(questions):
+    '''
+    Get the columns read by any of the selected questions, so the other columns are never sanitised or kept
+
+    :param questions: A list of question numbers (1 - 5)
+    :return: A list of headers, in no particular order
+    '''
+    return list(set().union(*(question_columns[question] for question in questions)))
+
+def create_field_filters(where, first_day=None, last_day=None):
+    '''
+    Create the field filters pushed down into the csv reader from the command line conditions
+
+    :param where: A list of (header, set of values) tuples from --where
+    :param first_day: The first day to keep, like "2022-11-07" (optional)
+    :param last_day: The last day to keep (optional)
+    :return: A dictionary of header -> predicate on the sanitised value (see parse_CSV_sanitised())
+    '''
+    field_filters = {header: create_value_filter(values) for header, values in where}
+    if first_day or last_day:
+        field_filters["Date"] = create_date_range_filter(first_day, last_day)
+    return field_filters
+
+def parse_day(text):
+    '''
+    Parse a --from-date / --to-date day like "2022-11-07", keeping it as text (see time_index.create_date_range_filter())
+    '''
+    try:
+        date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a day like 2022-11-07, not {text!r}") from None
+    return text
+
+def run_selected_analyses(context, questions):
+    '''
+    Run the analyses of the selected questions against the same loaded context
+
+    :param context: The dataset loaded by create_analysis_context()
+    :param questions: A list of question numbers (1 - 5), run in the given order
+    '''
+    for question in questions:
+        question_analyses[question](context)
+        print()
+
+def run_selected_columnar_analyses(path, questions):
+    '''
+    Parse the csv file into its columnar table and run the analyses of the selected questions on the table context
+    (summing the quantities & revenues with the vectorized totals of vectorized.py)
+
+    :param path: The file path to the CSV file
+    :param questions: A list of question numbers (1 - 5), run in the given order
+    '''
+    with timed_stage("analysis_runner", "columnar load") as stage:
+        table = parse_CSV_columnar(path)
+        stage["rows"] = table["length"]
+    if table["length"] == 0:
+        print(f"No records found in {path}")
+        return
+    run_selected_analyses(vectorized.create_table_context(path, table), questions)
+
+def print_selected_aggregates(aggregates, questions):
+    '''
+    Print the selected questions from the aggregates of stream_analysis.py (or of the same form), timing each one as "printing"
+    '''
+    for question in questions:
+        with timed_stage("analysis_runner", "printing"):
+            stream_analysis.question_printers[question](aggregates)
+
+def run_selected_stream_analyses(path, questions, field_filters=None):
+    '''
+    Stream the csv file once and print the selected questions from the aggregates of that single pass
+
+    :param path: The file path to the CSV file
+    :param questions: A list of question numbers (1 - 5), printed in the given order
+    :param field_filters: An optional dictionary of header -> predicate on the sanitised value, the rows failing any of them are skipped
+    '''
+    # The records are read & sanitised while they are aggregated, so this stage includes the "sanitise" stage of sales_data
+    with timed_stage("analysis_runner", "stream aggregation"):
+        records = parse_CSV_stream(path, field_filters=field_filters)
+        aggregates = reduce(combine_accumulators(stream_analysis.question_accumulators), records, {})
+    if not aggregates:
+        print(f"No records found in {path}")
+        return
+    with timed_stage("analysis_runner", "finalise aggregates"):
+        totals = stream_analysis.finalise_aggregates(aggregates)
+    print_selected_aggregates(totals, questions)
+
+def run_selected_snapshot_analyses(path, questions):
+    '''
+    Load the columnar table from its snapshot (rebuilt if the csv file changed) and print the selected questions from it
+
+    :param path: The file path to the CSV file
+    :param questions: A list of question numbers (1 - 5), printed in the given order
+    '''
+    with timed_stage("analysis_runner", "snapshot load") as stage:
+        table = snapshot.load_table(path)
+        stage["rows"] = table["length"]
+    if table["length"] == 0:
+        print(f"No records found in {path}")
+        return
+    with timed_stage("analysis_runner", "vectorized aggregation", table["length"]):
+        aggregates = vectorized.get_question_aggregates(table)
+    with timed_stage("analysis_runner", "finalise aggregates"):
+        totals = stream_analysis.finalise_aggregates(aggregates)
+    print_selected_aggregates(totals, questions)
+
+def run_selected_cube_analyses(path, questions):
+    '''
+    Load the cube of the csv file (rebuilt if the file changed) and print the selected questions from its roll-ups
+
+    :param path: The file path to the CSV file
+    :param questions: A list of question numbers (1 - 5), printed in the given order
+    '''
+    with timed_stage("analysis_runner", "cube load") as stage:
+        sales_cube = cube.load_cube(path)
+        stage["rows"] = len(sales_cube["cells"])
+    if not sales_cube["cells"]:
+        print(f"No records found in {path}")
+        return
+    with timed_stage("analysis_runner", "cube roll-up", len(sales_cube["cells"])):
+        aggregates = cube.get_question_aggregates(sales_cube)
+    print_selected_aggregates(aggregates, questions)
+
+def get_cache_requests(questions, where, first_day=None, last_day=None):
+    '''
+    Get the parameters and the columns keying the cached result of each selected question
+
+    :param questions: A list of question numbers (1 - 5)
+    :param where: A list of (header, set of values) tuples from --where
+    :param first_day: The first day to keep, like "2022-11-07" (optional)
+    :param last_day: The last day to keep (optional)
+    :return: A dictionary of analysis name (like "question_3") -> (parameters, columns), see result_cache.memoize_results()
+    '''
+    parameters = {"where": sorted([header, sorted(values)] for header, values in where), "from_date": first_day, "to_date": last_day}
+    # The columns filtered on change the result as much as the columns the question reads
+    filter_columns = {header for header, _ in where} | ({"Date"} if first_day or last_day else set())
+    return {f"question_{question}": (parameters, set(question_columns[question]) | filter_columns) for question in questions}
+
+def run_selected_cached_analyses(path, questions, where, first_day=None, last_day=None):
+    '''
+    Print the selected questions from their cached results, streaming the csv file once for the ones not cached (or
+    whose columns changed since they were cached)
+
+    :param path: The file path to the CSV file
+    :param questions: A list of question numbers (1 - 5), printed in the given order
+    :param where: A list of (header, set of values) tuples from --where
+    :param first_day: The first day to keep, like "2022-11-07" (optional)
+    :param last_day: The last day to keep (optional)
+    '''
+    question_numbers = {f"question_{question}": question for question in questions}
+
+    def compute_missing(names):
+        '''
+        Stream the csv file once into the aggregates of the missing questions, keeping only those of each question
+        '''
+        aggregate_names = {
+            aggregate_name
+            for name in names
+            for aggregate_name in stream_analysis.question_aggregate_names[question_numbers[name]]
+        }
+        # The derived aggregates (like the "total_revenue" of Question 5) are added by finalise_aggregates()
+        accumulators = {
+            name: accumulator for name, accumulator in stream_analysis.question_accumulators.items() if name in aggregate_names
+        }
+        with timed_stage("analysis_runner", "stream aggregation"):
+            records = parse_CSV_stream(path, field_filters=create_field_filters(where, first_day, last_day))
+            totals = stream_analysis.finalise_aggregates(reduce(combine_accumulators(accumulators), records, {}))
+        return {
+            name: {
+                aggregate_name: totals[aggregate_name]
+                for aggregate_name in stream_analysis.question_aggregate_names[question_numbers[name]]
+            } if totals else None
+            for name in names
+        }
+
+    # The results missing from the cache are computed inside this stage (as a "stream aggregation" stage)
+    with timed_stage("analysis_runner", "cache lookup"):
+        cache = result_cache.create_result_cache(path)
+        results = result_cache.memoize_results(cache, get_cache_requests(questions, where, first_day, last_day), compute_missing)
+    for question in questions:
+        aggregates = results[f"question_{question}"]
+        if aggregates is None:
+            print(f"No records found in {path}")
+            return
+        print_selected_aggregates(aggregates, [question])
+
+def parse_arguments(argv=None):
+    '''
+    Parse the command line arguments of the runner
+
+    :param argv: The list of arguments (sys.argv[1:] when omitted)
+    :return: The parsed arguments, with "path", "questions", "columnar", "stream", "snapshot", "cube", "cache", "instrument", "where", "from_date" and "to_date"
+    '''
+    parser = argparse.ArgumentParser(description="Run the restaurant sales analyses (Questions 1 - 5) on a dataset loaded once")
+    parser.add_argument("--path", default="restaurant_sales_data.csv", help="path to the csv file (default: %(default)s)")
+    parser.add_argument(
+        "--questions", type=int, nargs="+", choices=sorted(question_analyses), default=sorted(question_analyses),
+        help="questions to run, in order (default: all)",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--columnar", action="store_true", help="run the questions on the columnar (typed) table of the file")
+    mode.add_argument("--stream", action="store_true", help="stream the file in a single pass at constant memory")
+    mode.add_argument("--snapshot", action="store_true", help="use the cached binary snapshot of the file (rebuilt when the file changes)")
+    parser.add_argument("--where", type=parse_condition, action="append", default=[], help="keep only the rows with HEADER=VALUE[,VALUE...] (repeatable)")
+    parser.add_argument("--from-date", type=parse_day, default=None, help="keep only the rows from this day on, like 2022-11-07")
+    parser.add_argument("--to-date", type=parse_day, default=None, help="keep only the rows up to this day, like 2022-11-30")
+    mode.add_argument("--cube", action="store_true", help="use the saved cube of the file (rebuilt when the file changes)")
+    mode.add_argument("--cache", action="store_true", help="reuse the results of the previous runs whose columns did not change")
+    parser.add_argument(
+        "--instrument", nargs="?", const="-", default=None, metavar="OUTPUT",
+        help="time every stage and write a JSON summary at exit, appended to OUTPUT (stderr when omitted)",
+    )
+    arguments = parser.parse_args(argv)
+    if (arguments.where or arguments.from_date or arguments.to_date) and (arguments.columnar or arguments.snapshot or arguments.cube):
+        parser.error("--where, --from-date and --to-date cannot be used with --columnar, --snapshot or --cube")
+    if arguments.from_date and arguments.to_date and arguments.from_date > arguments.to_date:
+        parser.error("--from-date must not be after --to-date")
+    check_condition_headers(parser, arguments.path, arguments.where)
+    return arguments
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    if arguments.instrument:
+        enable_instrumentation(arguments.instrument)
+    # The rows failing a condition are dropped while reading, before a dictionary is built for them
+    field_filters = create_field_filters(arguments.where, arguments.from_date, arguments.to_date)
+
+    if arguments.columnar:
+        run_selected_columnar_analyses(arguments.path, arguments.questions)
+    elif arguments.stream:
+        run_selected_stream_analyses(arguments.path, arguments.questions, field_filters)
+    elif arguments.snapshot:
+        run_selected_snapshot_analyses(arguments.path, arguments.questions)
+    elif arguments.cube:
+        run_selected_cube_analyses(arguments.path, arguments.questions)
+    elif arguments.cache:
+        run_selected_cached_analyses(arguments.path, arguments.questions, arguments.where, arguments.from_date, arguments.to_date)
+    else:
+        # Only the columns of the selected questions are sanitised
+        context = create_analysis_context(arguments.path, get_required_columns(arguments.questions), field_filters)
+        if not context["data"]:
+            print(f"No records found in {arguments.path}")
+            return
+        run_selected_analyses(context, arguments.questions)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+'''
+Synthetic datasets & a benchmark suite for the five questions
+
+restaurant_sales_data.csv only has 254 records, which says nothing about how the analyses scale. The generator here
+writes datasets in the same schema (and with the same quirks: fractional "Quantity", random whitespace in the
+"Manager" names, trailing/leading spaces in "Purchase Type"/"Payment Method", dates not in order) of any size, seeded
+so the same size & seed always gives the same file.
+
+Every stage of each engine is timed on its own, and reported with the rows per second and its peak memory:
+- "functional": the code of the question modules themselves, create_analysis_context() then the run_analysis() of
+  each of Question1.py to Question5.py (with their per-value filter functions, and the output thrown away)
+- "group-by": parse_CSV(), sanitising with create_record_sanitiser(), then for each question grouping with
+  create_group_by_function() and summing each group with reduce()
+- "columnar": parse_CSV_columnar() (which parses & sanitises at once), then for each question get_grouping_codes()
+  and aggregate_by_codes()
+- "vectorized": parse_CSV_columnar(), then the aggregates of every question at once with vectorized.py (NumPy when
+  it is installed, the columnar fallbacks otherwise)
+- "table": parse_CSV_columnar(), then the run_analysis() of each question module on vectorized.create_table_context(),
+  the same question code as "functional" reading the columns instead of a dictionary per record
+
+A new engine is compared against them by adding it to benchmark_engines.
+
+Usage: python benchmark.py [--sizes 10k 1M 10M] [--seed 13] [--engines functional group-by columnar vectorized table] [--directory benchmark_data]
+       [--json PATH]
+'''
+
+from contextlib import redirect_stdout
+from datetime import date
+from functools import reduce
+import argparse
+import csv
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from columnar import aggregate_by_codes, combine_grouping_codes, get_grouping_codes, get_revenue_column, parse_CSV_columnar
+from sales_data import (
+    calculate_sum, count_record, create_analysis_context, create_data_context, create_group_by_function, create_record_sanitiser,
+    get_month_from_date, get_month_from_record, get_record_quantity_fixed, get_record_revenue_fixed, parse_CSV,
+)
+import Question1
+import Question2
+import Question3
+import Question4
+import Question5
+import vectorized
+
+BENCHMARK_SIZES = {"10k": 10_000, "1M": 1_000_000, "10M": 10_000_000}
+DEFAULT_SEED = 13
+
+HEADER = ["Order ID", "Date", "Product", "Price", "Quantity", "Purchase Type", "Payment Method", "Manager", "City"]
+# The (product, price) pairs and the manager of each city, as in restaurant_sales_data.csv
+PRODUCT_PRICES = [
+    ("Beverages", "2.95"), ("Burgers", "12.99"), ("Chicken Sandwiches", "9.95"), ("Chicken Sandwiches", "29.05"),
+    ("Fries", "3.49"), ("Fries", "25.5"), ("Sides & Other", "4.99"),
+]
+CITY_MANAGERS = [
+    ("London", "Tom Jackson"), ("Madrid", "Pablo Perez"), ("Lisbon", "Joao Silva"), ("Berlin", "Walter Muller"), ("Paris", "Remy Monet"),
+]
+PURCHASE_TYPES = ["Online ", "In-store ", "Drive-thru "]
+PAYMENT_METHODS = [" Cash", " Gift Card", " Credit Card"]
+FIRST_ORDER_ID = 10452
+FIRST_DAY = date(2022, 11, 7).toordinal()
+# The synthetic orders are spread over about three years, so the monthly groupings cover several years
+SYNTHETIC_DAYS = 3 * 365
+QUANTITY_RANGE = (200.0, 760.0)
+
+def create_messy_name(name, rng):
+    '''
+    Add a random amount of whitespace around & inside a name, like "   Tom      Jackson" (sanitised back to "Tom Jackson")
+    '''
+    return " " * rng.randrange(8) + (" " * rng.randint(1, 7)).join(name.split(" ")) + " " * rng.randrange(3)
+
+def generate_sales_rows(row_count, seed=DEFAULT_SEED):
+    '''
+    Generate the rows of a synthetic dataset (in the same order as HEADER)
+
+    :param row_count: The number of rows to generate
+    :param seed: The seed of the random generator (the same seed always generates the same rows)
+    :return: A generator of lists of strings, one for each row
+    '''
+    rng = random.Random(seed)
+    for order_id in range(FIRST_ORDER_ID, FIRST_ORDER_ID + row_count):
+        product, price = rng.choice(PRODUCT_PRICES)
+        city, manager = rng.choice(CITY_MANAGERS)
+        order_day = date.fromordinal(FIRST_DAY + rng.randrange(SYNTHETIC_DAYS))
+        yield [
+            str(order_id),
+            order_day.strftime("%d-%m-%Y"),
+            product,
+            price,
+            # Quantity is a float in the original dataset too, with at most 2 decimals (like "200.4")
+            str(round(rng.uniform(*QUANTITY_RANGE), 2)),
+            rng.choice(PURCHASE_TYPES),
+            rng.choice(PAYMENT_METHODS),
+            create_messy_name(manager, rng) if rng.random() < 0.5 else manager,
+            city,
+        ]
+
+def write_synthetic_dataset(path, row_count, seed=DEFAULT_SEED):
+    '''
+    Write a synthetic dataset to a csv file (through a temporary file, so a half written dataset is never used)
+    '''
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(HEADER)
+        writer.writerows(generate_sales_rows(row_count, seed))
+    os.replace(temporary_path, path)
+
+def get_synthetic_dataset(directory, row_count, seed=DEFAULT_SEED):
+    '''
+    Get the path to the synthetic dataset of the designated size & seed, generating it on first use
+
+    :param directory: The directory the datasets are kept in
+    :param row_count: The number of rows of the dataset
+    :param seed: The seed of the dataset
+    :return: The file path to the csv file
+    '''
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"synthetic_sales_{row_count}_{seed}.csv")
+    if not os.path.exists(path):
+        write_synthetic_dataset(path, row_count, seed)
+    return path
+
+def create_stage_measurer(row_count, measure_memory=True):
+    '''
+    Create a function that runs a stage, times it, and records its result in a list of measurements
+
+    :param row_count: The number of rows of the dataset (for the rows per second)
+    :param measure_memory: Whether to run each stage a second time under tracemalloc for its peak memory (tracing
+                           slows the stage down, so it is never timed at the same time)
+    :return: A tuple of two elements, (a function (stage name, function) -> result of the function, the list of measurements)
+    '''
+    measurements = []
+
+    def measure(stage, function):
+        '''
+        Run the function of the stage (with no arguments), recording its wall & CPU time and peak memory
+        '''
+        peak_memory = None
+        if measure_memory:
+            tracemalloc.start()
+            function()
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        result = function()
+        wall_seconds, cpu_seconds = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+        measurements.append({
+            "stage": stage,
+            "rows": row_count,
+            "wall_seconds": wall_seconds,
+            "cpu_seconds": cpu_seconds,
+            "rows_per_second": row_count / wall_seconds if wall_seconds > 0 else None,
+            "peak_memory_bytes": peak_memory,
+        })
+        return result
+    return (measure, measurements)
+
+def sum_groups(groups, value_function):
+    '''
+    Sum value_function over the records of each group, like calculate_total_revenue() does for each filtered list
+    '''
+    return {group: reduce(calculate_sum, map(value_function, records), 0) for group, records in groups.items()}
+
+# Dict of question number -> function answering the question from a context (see analysis_runner.question_analyses)
+question_analyses = {
+    1: Question1.run_analysis,
+    2: Question2.run_analysis,
+    3: Question3.run_analysis,
+    4: Question4.run_analysis,
+    5: Question5.run_analysis,
+}
+
+def run_functional_benchmark(path, measure):
+    '''
+    Benchmark the question modules themselves (the list of dictionaries engine with per-value filter functions) on a csv file
+
+    :param path: The file path to the CSV file
+    :param measure: The function from create_stage_measurer()
+    '''
+    context = measure("load", lambda: create_analysis_context(path))
+
+    def run_question(question):
+        '''
+        Run the analysis of a question on a new context of the loaded data, so the filter functions & time index are
+        built inside the stage (as in a run of the question module), and throw its output away
+        '''
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            question_analyses[question](create_data_context(path, context["header"], context["data"]))
+
+    for question in question_analyses:
+        measure(f"Q{question} run_analysis", lambda: run_question(question))
+
+def run_table_benchmark(path, measure):
+    '''
+    Benchmark the question modules on the columnar table (vectorized.create_table_context()) on a csv file
+
+    :param path: The file path to the CSV file
+    :param measure: The function from create_stage_measurer()
+    '''
+    table = measure("parse + sanitise", lambda: parse_CSV_columnar(path))
+
+    def run_question(question):
+        '''
+        Run the analysis of a question on a new context of the table (like run_functional_benchmark()), and throw its output away
+        '''
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            question_analyses[question](vectorized.create_table_context(path, table))
+
+    for question in question_analyses:
+        measure(f"Q{question} run_analysis", lambda: run_question(question))
+
+# Dict of question number -> (key function to group the records by, value functions summed for each group)
+group_by_question_stages = {
+    1: (lambda record: record["Product"], (get_record_quantity_fixed, get_record_revenue_fixed)),
+    2: (lambda record: (record["City"], get_month_from_record(record)), (get_record_revenue_fixed,)),
+    3: (lambda record: record["Manager"], (get_record_revenue_fixed,)),
+    4: (lambda record: record["Payment Method"], (count_record,)),
+    5: (get_month_from_record, (get_record_revenue_fixed,)),
+}
+
+def run_group_by_benchmark(path, measure):
+    '''
+    Benchmark the group-by functions of sales_data.py on a csv file (one pass to group, then a sum for each group)
+
+    :param path: The file path to the CSV file
+    :param measure: The function from create_stage_measurer()
+    '''
+    header, rows = measure("parse", lambda: parse_CSV(path))
+    sanitise_record = create_record_sanitiser(header)
+    data = measure("sanitise", lambda: [sanitise_record(list(row.values())) for row in rows])
+    del rows
+
+    for question, (key_function, value_functions) in group_by_question_stages.items():
+        groups = measure(f"Q{question} group", lambda: create_group_by_function(key_function)(data))
+        measure(f"Q{question} aggregate", lambda: [sum_groups(groups, value_function) for value_function in value_functions])
+
+# Dict of question number -> (function table -> grouping, functions table -> weights summed for each group (None to count))
+columnar_question_stages = {
+    1: (lambda table: get_grouping_codes(table, "Product"), (lambda table: table["columns"]["Quantity"], get_revenue_column)),
+    2: (
+        lambda table: combine_grouping_codes(get_grouping_codes(table, "City"), get_grouping_codes(table, "Date", get_month_from_date)),
+        (get_revenue_column,),
+    ),
+    3: (lambda table: get_grouping_codes(table, "Manager"), (get_revenue_column,)),
+    4: (lambda table: get_grouping_codes(table, "Payment Method"), (lambda table: None,)),
+    5: (lambda table: get_grouping_codes(table, "Date", get_month_from_date), (get_revenue_column,)),
+}
+
+def run_columnar_benchmark(path, measure):
+    '''
+    Benchmark the columnar engine (columnar.py) on a csv file
+
+    :param path: The file path to the CSV file
+    :param measure: The function from create_stage_measurer()
+    '''
+    table = measure("parse + sanitise", lambda: parse_CSV_columnar(path))
+
+    for question, (grouping_function, weight_functions) in columnar_question_stages.items():
+        grouping = measure(f"Q{question} group", lambda: grouping_function(table))
+        measure(
+            f"Q{question} aggregate",
+            lambda: [aggregate_by_codes(*grouping, weight_function(table)) for weight_function in weight_functions],
+        )
+
+def run_vectorized_benchmark(path, measure):
+    '''
+    Benchmark the vectorized aggregates (vectorized.py) of every question on a csv file
+
+    :param path: The file path to the CSV file
+    :param measure: The function from create_stage_measurer()
+    '''
+    table = measure("parse + sanitise", lambda: parse_CSV_columnar(path))
+    measure("Q1-Q5 aggregate", lambda: vectorized.get_question_aggregates(table))
+
+# Dict of engine name -> function (path, measure) running every stage of the engine
+benchmark_engines = {
+    "functional": run_functional_benchmark,
+    "group-by": run_group_by_benchmark,
+    "columnar": run_columnar_benchmark,
+    "vectorized": run_vectorized_benchmark,
+    "table": run_table_benchmark,
+}
+
+def run_benchmarks(sizes, engines, seed=DEFAULT_SEED, directory="benchmark_data", measure_memory=True):
+    '''
+    Run the selected engines on the synthetic dataset of each selected size
+
+    :param sizes: A list of names of BENCHMARK_SIZES
+    :param engines: A list of names of benchmark_engines
+    :param seed: The seed of the synthetic datasets
+    :param directory: The directory the synthetic datasets are kept in
+    :param measure_memory: Whether to measure the peak memory of each stage
+    :return: A list of measurements (dictionaries), each with its "size" and "engine"
+    '''
+    results = []
+    for size in sizes:
+        row_count = BENCHMARK_SIZES[size]
+        path = get_synthetic_dataset(directory, row_count, seed)
+        for engine in engines:
+            measure, measurements = create_stage_measurer(row_count, measure_memory)
+            benchmark_engines[engine](path, measure)
+            results.extend({"size": size, "engine": engine, **measurement} for measurement in measurements)
+    return results
+
+def print_benchmark_results(results):
+    '''
+    Print the measurements as a table, one line for each stage
+    '''
+    print(f"{'size':>5} {'engine':<11} {'stage':<17} {'wall (s)':>9} {'cpu (s)':>9} {'rows/s':>13} {'peak memory':>13}")
+    for result in results:
+        rows_per_second = "-" if result["rows_per_second"] is None else f"{result['rows_per_second']:,.0f}"
+        peak_memory = "-" if result["peak_memory_bytes"] is None else f"{result['peak_memory_bytes'] / 2 ** 20:,.1f} MiB"
+        print(
+            f"{result['size']:>5} {result['engine']:<11} {result['stage']:<17} {result['wall_seconds']:>9.4f} "
+            f"{result['cpu_seconds']:>9.4f} {rows_per_second:>13} {peak_memory:>13}"
+        )
+
+def parse_arguments(argv=None):
+    '''
+    Parse the command line arguments of the benchmark suite
+
+    :param argv: The list of arguments (sys.argv[1:] when omitted)
+    :return: The parsed arguments, with "sizes", "seed", "engines", "directory", "json" and "no_memory"
+    '''
+    parser = argparse.ArgumentParser(description="Benchmark the restaurant sales analyses on seeded synthetic datasets")
+    parser.add_argument("--sizes", nargs="+", choices=list(BENCHMARK_SIZES), default=["10k"], help="dataset sizes (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seed of the synthetic datasets (default: %(default)s)")
+    parser.add_argument(
+        "--engines", nargs="+", choices=list(benchmark_engines), default=list(benchmark_engines), help="engines to compare (default: all)",
+    )
+    parser.add_argument("--directory", default="benchmark_data", help="directory of the synthetic datasets (default: %(default)s)")
+    parser.add_argument("--json", default=None, help="also write the measurements as JSON to this path")
+    parser.add_argument("--no-memory", action="store_true", help="skip the (slower) peak memory measurement of each stage")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    results = run_benchmarks(arguments.sizes, arguments.engines, arguments.seed, arguments.directory, not arguments.no_memory)
+    print_benchmark_results(results)
+    if arguments.json:
+        with open(arguments.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+'''
+Columnar (typed) loader for the sales data
+
+parse_CSV() gives a list of dictionaries where every field is a string, so every call to calculate_total_revenue()
+converts "Price" and "Quantity" again. parse_CSV_columnar() parses each column exactly once instead:
+
+- "Price" and "Quantity" are stored as array('q') of fixed-point integers (in cents & hundredths, see
+  FIXED_POINT_COLUMNS), so every sum over them is exact, the same as the fixed-point totals of the other paths
+- "Order ID" is stored as array('q') of integers
+- every other column ("Date", "Product", "Purchase Type", "Payment Method", "Manager", "City") is dictionary-encoded,
+  i.e. an array('i') of integer codes that index into a list of the unique (sanitised) values of the column
+
+The table itself is just a dictionary, like:
+{
+    "header": [...],
+    "length": number of records,
+    "columns": {header -> array},
+    "dictionaries": {header -> list of unique values (only for the dictionary-encoded columns)}
+}
+
+Every question can be answered from the table with get_grouping_codes() + aggregate_by_codes(), e.g.
+- Question 1: aggregate_by_codes(*get_grouping_codes(table, "Product"), table["columns"]["Quantity"]) (or get_revenue_column(table))
+- Question 2: same with "City", and combine_grouping_codes() with get_grouping_codes(table, "Date", sales_data.get_month_from_date) for the monthly revenue
+- Question 3: same with "Manager"
+- Question 4: aggregate_by_codes(*get_grouping_codes(table, "Payment Method")) without weights to count the records
+- Question 5: aggregate_by_codes(*get_grouping_codes(table, "Date", sales_data.get_month_from_date), get_revenue_column(table))
+
+The question modules themselves run on the table through create_table_context(), a context in the same form as the one
+of sales_data.create_analysis_context() whose records are the row positions of the table (range(length) for the
+whole table, then lists of positions once filtered or grouped). Its functions read the columns at those positions, so
+no dictionary is built for a record (grouping & filtering only work on the dictionary-encoded headers).
+'''
+
+from array import array
+from operator import mul
+import csv
+
+from sales_data import (
+    create_filter_registry, fixed_to_float, parse_fixed_point, sanitise_data_input, sanitise_categorical_input, PRICE_SCALE, QUANTITY_SCALE,
+)
+
+# Dict of header -> fixed-point scale of the typed columns stored as integers, any header not listed here (or in
+# INTEGER_COLUMNS) is dictionary-encoded
+FIXED_POINT_COLUMNS = {"Price": PRICE_SCALE, "Quantity": QUANTITY_SCALE}
+INTEGER_COLUMNS = ("Order ID",)
+
+def create_column_encoder():
+    '''
+    Create a function to dictionary-encode the values of a single column
+
+    :return: A tuple of two elements, (the encoding function, the list of unique values in order of their codes)
+    '''
+    value_to_code = {}
+    values = []
+    def encode(value):
+        '''
+        Get the integer code of the value parameter, assigning the next code if the value has not been seen yet
+        '''
+        code = value_to_code.get(value)
+        if code is None:
+            code = value_to_code[value] = len(values)
+            values.append(value)
+        return code
+    return (encode, values)
+
+def parse_CSV_columnar(path):
+    '''
+    Parse a CSV file given a file path into typed columns, sanitising and converting each field only once
+
+    Blank rows, and rows that do not have exactly one field per header, are skipped so every column has one value per record
+
+    :param path: The file path to the CSV file
+    :return: A dictionary describing the table (see the module docstring for its structure)
+    '''
+    with open(path, newline="", encoding="utf-8-sig") as csv_file:
+        reader = csv.reader(csv_file)
+        # An empty file gives an empty table (no header and no records)
+        header = [sanitise_data_input(h) for h in next(reader, [])]
+
+        columns = {}
+        dictionaries = {}
+        # One "append" function per column, so the conversion for each column is decided once rather than per field
+        appenders = []
+        for h in header:
+            if h in FIXED_POINT_COLUMNS:
+                columns[h] = array("q")
+                appenders.append(
+                    lambda field, column=columns[h], scale=FIXED_POINT_COLUMNS[h]: column.append(parse_fixed_point(field.strip(), scale))
+                )
+            elif h in INTEGER_COLUMNS:
+                columns[h] = array("q")
+                appenders.append(lambda field, column=columns[h]: column.append(int(field)))
+            else:
+                encode, dictionaries[h] = create_column_encoder()
+                columns[h] = array("i")
+                appenders.append(lambda field, column=columns[h], encode=encode: column.append(encode(sanitise_categorical_input(field))))
+
+        length = 0
+        width = len(header)
+        for row in filter(None, reader):
+            # A row with missing or extra fields is skipped, as zip() would otherwise leave the columns of different lengths
+            if len(row) != width:
+                continue
+            for append, field in zip(appenders, row):
+                append(field)
+            length += 1
+
+    return {"header": header, "length": length, "columns": columns, "dictionaries": dictionaries}
+
+def get_revenue_column(table):
+    '''
+    Calculate the revenue (quantity * price) of every record of the table parameter
+
+    :param table: A table returned by parse_CSV_columnar()
+    :return: An array('q') of the revenue for each record, in 1/REVENUE_SCALE of the currency
+    '''
+    return array("q", map(mul, table["columns"]["Quantity"], table["columns"]["Price"]))
+
+def get_grouping_codes(table, header, value_function=None):
+    '''
+    Get the integer codes and the unique values to group the records of the table by the designated header
+
+    :param table: A table returned by parse_CSV_columnar()
+    :param header: A dictionary-encoded header of the table
+    :param value_function: An optional function applied on the unique values to derive a coarser grouping (like the month of a date)
+    :return: A tuple of two elements, (a sequence of codes for each record, a list of the values that the codes index into)
+    '''
+    codes = table["columns"][header]
+    values = table["dictionaries"][header]
+    if value_function is None:
+        return (codes, values)
+
+    # Only the (few) unique values are passed to value_function, the records are then re-coded through a lookup list
+    encode, derived_values = create_column_encoder()
+    code_to_derived_code = [encode(value_function(value)) for value in values]
+    return (array("i", map(code_to_derived_code.__getitem__, codes)), derived_values)
+
+def combine_grouping_codes(outer_grouping, inner_grouping):
+    '''
+    Combine two groupings (from get_grouping_codes()) to group the records by both of them, like by city and by month
+
+    :param outer_grouping: A tuple of (codes, values) of the first grouping
+    :param inner_grouping: A tuple of (codes, values) of the second grouping
+    :return: A tuple of two elements, (a sequence of combined codes, a list of (outer value, inner value) tuples)
+    '''
+    outer_codes, outer_values = outer_grouping
+    inner_codes, inner_values = inner_grouping
+    width = len(inner_values)
+    codes = array("i", (outer * width + inner for outer, inner in zip(outer_codes, inner_codes)))
+    values = [(outer, inner) for outer in outer_values for inner in inner_values]
+    return (codes, values)
+
+def aggregate_by_codes(codes, values, weights=None):
+    '''
+    Sum the weights for each group in one pass over the codes
+
+    :param codes: A sequence of integer codes, one for each record
+    :param values: The list of values that the codes index into
+    :param weights: An optional sequence of numbers, one for each record (the records are counted when it is omitted)
+    :return: A dictionary of value -> sum of the weights (or number of records) for the value, skipping empty groups
+    '''
+    totals = [0] * len(values)
+    counts = [0] * len(values)
+    if weights is None:
+        for code in codes:
+            counts[code] += 1
+        return {value: count for value, count in zip(values, counts) if count > 0}
+
+    for code, weight in zip(codes, weights):
+        totals[code] += weight
+        counts[code] += 1
+    return {value: total for value, total, count in zip(values, totals, counts) if count > 0}
+
+def get_record(table, index):
+    '''
+    Rebuild the record at the designated index of the table as a dictionary, like the ones from parse_CSV()
+
+    :param table: A table returned by parse_CSV_columnar()
+    :param index: The position of the record in the table
+    :return: A dictionary of header -> value (as a string, the same as the sanitised records of the question modules)
+    '''
+    columns = table["columns"]
+    dictionaries = table["dictionaries"]
+    return {
+        h: dictionaries[h][columns[h][index]] if h in dictionaries
+        else str(fixed_to_float(columns[h][index], FIXED_POINT_COLUMNS[h])) if h in FIXED_POINT_COLUMNS
+        else str(columns[h][index])
+        for h in table["header"]
+    }
+
+def create_table_field_getter(table):
+    '''
+    Create the "get_field_values" of a table context, like sales_data.get_field_values()
+
+    :param table: A table returned by parse_CSV_columnar()
+    :return: A function (records, header) -> the value of the field (as a string, like the ones of get_record()) for each record
+    '''
+    def get_field_values(records, header):
+        column = table["columns"][header]
+        if header in table["dictionaries"]:
+            return list(map(table["dictionaries"][header].__getitem__, map(column.__getitem__, records)))
+        if header in FIXED_POINT_COLUMNS:
+            return [str(fixed_to_float(column[position], FIXED_POINT_COLUMNS[header])) for position in records]
+        return [str(column[position]) for position in records]
+    return get_field_values
+
+def create_table_filter_function_by_header(table):
+    '''
+    Curried function to create the filter functions of a table context, like sales_data.create_filter_function_by_header()
+
+    :param table: A table returned by parse_CSV_columnar()
+    :return: A function header -> (value -> (records -> list of the positions of the records holding the value))
+    '''
+    def create_filter_function_by_header(header):
+        codes = table["columns"][header]
+        value_to_code = {value: code for code, value in enumerate(table["dictionaries"][header])}
+        def create_filter_function_by_value(value):
+            # The value is compared as its code, an integer, rather than as a string
+            code = value_to_code.get(value)
+            def get_filtered_list(records):
+                return [position for position in records if codes[position] == code]
+            return get_filtered_list
+        return create_filter_function_by_value
+    return create_filter_function_by_header
+
+def create_table_group_by_function_by_header(table):
+    '''
+    Curried function to create the group-by functions of a table context, like sales_data.create_group_by_function_by_header()
+
+    :param table: A table returned by parse_CSV_columnar()
+    :return: A function header -> (records -> dictionary of value -> list of positions, in the order each value is first encountered)
+    '''
+    def create_group_by_function_by_header(header):
+        codes = table["columns"][header]
+        values = table["dictionaries"][header]
+        def get_grouped_records(records):
+            groups = {}
+            for position in records:
+                groups.setdefault(codes[position], []).append(position)
+            return {values[code]: positions for code, positions in groups.items()}
+        return get_grouped_records
+    return create_group_by_function_by_header
+
+def create_column_total_function(column):
+    '''
+    Create a function summing a (fixed-point) column of a table over a collection of records (row positions), exactly
+
+    The same as sales_data.get_total_quantity_fixed() / get_total_revenue_fixed() for a table context.
+    '''
+    return lambda records: sum(map(column.__getitem__, records))
+
+def create_table_context(path, table):
+    '''
+    Create the context of a table, in the same form as the one returned by sales_data.create_analysis_context(), so the
+    run_analysis() of every question module runs on the table (see the module docstring)
+
+    :param path: The file path to the CSV file the table was parsed from
+    :param table: A table returned by parse_CSV_columnar() (or loaded from its snapshot), with its "Price" & "Quantity" columns
+    :return: A dictionary of the "path", the "header", the "data" (the positions of every record), the "table", the filter
+             registry, and the "group_by_header", "get_field_values", "get_total_quantity_fixed" & "get_total_revenue_fixed" functions
+    '''
+    records = range(table["length"])
+    get_field_values = create_table_field_getter(table)
+    get_unique_values, get_value_filter_functions = create_filter_registry(
+        records, create_table_filter_function_by_header(table), get_field_values
+    )
+    return {
+        "path": path,
+        "header": table["header"],
+        "data": records,
+        "table": table,
+        "get_unique_values": get_unique_values,
+        "get_value_filter_functions": get_value_filter_functions,
+        "group_by_header": create_table_group_by_function_by_header(table),
+        "get_field_values": get_field_values,
+        "get_total_quantity_fixed": create_column_total_function(table["columns"]["Quantity"]),
+        "get_total_revenue_fixed": create_column_total_function(get_revenue_column(table)),
+    }
@@ -0,0 +1,262 @@
+'''
+Precomputed OLAP cube of the sales data
+
+Every question is a roll-up of the same records along one or two headers (the product, the city, the manager, the
+payment method, the purchase type or the month). The cube sums the "Quantity", the revenue and the number of records
+for every combination of those headers that occurs in the data, in a single pass. Any roll-up (like the revenue by
+city & month) or slice (like only the online orders in London) is then answered from the (few hundred) cells of the
+cube, without going back to the records.
+
+"Price" is kept as a dimension as well, since Question 1 lists the prices of each product (there are only 7
+product & price pairs, so it barely adds any cells).
+
+The cube is a dictionary, like:
+{
+    "dimensions": ["City", "Product", "Price", ...],
+    "cells": {(city, product, price, manager, payment method, purchase type, month) -> [quantity, revenue, count]}
+}
+
+The quantities & revenues of the cells are fixed-point integers (see CUBE_MEASURE_SCALES), so any roll-up is exactly
+the total a direct pass over the records would give, and get_measure() converts them back for printing.
+
+save_cube() / load_cube() keep the cube in a file next to the csv file (keyed by the size, modification time and
+SHA-256 of the csv file, like the snapshot of snapshot.py), so it is only rebuilt when the file changes, and a warm
+start only compares the size & modification time of the file rather than reading it.
+
+Usage: python cube.py [PATH] [--by City Month] [--where "Purchase Type=Online"] [--measure revenue] [--rebuild]
+'''
+
+from functools import reduce
+import argparse
+import os
+import pickle
+
+from sales_data import (
+    fixed_to_float, get_month_from_record, get_record_quantity_fixed, get_record_revenue_fixed, parse_CSV_stream,
+    QUANTITY_SCALE, REVENUE_SCALE,
+)
+from snapshot import get_source_key, source_matches
+
+# Version 2: the quantities & revenues of the cells are fixed-point integers
+CUBE_VERSION = 2
+CUBE_DIMENSIONS = ("City", "Product", "Price", "Manager", "Payment Method", "Purchase Type", "Month")
+# The measures of each cell, in the order they are stored
+CUBE_MEASURES = ("quantity", "revenue", "count")
+# The fixed-point scale each measure is stored in (the count is a plain integer)
+CUBE_MEASURE_SCALES = (QUANTITY_SCALE, REVENUE_SCALE, 1)
+
+def get_cube_coordinates(record):
+    '''
+    Get the coordinates of the cell of the cube that the record parameter falls into (in the order of CUBE_DIMENSIONS)
+    '''
+    return (
+        record["City"], record["Product"], record["Price"], record["Manager"],
+        record["Payment Method"], record["Purchase Type"], get_month_from_record(record),
+    )
+
+def add_record_to_cells(cells, record):
+    '''
+    A function to be passed in as argument to reduce() for adding the measures of a record to its cell
+    '''
+    cell = cells.setdefault(get_cube_coordinates(record), [0, 0, 0])
+    cell[0] += get_record_quantity_fixed(record)
+    cell[1] += get_record_revenue_fixed(record)
+    cell[2] += 1
+    return cells
+
+def build_cube(records):
+    '''
+    Build the cube in a single pass over the records
+
+    :param records: The sanitised data (a list of dictionaries, or a stream of them like parse_CSV_stream())
+    :return: A dictionary of the "dimensions" and the "cells" of the cube (see the module docstring)
+    '''
+    return {"dimensions": list(CUBE_DIMENSIONS), "cells": reduce(add_record_to_cells, records, {})}
+
+def create_cell_matcher(dimensions, filters):
+    '''
+    Create a function to check whether the coordinates of a cell match every filter
+
+    :param dimensions: The dimensions of the cube
+    :param filters: A dictionary of dimension -> the value (or a set/list/tuple of values) to keep
+    :return: A function that takes the coordinates of a cell and returns True if they match every filter
+    '''
+    # The position of each filtered dimension, and the values it may take
+    conditions = [
+        (dimensions.index(dimension), set(values) if isinstance(values, (set, frozenset, list, tuple)) else {values})
+        for dimension, values in filters.items()
+    ]
+    return lambda coordinates: all(coordinates[position] in values for position, values in conditions)
+
+def slice_cube(cube, filters):
+    '''
+    Keep only the cells of the cube matching every filter, like slicing the cube on "City" = "London"
+
+    :param cube: A cube from build_cube()
+    :param filters: A dictionary of dimension -> the value (or a set/list/tuple of values) to keep
+    :return: A cube with the same dimensions and only the matching cells
+    '''
+    matches = create_cell_matcher(cube["dimensions"], filters)
+    return {
+        "dimensions": cube["dimensions"],
+        "cells": {coordinates: cell for coordinates, cell in cube["cells"].items() if matches(coordinates)},
+    }
+
+def roll_up(cube, dimensions):
+    '''
+    Sum the cells of the cube over every dimension not kept, like the revenue by city & month
+
+    :param cube: A cube from build_cube() (or a slice of it)
+    :param dimensions: The list of dimensions to keep
+    :return: A dictionary of the value (or the tuple of values when keeping several dimensions) -> [quantity, revenue, count]
+    '''
+    positions = [cube["dimensions"].index(dimension) for dimension in dimensions]
+    if len(positions) == 1:
+        get_key = lambda coordinates: coordinates[positions[0]]
+    else:
+        get_key = lambda coordinates: tuple(coordinates[position] for position in positions)
+
+    rolled_up = {}
+    for coordinates, cell in cube["cells"].items():
+        totals = rolled_up.setdefault(get_key(coordinates), [0, 0, 0])
+        for index, value in enumerate(cell):
+            totals[index] += value
+    return rolled_up
+
+def get_measure(rolled_up, measure):
+    '''
+    Get a single measure of a roll-up
+
+    :param rolled_up: A roll-up from roll_up()
+    :param measure: One of CUBE_MEASURES
+    :return: A dictionary of the value (or tuple of values) -> the measure (a float for the quantity & revenue, an integer for the count)
+    '''
+    index = CUBE_MEASURES.index(measure)
+    if CUBE_MEASURE_SCALES[index] == 1:
+        return {key: totals[index] for key, totals in rolled_up.items()}
+    return {key: fixed_to_float(totals[index], CUBE_MEASURE_SCALES[index]) for key, totals in rolled_up.items()}
+
+def query_cube(cube, dimensions, measure="revenue", filters=None):
+    '''
+    Slice the cube on the filters, then roll it up to the designated dimensions for one measure
+
+    :param cube: A cube from build_cube()
+    :param dimensions: The list of dimensions to keep
+    :param measure: One of CUBE_MEASURES (the revenue by default)
+    :param filters: An optional dictionary of dimension -> the value (or values) to keep
+    :return: A dictionary of the value (or tuple of values) -> the measure
+    '''
+    return get_measure(roll_up(slice_cube(cube, filters) if filters else cube, dimensions), measure)
+
+def get_question_aggregates(cube):
+    '''
+    Calculate the aggregates of every question from the cube, in the same form as the ones of stream_analysis.py
+
+    :param cube: A cube from build_cube() (or loaded by load_cube())
+    :return: A dictionary of aggregate name -> dictionary of group value -> total, to be printed with stream_analysis.question_printers
+    '''
+    product_prices = {}
+    for product, price in roll_up(cube, ["Product", "Price"]):
+        product_prices.setdefault(product, set()).add(price)
+
+    return {
+        "product_quantity": query_cube(cube, ["Product"], "quantity"),
+        "product_revenue": query_cube(cube, ["Product"]),
+        "product_prices": product_prices,
+        "city_revenue": query_cube(cube, ["City"]),
+        "city_month_revenue": query_cube(cube, ["City", "Month"]),
+        "manager_revenue": query_cube(cube, ["Manager"]),
+        "payment_count": query_cube(cube, ["Payment Method"], "count"),
+        "purchase_count": query_cube(cube, ["Purchase Type"], "count"),
+        "month_revenue": query_cube(cube, ["Month"]),
+        "total_revenue": fixed_to_float(sum(cell[1] for cell in cube["cells"].values()), REVENUE_SCALE),
+    }
+
+def get_default_cube_path(path):
+    '''
+    Get the cube path used for the csv file when none is designated, like "restaurant_sales_data.csv.cube"
+    '''
+    return path + ".cube"
+
+def save_cube(cube_path, cube, source_key):
+    '''
+    Save the cube with the key of the csv file it was built from (through a temporary file, so a half written cube is never read)
+    '''
+    temporary_path = cube_path + ".tmp"
+    with open(temporary_path, "wb") as cube_file:
+        pickle.dump({"version": CUBE_VERSION, "source": source_key, "cube": cube}, cube_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, cube_path)
+
+def read_cube(cube_path):
+    '''
+    Read a saved cube
+
+    :param cube_path: The file path to the saved cube
+    :return: A tuple of two elements, (the key of the csv file stored with the cube, the cube), or None if there is no (usable) cube
+    '''
+    try:
+        with open(cube_path, "rb") as cube_file:
+            saved = pickle.load(cube_file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+    if saved.get("version") != CUBE_VERSION:
+        return None
+    return (saved["source"], saved["cube"])
+
+def load_cube(path, cube_path=None, rebuild=False):
+    '''
+    Load the cube of a csv file from its saved cube, (re)building and saving it first if it does not match the file
+
+    :param path: The file path to the CSV file
+    :param cube_path: The file path to the saved cube (get_default_cube_path() when omitted)
+    :param rebuild: Whether to build the cube again even if the saved one matches
+    :return: A cube in the same form as the one returned by build_cube()
+    '''
+    cube_path = cube_path or get_default_cube_path(path)
+
+    # The csv file is only hashed when its size or modification time no longer match (see snapshot.source_matches())
+    saved = None if rebuild else read_cube(cube_path)
+    if saved is not None and source_matches(path, saved[0]):
+        return saved[1]
+
+    cube = build_cube(parse_CSV_stream(path))
+    save_cube(cube_path, cube, get_source_key(path))
+    return cube
+
+def parse_filter(text):
+    '''
+    Parse a --where filter like "City=London" or "Month=2022-11,2022-12" into a (dimension, set of values) tuple
+    '''
+    dimension, separator, values = text.partition("=")
+    if not separator or dimension not in CUBE_DIMENSIONS:
+        raise argparse.ArgumentTypeError(f"expected DIMENSION=VALUE[,VALUE...] with a dimension from {', '.join(CUBE_DIMENSIONS)}")
+    return (dimension, set(values.split(",")))
+
+def parse_arguments(argv=None):
+    '''
+    Parse the command line arguments of the cube query
+
+    :param argv: The list of arguments (sys.argv[1:] when omitted)
+    :return: The parsed arguments, with "path", "by", "where", "measure", "cube" and "rebuild"
+    '''
+    parser = argparse.ArgumentParser(description="Roll up or slice the precomputed sales cube")
+    parser.add_argument("path", nargs="?", default="restaurant_sales_data.csv", help="path to the csv file (default: %(default)s)")
+    parser.add_argument("--by", nargs="+", choices=CUBE_DIMENSIONS, default=["City"], help="dimensions to keep (default: %(default)s)")
+    parser.add_argument("--where", type=parse_filter, action="append", default=[], help="keep only DIMENSION=VALUE[,VALUE...] (repeatable)")
+    parser.add_argument("--measure", choices=CUBE_MEASURES, default="revenue", help="measure to show (default: %(default)s)")
+    parser.add_argument("--cube", default=None, help="path to the saved cube (default: PATH.cube)")
+    parser.add_argument("--rebuild", action="store_true", help="build the cube again even if the saved one matches the file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    cube = load_cube(arguments.path, arguments.cube, arguments.rebuild)
+    result = query_cube(cube, arguments.by, arguments.measure, dict(arguments.where))
+
+    print(f"{arguments.measure.capitalize()} by {' & '.join(arguments.by)}")
+    for key, value in sorted(result.items()):
+        label = " | ".join(key) if isinstance(key, tuple) else key
+        print(f"{label}: {value:.2f}" if arguments.measure != "count" else f"{label}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+'''
+Approximate distinct counts (HyperLogLog), for the high-cardinality columns
+
+Counting the unique values of a column with a set keeps every one of them in memory, which is fine for "City" or
+"Product" (a handful of values) but not for "Order ID" (one value per record). A HyperLogLog sketch estimates the
+number of unique values from a fixed number of small registers instead (4096 bytes with the default precision, for a
+typical error of about 1.6 %), whatever the number of records.
+
+Two sketches of the same precision are merged by taking the maximum of each register, so the sketches of different
+files (or of different worker processes) can be merged into the sketch of all of them, the same way the partial sums
+of multi_file.py are merged.
+
+The sketch is a dictionary, like {"precision": 12, "registers": bytearray(4096)}
+
+Usage: python hyperloglog.py [DIRECTORY_OR_GLOB ...] [--by City Manager] [--workers N]
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+import argparse
+import hashlib
+import math
+
+from sales_data import parse_CSV_stream, read_CSV_header
+from multi_file import find_csv_files
+
+DEFAULT_PRECISION = 12
+HASH_BITS = 64
+# The columns with only a handful of unique values are still counted exactly with a set, the others are estimated
+EXACT_COUNT_HEADERS = ("Product", "Price", "Purchase Type", "Payment Method", "Manager", "City")
+
+def create_hyperloglog(precision=DEFAULT_PRECISION):
+    '''
+    Create an empty sketch
+
+    :param precision: The number of bits of the hash used to pick a register (4 - 16), the sketch has 2 ** precision registers
+    :return: A dictionary of the "precision" and the "registers" of the sketch
+    '''
+    if not 4 <= precision <= 16:
+        raise ValueError(f"The precision must be between 4 and 16, not {precision}")
+    return {"precision": precision, "registers": bytearray(1 << precision)}
+
+def hash_value(value):
+    '''
+    Hash a value into a 64-bit integer, the same in every process (unlike hash(), which is salted for each process)
+    '''
+    return int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=HASH_BITS // 8).digest(), "big")
+
+def add_to_hyperloglog(sketch, value):
+    '''
+    A function to be passed in as argument to reduce() for adding a value to a sketch
+
+    :param sketch: The sketch, updated in place
+    :param value: The value to be counted
+    :return: The sketch
+    '''
+    precision = sketch["precision"]
+    hashed = hash_value(value)
+    # The first bits pick the register, the position of the first 1 bit in the rest is the rank kept in the register
+    register = hashed >> (HASH_BITS - precision)
+    remaining_bits = HASH_BITS - precision
+    rank = remaining_bits - (hashed & ((1 << remaining_bits) - 1)).bit_length() + 1
+    if rank > sketch["registers"][register]:
+        sketch["registers"][register] = rank
+    return sketch
+
+def merge_hyperloglogs(left, right):
+    '''
+    Merge two sketches into a new sketch counting the values of both
+
+    :param left: A sketch
+    :param right: A sketch of the same precision
+    :return: A new sketch, with the maximum of each register of the two sketches
+    '''
+    if left["precision"] != right["precision"]:
+        raise ValueError(f"Cannot merge sketches of precision {left['precision']} and {right['precision']}")
+    return {"precision": left["precision"], "registers": bytearray(map(max, left["registers"], right["registers"]))}
+
+def estimate_cardinality(sketch):
+    '''
+    Estimate the number of unique values added to a sketch
+
+    :param sketch: A sketch
+    :return: The estimated number of unique values (rounded to an integer)
+    '''
+    registers = sketch["registers"]
+    register_count = len(registers)
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(register_count, 0.7213 / (1 + 1.079 / register_count))
+    estimate = alpha * register_count ** 2 / math.fsum(2.0 ** -rank for rank in registers)
+
+    # With few values, most of the registers are still empty and counting them is more accurate (linear counting)
+    empty_registers = registers.count(0)
+    if estimate <= 2.5 * register_count and empty_registers:
+        estimate = register_count * math.log(register_count / empty_registers)
+    return round(estimate)
+
+def create_distinct_count_accumulator(key_function, value_function, precision=DEFAULT_PRECISION):
+    '''
+    Create an accumulator that keeps a sketch of the unique values for each group, like the distinct orders of each city
+
+    :param key_function: A function that takes a record and returns the value to group the record under
+    :param value_function: A function that takes a record and returns the value to be counted, like lambda record: record["Order ID"]
+    :param precision: The precision of the sketches
+    :return: A function (aggregate, record) -> aggregate to be passed in to reduce(), the aggregate being a dictionary of group value -> sketch
+    '''
+    def accumulate(aggregate, record):
+        '''
+        Add the value of the record parameter to the sketch of its group
+        '''
+        key = key_function(record)
+        if key not in aggregate:
+            aggregate[key] = create_hyperloglog(precision)
+        add_to_hyperloglog(aggregate[key], value_function(record))
+        return aggregate
+    return accumulate
+
+def create_column_cardinality_accumulator(headers, exact_headers=EXACT_COUNT_HEADERS, precision=DEFAULT_PRECISION):
+    '''
+    Create an accumulator counting the unique values of every column, with a set for the exact headers and a sketch for the others
+
+    :param headers: The headers (columns) to be counted
+    :param exact_headers: The headers counted exactly (the low-cardinality ones)
+    :param precision: The precision of the sketches
+    :return: A function (aggregate, record) -> aggregate to be passed in to reduce(), the aggregate being a dictionary of header -> set or sketch
+    '''
+    def accumulate(aggregate, record):
+        '''
+        Add every field of the record parameter to the set or sketch of its header
+        '''
+        for header in headers:
+            if header not in aggregate:
+                aggregate[header] = set() if header in exact_headers else create_hyperloglog(precision)
+            distinct_values = aggregate[header]
+            if isinstance(distinct_values, set):
+                distinct_values.add(record[header])
+            else:
+                add_to_hyperloglog(distinct_values, record[header])
+        return aggregate
+    return accumulate
+
+def merge_distinct_values(left, right):
+    '''
+    Merge two sets (a union) or two sketches (merge_hyperloglogs()) of the unique values of the same group or column
+    '''
+    if isinstance(left, set):
+        return left | right
+    return merge_hyperloglogs(left, right)
+
+def merge_distinct_aggregates(left, right):
+    '''
+    Merge two aggregates of sets or sketches (from the accumulators above), to be passed in as argument to reduce()
+
+    :param left: A dictionary of group value (or header) -> set or sketch
+    :param right: A dictionary of group value (or header) -> set or sketch
+    :return: A dictionary holding every key of both parameters, with the values of the keys in both merged
+    '''
+    merged = dict(left)
+    for key, distinct_values in right.items():
+        merged[key] = merge_distinct_values(merged[key], distinct_values) if key in merged else distinct_values
+    return merged
+
+def get_distinct_counts(aggregate):
+    '''
+    Get the number of unique values of each group (or column) of an aggregate of sets or sketches
+
+    :param aggregate: A dictionary of group value (or header) -> set or sketch
+    :return: A dictionary of group value (or header) -> number of unique values (exact for a set, estimated for a sketch)
+    '''
+    return {
+        key: len(distinct_values) if isinstance(distinct_values, set) else estimate_cardinality(distinct_values)
+        for key, distinct_values in aggregate.items()
+    }
+
+def count_distinct_in_file(path, group_headers=()):
+    '''
+    Count the unique values of every column, and the distinct orders of each group, of a single csv file (run inside a worker process)
+
+    :param path: The file path to the CSV file
+    :param group_headers: The headers to count the distinct "Order ID" of each of their values for
+    :return: A dictionary of "columns" -> aggregate of every column, and each group header -> aggregate of its groups
+    '''
+    accumulators = {
+        header: create_distinct_count_accumulator(lambda record, header=header: record[header], lambda record: record["Order ID"])
+        for header in group_headers
+    }
+    column_accumulator = None
+
+    def accumulate(aggregates, record):
+        '''
+        Add the record parameter to the counts of every column and of each of its groups
+        '''
+        nonlocal column_accumulator
+        # The columns are only known once the first record is read
+        if column_accumulator is None:
+            column_accumulator = create_column_cardinality_accumulator(list(record))
+        aggregates["columns"] = column_accumulator(aggregates.setdefault("columns", {}), record)
+        for header, accumulator in accumulators.items():
+            aggregates[header] = accumulator(aggregates.setdefault(header, {}), record)
+        return aggregates
+    return reduce(accumulate, parse_CSV_stream(path), {})
+
+def merge_file_counts(left, right):
+    '''
+    Merge the results of count_distinct_in_file() of two files, to be passed in as argument to reduce()
+    '''
+    return {name: merge_distinct_aggregates(left.get(name, {}), right.get(name, {})) for name in {**left, **right}}
+
+def check_group_headers(parser, paths, group_headers):
+    '''
+    Check that the --by headers are in every (non-empty) csv file, exiting through parser.error() otherwise
+
+    :param parser: The argparse parser of the command line
+    :param paths: The list of file paths to the CSV files
+    :param group_headers: The (sanitised) headers to count the distinct orders of each value for
+    '''
+    if not group_headers:
+        return
+    for path in paths:
+        try:
+            header = read_CSV_header(path)
+        except OSError as error:
+            parser.error(f"cannot read {path}: {error.strerror}")
+        unknown_headers = sorted(set(group_headers).difference(header))
+        # An empty file has no records to group, whatever its header
+        if header and unknown_headers:
+            parser.error(f"unknown --by header(s) {', '.join(unknown_headers)} in {path}, expected one of {', '.join(header)}")
+
+def parse_arguments(argv=None):
+    '''
+    Parse the command line arguments of the distinct counts
+
+    :param argv: The list of arguments (sys.argv[1:] when omitted)
+    :return: The parsed arguments, with "paths" (the csv files found for the patterns, sorted), "by" and "workers"
+    '''
+    parser = argparse.ArgumentParser(description="Count the unique values of every column, and the distinct orders of each group")
+    parser.add_argument("paths", nargs="*", default=["restaurant_sales_data.csv"], help="csv files, directories or glob patterns")
+    parser.add_argument("--by", nargs="*", default=["City", "Manager"], help="headers to count the distinct orders of each value for")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    arguments = parser.parse_args(argv)
+    arguments.paths = sorted(set(path for pattern in arguments.paths for path in find_csv_files(pattern)))
+    check_group_headers(parser, arguments.paths, arguments.by)
+    return arguments
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    paths = arguments.paths
+    if not paths:
+        print("No csv files found")
+        return
+
+    if arguments.workers == 1 or len(paths) == 1:
+        file_counts = [count_distinct_in_file(path, arguments.by) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=arguments.workers) as executor:
+            file_counts = list(executor.map(count_distinct_in_file, paths, [arguments.by] * len(paths)))
+    counts = reduce(merge_file_counts, file_counts, {})
+
+    print(f"Unique values of each column ({len(paths)} csv files, estimated for {', '.join(h for h in counts.get('columns', {}) if h not in EXACT_COUNT_HEADERS)})")
+    for header, count in get_distinct_counts(counts.get("columns", {})).items():
+        print(f"{header}: {count}")
+    for header in arguments.by:
+        print(f"\nDistinct orders by {header}")
+        for value, count in get_distinct_counts(counts.get(header, {})).items():
+            print(f"{value}: {count}")
+
+if __name__ == "__main__":
+    main()
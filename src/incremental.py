@@ -0,0 +1,188 @@
+'''
+Incremental mode for append-only csv files
+
+The sales csv file only grows, so instead of parsing the whole file on every run, a checkpoint keeps the byte offset
+reached by the last run together with the aggregates of stream_analysis.py at that point. The next run seeks to that
+offset, streams only the newly appended records, and feeds them to the same accumulators starting from the saved
+aggregates. The city, manager, product and monthly totals are therefore updated in time proportional to the new rows.
+
+A partially written last line (not ending with a newline yet) is left for the next run. The checkpoint is discarded
+and everything is aggregated again if the file got shorter than the saved offset, its header line changed, or the
+block of bytes right before the saved offset no longer has the SHA-256 stored in the checkpoint (the file was
+rewritten rather than appended to).
+
+Usage: python incremental.py [PATH] [--checkpoint CHECKPOINT_PATH] [--rebuild] [--questions 1 2 5]
+'''
+
+from functools import reduce
+import argparse
+import csv
+import hashlib
+import os
+import pickle
+
+from sales_data import combine_accumulators, create_record_sanitiser
+import stream_analysis
+
+# Version 2: the month keys include the year (like "2022-11")
+# Version 3: the quantities & revenues are fixed-point integers
+# Version 4: the quantile sketches of each product & city
+# Version 5: the SHA-256 of the block before the offset
+CHECKPOINT_VERSION = 5
+# The number of bytes before the offset that are hashed to detect a rewritten file
+CHECKPOINT_BLOCK_SIZE = 1 << 16
+
+def get_default_checkpoint_path(path):
+    '''
+    Get the checkpoint path used for the csv file when none is designated, like "restaurant_sales_data.csv.checkpoint"
+    '''
+    return path + ".checkpoint"
+
+def load_checkpoint(checkpoint_path):
+    '''
+    Load the checkpoint saved by a previous run
+
+    :param checkpoint_path: The file path to the checkpoint
+    :return: The checkpoint dictionary, or None if there is no (usable) checkpoint
+    '''
+    try:
+        with open(checkpoint_path, "rb") as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+    return checkpoint if checkpoint.get("version") == CHECKPOINT_VERSION else None
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    '''
+    Save the checkpoint, writing a temporary file first so a failed run never leaves a half written checkpoint
+    '''
+    temporary_path = checkpoint_path + ".tmp"
+    with open(temporary_path, "wb") as checkpoint_file:
+        pickle.dump(checkpoint, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, checkpoint_path)
+
+def get_block_hash(csv_file, offset):
+    '''
+    Get the SHA-256 of the block of (at most CHECKPOINT_BLOCK_SIZE) bytes of a binary file ending at the offset
+
+    :param csv_file: A file opened in binary mode (its position is moved)
+    :param offset: The byte offset the block ends at
+    :return: The hexadecimal digest of the block
+    '''
+    start = max(0, offset - CHECKPOINT_BLOCK_SIZE)
+    csv_file.seek(start)
+    return hashlib.sha256(csv_file.read(offset - start)).hexdigest()
+
+def checkpoint_matches(csv_file, header_line, checkpoint):
+    '''
+    Check whether the file was only appended to since the checkpoint, by its header line, size and the hash of the block before the offset
+
+    :param csv_file: The csv file opened in binary mode (its position is moved)
+    :param header_line: The (raw) header line of the file
+    :param checkpoint: The checkpoint of the previous run
+    :return: True if the aggregation can resume from the offset of the checkpoint
+    '''
+    return (
+        checkpoint["header_line"] == header_line
+        and checkpoint["offset"] <= os.fstat(csv_file.fileno()).st_size
+        and checkpoint["block_hash"] == get_block_hash(csv_file, checkpoint["offset"])
+    )
+
+def create_empty_checkpoint(header_line):
+    '''
+    Create the checkpoint of a file that has not been aggregated yet, positioned right after its header line
+    '''
+    return {
+        "version": CHECKPOINT_VERSION, "header_line": header_line, "offset": len(header_line),
+        "block_hash": hashlib.sha256(header_line).hexdigest(), "record_count": 0, "aggregates": {},
+    }
+
+def read_complete_lines(csv_file, progress):
+    '''
+    Read the complete lines (ending with a newline) of a binary file from its current position
+
+    :param csv_file: A file opened in binary mode, positioned at the start of a line
+    :param progress: A dictionary whose "offset" is advanced past each complete line that is read
+    :return: A generator of the decoded lines
+    '''
+    for line in csv_file:
+        if not line.endswith(b"\n"):
+            # Still being written, it will be read from the start by the next run
+            return
+        progress["offset"] += len(line)
+        yield line.decode("utf-8")
+
+def update_aggregates(path, checkpoint=None):
+    '''
+    Aggregate the records appended to the csv file since the checkpoint, on top of the aggregates of the checkpoint
+
+    :param path: The file path to the CSV file
+    :param checkpoint: The checkpoint of the previous run (None to aggregate the whole file)
+    :return: A tuple of two elements, (the updated checkpoint, the number of new records aggregated)
+    '''
+    with open(path, "rb") as csv_file:
+        header_line = csv_file.readline()
+        if checkpoint is None or not checkpoint_matches(csv_file, header_line, checkpoint):
+            checkpoint = create_empty_checkpoint(header_line)
+
+        sanitise_record = create_record_sanitiser(next(csv.reader([header_line.decode("utf-8-sig")]), []))
+        progress = {"offset": checkpoint["offset"]}
+        csv_file.seek(checkpoint["offset"])
+        new_records = map(sanitise_record, filter(None, csv.reader(read_complete_lines(csv_file, progress))))
+
+        # Tracking the number of records while they are reduced, without keeping them
+        accumulate = combine_accumulators(stream_analysis.question_accumulators)
+        counter = {"records": 0}
+        def count_and_accumulate(aggregates, record):
+            '''
+            Count the record parameter, then feed it to the accumulators of every question
+            '''
+            counter["records"] += 1
+            return accumulate(aggregates, record)
+
+        aggregates = reduce(count_and_accumulate, new_records, checkpoint["aggregates"])
+        block_hash = get_block_hash(csv_file, progress["offset"])
+
+    updated_checkpoint = {
+        **checkpoint,
+        "offset": progress["offset"],
+        "block_hash": block_hash,
+        "record_count": checkpoint["record_count"] + counter["records"],
+        "aggregates": aggregates,
+    }
+    return (updated_checkpoint, counter["records"])
+
+def parse_arguments(argv=None):
+    '''
+    Parse the command line arguments of the incremental mode
+
+    :param argv: The list of arguments (sys.argv[1:] when omitted)
+    :return: The parsed arguments, with "path", "checkpoint", "rebuild" and "questions"
+    '''
+    parser = argparse.ArgumentParser(description="Update the restaurant sales aggregates with the rows appended since the last run")
+    parser.add_argument("path", nargs="?", default="restaurant_sales_data.csv", help="path to the csv file (default: %(default)s)")
+    parser.add_argument("--checkpoint", default=None, help="path to the checkpoint file (default: PATH.checkpoint)")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the checkpoint and aggregate the whole file again")
+    parser.add_argument(
+        "--questions", type=int, nargs="*", choices=sorted(stream_analysis.question_printers),
+        default=sorted(stream_analysis.question_printers), help="questions to print, in order (default: all)",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    checkpoint_path = arguments.checkpoint or get_default_checkpoint_path(arguments.path)
+
+    previous_checkpoint = None if arguments.rebuild else load_checkpoint(checkpoint_path)
+    checkpoint, new_record_count = update_aggregates(arguments.path, previous_checkpoint)
+    save_checkpoint(checkpoint_path, checkpoint)
+
+    print(f"Aggregated {new_record_count} new records ({checkpoint['record_count']} in total, up to byte {checkpoint['offset']})\n")
+    if not checkpoint["aggregates"]:
+        return
+    totals = stream_analysis.finalise_aggregates(checkpoint["aggregates"])
+    for question in arguments.questions:
+        stream_analysis.question_printers[question](totals)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+'''
+Bitmap (inverted) indexes over the categorical columns of the sanitised data
+
+For each unique value of "City", "Product", "Manager", "Payment Method" and "Purchase Type", the index keeps a bitmap
+of the records holding that value: bit i is set when record i (its position in the data) matches. Python integers are
+used as the bitmaps, so the records of a value are picked out of the data directly, instead of running
+list(filter(...)) over the whole dataset for every unique value.
+
+create_indexed_filter_function_by_header() has the same curried shape as create_filter_function_by_header(), and is
+passed in to create_filter_registry() in its place by create_analysis_context(), so the filter functions of the
+registry (used by Question1.py & Question4.py) are answered from the bitmaps.
+'''
+
+from functools import reduce
+from operator import or_
+
+INDEXED_HEADERS = ("City", "Product", "Manager", "Payment Method", "Purchase Type")
+
+def create_bitmap_index(data, headers=INDEXED_HEADERS):
+    '''
+    Build the bitmaps of every unique value of the designated headers, in a single pass over the data
+
+    :param data: The sanitised data of the csv file (in the form of a list of dictionaries)
+    :param headers: The headers (columns) to be indexed
+    :return: A dictionary of header -> dictionary of value -> bitmap (int) of the records holding the value
+    '''
+    byte_count = (len(data) + 7) // 8
+    # The bits are set in a bytearray first, as setting them on an int directly would copy the int for every record
+    header_to_bits = {header: {} for header in headers}
+    for row_id, record in enumerate(data):
+        byte_index, bit = row_id >> 3, 1 << (row_id & 7)
+        for header, value_to_bits in header_to_bits.items():
+            bits = value_to_bits.get(record[header])
+            if bits is None:
+                bits = value_to_bits[record[header]] = bytearray(byte_count)
+            bits[byte_index] |= bit
+
+    return {
+        header: {value: int.from_bytes(bits, "little") for value, bits in value_to_bits.items()}
+        for header, value_to_bits in header_to_bits.items()
+    }
+
+def get_value_bitmap(index, header, value):
+    '''
+    Get the bitmap of the records holding the designated value (or any of the values, when a list/tuple/set is given)
+
+    :param index: A bitmap index returned by create_bitmap_index()
+    :param header: An indexed header
+    :param value: A single value, or a list/tuple/set of values to be matched by any of them
+    :return: The bitmap (int) of the matching records (0 when nothing matches)
+    '''
+    value_to_bitmap = index[header]
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return reduce(or_, (value_to_bitmap.get(v, 0) for v in value), 0)
+    return value_to_bitmap.get(value, 0)
+
+def get_row_ids(bitmap):
+    '''
+    Get the positions of the records set in the bitmap parameter, in increasing order
+
+    :param bitmap: A bitmap (int) of records
+    :return: A generator of record positions (row ids)
+    '''
+    bitmap_bytes = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for byte_index, byte in enumerate(bitmap_bytes):
+        # Most bytes of a selective filter are empty, so they are skipped without looking at their bits
+        if byte:
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield (byte_index << 3) | bit
+
+def get_records_from_bitmap(data, bitmap):
+    '''
+    Pick the records set in the bitmap parameter out of the data
+
+    :param data: The sanitised data of the csv file that the bitmap was built from
+    :param bitmap: A bitmap (int) of records
+    :return: A list of dictionaries of the matching records, in the same order as the data
+    '''
+    return [data[row_id] for row_id in get_row_ids(bitmap)]
+
+def create_indexed_filter_function_by_header(indexed_data, create_scan_filter_function, headers=INDEXED_HEADERS):
+    '''
+    Create a replacement of create_filter_function_by_header() answered from bitmap indexes of the data
+
+    The bitmaps of a header are built (in a single pass over the data) the first time a filter is created for it, and
+    kept for the next ones. The filters are answered from the bitmaps when they are applied on the indexed data, and
+    fall back to scanning the data otherwise (or for a header that is not indexed).
+
+    :param indexed_data: The data that the filters are answered for
+    :param create_scan_filter_function: The curried function scanning the data, create_filter_function_by_header()
+                                        (passed in, since sales_data.py uses this module to build the context)
+    :param headers: The headers that may be indexed
+    :return: A function with the same curried shape as create_filter_function_by_header()
+    '''
+    index = {}
+
+    def create_filter_function_by_indexed_header(header):
+        '''
+        Create a function to filter the data of the csv file based on the designated header
+
+        :param header: The header to be used as a predicate for filtering the records
+        :return: A function for filtering the data of the csv file based on the designated value
+        '''
+        if header not in headers:
+            return create_scan_filter_function(header)
+        if header not in index:
+            index.update(create_bitmap_index(indexed_data, (header,)))
+
+        def create_filter_function_by_value(value):
+            '''
+            Create a function to filter the data of the csv file based on the designated value
+
+            :param value: The value to be used as a predicate for filtering the records
+            :return: A function to obtain a list of dictionaries containing the filtered records
+            '''
+            scan_filter = create_scan_filter_function(header)(value)
+            def get_filtered_list(data):
+                '''
+                Filter the data parameter through the bitmap of the designated value (or by scanning it, if it is not the indexed data)
+                '''
+                if data is not indexed_data:
+                    return scan_filter(data)
+                return get_records_from_bitmap(indexed_data, get_value_bitmap(index, header, value))
+            return get_filtered_list
+        return create_filter_function_by_value
+    return create_filter_function_by_indexed_header
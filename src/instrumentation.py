@@ -0,0 +1,194 @@
+'''
+Per-stage timing of the question modules, with a JSON summary at exit
+
+Off by default, and then nothing is timed. It is turned on by the SALES_INSTRUMENTATION environment variable (or the
+--instrument option of analysis_runner.py):
+- SALES_INSTRUMENTATION=1 (or any value but "", "0", "false", "no" and "off") prints the summary to stderr at exit
+- SALES_INSTRUMENTATION_OUTPUT=path/to/stages.jsonl appends the summary as one JSON line to the file at exit instead,
+  so the summaries of many runs (like the nightly reports) can be collected in the same file
+
+Every stage records its number of calls, its wall & CPU time and the number of rows it went through. The stages are:
+- "parse_CSV" (sales_data, which includes the time of "sanitise") and "sanitise" (one call for each record)
+- "filter construction", "filtering" and "calculate_total_revenue" (or "calculate_totals") of each question module
+- "printing" (the time spent writing the output) and "run_analysis" (the whole analysis) of each question module
+- for the other modes of analysis_runner.py, the "columnar load" of --columnar (then the stages of the question
+  modules), and for --stream, --snapshot, --cube and --cache the loading ("stream aggregation", "snapshot load",
+  "cube load" or "cache lookup"), aggregating and "printing" stages of analysis_runner, and the "sanitise" stage of
+  sales_data for the streamed records
+
+The summary is a dictionary, like:
+{
+    "started_at": "2022-12-29T10:00:00", "argv": [...], "pid": 1234,
+    "stages": [{"module": "Question2", "stage": "filtering", "calls": 1, "wall_seconds": ..., "cpu_seconds": ..., "rows": 254}, ...]
+}
+
+Usage: wrap a function with instrument_function(module, stage)(function), a block with timed_stage(module, stage),
+or a run_analysis() with instrument_analysis(module)
+'''
+
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import atexit
+import json
+import os
+import sys
+import time
+
+INSTRUMENTATION_VARIABLE = "SALES_INSTRUMENTATION"
+OUTPUT_VARIABLE = "SALES_INSTRUMENTATION_OUTPUT"
+
+# The values of INSTRUMENTATION_VARIABLE (compared in lower case) that leave the instrumentation off
+DISABLED_VALUES = ("", "0", "false", "no", "off")
+
+# The outputs that print the summary to stderr instead of appending it to a file
+STDERR_OUTPUTS = ("-", "stderr")
+
+instrumentation_state = {"enabled": False, "output": None, "started_at": None, "stages": {}}
+
+def enable_instrumentation(output="-"):
+    '''
+    Turn on the instrumentation, and write the summary at exit
+
+    :param output: The file path the summary is appended to (as a JSON line), or one of STDERR_OUTPUTS for stderr
+    '''
+    if not instrumentation_state["enabled"]:
+        atexit.register(write_instrumentation_summary)
+    instrumentation_state.update(enabled=True, output=output, started_at=datetime.now().isoformat(timespec="seconds"))
+
+def is_instrumentation_enabled():
+    '''
+    Check whether the stages are being timed
+    '''
+    return instrumentation_state["enabled"]
+
+def record_stage(module, stage, wall_seconds, cpu_seconds, rows=None):
+    '''
+    Add one call of a stage to its totals
+
+    :param module: The module the stage belongs to, like "Question2"
+    :param stage: The name of the stage, like "filtering"
+    :param wall_seconds: The wall time of the call
+    :param cpu_seconds: The CPU time of the call
+    :param rows: The number of rows the call went through (None when unknown)
+    '''
+    totals = instrumentation_state["stages"].setdefault(
+        (module, stage), {"module": module, "stage": stage, "calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "rows": 0}
+    )
+    totals["calls"] += 1
+    totals["wall_seconds"] += wall_seconds
+    totals["cpu_seconds"] += cpu_seconds
+    totals["rows"] += rows or 0
+
+@contextmanager
+def timed_stage(module, stage, rows=None):
+    '''
+    Time the block of a with statement as one call of a stage (nothing is timed while the instrumentation is off)
+
+    :param module: The module the stage belongs to
+    :param stage: The name of the stage
+    :param rows: The number of rows the block goes through, which can also be set on the yielded dictionary as "rows"
+    :return: A context manager yielding a dictionary with the "rows" of the call
+    '''
+    call = {"rows": rows}
+    if not is_instrumentation_enabled():
+        yield call
+        return
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield call
+    finally:
+        record_stage(module, stage, time.perf_counter() - wall_start, time.process_time() - cpu_start, call["rows"])
+
+def instrument_function(module, stage, count_rows=None):
+    '''
+    Curried function to time every call of a function as a call of a stage
+
+    :param module: The module the stage belongs to
+    :param stage: The name of the stage
+    :param count_rows: An optional function that takes the first argument of the call and returns its number of rows, like len
+    :return: A function that takes the function to be timed and returns the timed function (usable as a decorator)
+    '''
+    def instrument(function):
+        @wraps(function)
+        def timed_function(*args, **kwargs):
+            if not is_instrumentation_enabled():
+                return function(*args, **kwargs)
+            with timed_stage(module, stage, count_rows(args[0]) if count_rows and args else None):
+                return function(*args, **kwargs)
+        return timed_function
+    return instrument
+
+def create_timed_output(module, output):
+    '''
+    Create a stand-in for sys.stdout that times every write as a call of the "printing" stage of a module
+
+    :param module: The module the printing belongs to
+    :param output: The output the writes are passed on to (the original sys.stdout)
+    :return: A file-like object for sys.stdout
+    '''
+    # print() only needs write() & flush(), anything else is looked up on the original output
+    class TimedOutput:
+        def write(self, text):
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            written = output.write(text)
+            record_stage(module, "printing", time.perf_counter() - wall_start, time.process_time() - cpu_start)
+            return written
+
+        def flush(self):
+            output.flush()
+
+        def __getattr__(self, name):
+            return getattr(output, name)
+    return TimedOutput()
+
+def instrument_analysis(module):
+    '''
+    Curried function to time a run_analysis(context) as a whole, and the printing it does as the "printing" stage
+
+    :param module: The question module, like "Question2"
+    :return: A function that takes run_analysis() and returns the timed run_analysis() (usable as a decorator)
+    '''
+    def instrument(run_analysis):
+        @wraps(run_analysis)
+        def timed_run_analysis(context):
+            if not is_instrumentation_enabled():
+                return run_analysis(context)
+            output = sys.stdout
+            sys.stdout = create_timed_output(module, output)
+            try:
+                with timed_stage(module, "run_analysis", len(context["data"])):
+                    return run_analysis(context)
+            finally:
+                sys.stdout = output
+        return timed_run_analysis
+    return instrument
+
+def get_instrumentation_summary():
+    '''
+    Get the totals of every stage timed so far
+
+    :return: A dictionary of the "started_at" time, the "argv" & "pid" of the run, and the list of "stages" (see the module docstring)
+    '''
+    return {
+        "started_at": instrumentation_state["started_at"],
+        "argv": sys.argv,
+        "pid": os.getpid(),
+        "stages": list(instrumentation_state["stages"].values()),
+    }
+
+def write_instrumentation_summary():
+    '''
+    Write the summary to the output of the instrumentation (run at exit once it is turned on)
+    '''
+    summary = get_instrumentation_summary()
+    output = instrumentation_state["output"]
+    if output in STDERR_OUTPUTS:
+        print(json.dumps(summary, indent=2), file=sys.stderr)
+        return
+    with open(output, "a") as summary_file:
+        summary_file.write(json.dumps(summary) + "\n")
+
+if os.environ.get(INSTRUMENTATION_VARIABLE, "").strip().lower() not in DISABLED_VALUES:
+    enable_instrumentation(os.environ.get(OUTPUT_VARIABLE) or "-")
@@ -0,0 +1,138 @@
+'''
+Multi-file mode: aggregate many daily csv exports (same columns as restaurant_sales_data.csv) in a process pool
+
+Each worker process streams one file through the same accumulators as stream_analysis.py and sends back only its
+partial aggregates (sums & counts for each group, the sets of unique prices and the quantile sketches). The partial
+aggregates are then merged in the parent process with reduce(), the same way the question modules sum their values
+with calculate_sum().
+
+The sums are fixed-point integers, so the merged sums, counts and sets are exactly the ones of a serial run, whatever
+the number of workers or the order the files finish in. The quantile sketches are not: merging KLL sketches compacts
+them again, so the merged percentiles are estimates (within the rank error of quantiles.py) that depend on how the
+records are split between the files and on the order the sketches are merged in. The partial aggregates are always
+merged in the order of the sorted file paths (executor.map() returns them in the order of its input), so the same
+files give the same percentiles whatever the number of workers.
+
+Usage: python multi_file.py DIRECTORY_OR_GLOB [--workers N] [--questions 1 2 5]
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+import argparse
+import glob
+import os
+
+from sales_data import parse_CSV_stream, combine_accumulators, calculate_sum
+from quantiles import merge_quantile_sketches
+import stream_analysis
+
+def find_csv_files(path_pattern):
+    '''
+    Find the csv files designated by the path_pattern parameter
+
+    :param path_pattern: A directory (every *.csv file directly inside it is used) or a glob pattern like "exports/2022-11-*.csv"
+    :return: A sorted list of file paths
+    '''
+    if os.path.isdir(path_pattern):
+        path_pattern = os.path.join(path_pattern, "*.csv")
+    return sorted(glob.glob(path_pattern))
+
+def aggregate_file(path):
+    '''
+    Aggregate a single csv file into the partial aggregates of every question (run inside a worker process)
+
+    :param path: The file path to the CSV file
+    :return: A dictionary of aggregate name -> dictionary of group value -> partial sum / count / set of values
+    '''
+    return reduce(combine_accumulators(stream_analysis.question_accumulators), parse_CSV_stream(path), {})
+
+def merge_value(left, right):
+    '''
+    Merge two partial values of the same group, a union for sets of values, merge_quantile_sketches() for quantile
+    sketches (dictionaries) and calculate_sum() for sums & counts
+    '''
+    if isinstance(left, set):
+        return left | right
+    if isinstance(left, dict):
+        return merge_quantile_sketches(left, right)
+    return calculate_sum(left, right)
+
+def merge_group_aggregates(left, right):
+    '''
+    Merge two partial aggregates (dictionaries of group value -> partial value) into a new one
+
+    :param left: A dictionary of group value -> partial value
+    :param right: A dictionary of group value -> partial value
+    :return: A dictionary holding every group of both parameters, with the values of the groups in both merged
+    '''
+    merged = dict(left)
+    for key, value in right.items():
+        merged[key] = merge_value(merged[key], value) if key in merged else value
+    return merged
+
+def merge_aggregates(left, right):
+    '''
+    Merge the partial aggregates of two files, to be passed in as argument to reduce()
+
+    :param left: A dictionary of aggregate name -> partial aggregate
+    :param right: A dictionary of aggregate name -> partial aggregate
+    :return: A dictionary of aggregate name -> merged aggregate
+    '''
+    return {
+        name: merge_group_aggregates(left.get(name, {}), right.get(name, {}))
+        for name in {**left, **right}
+    }
+
+def aggregate_files(paths, workers=None):
+    '''
+    Aggregate many csv files in a process pool and merge their partial aggregates
+
+    :param paths: A list of file paths to the CSV files
+    :param workers: The number of worker processes (os.cpu_count() when omitted, 1 to aggregate serially in this process)
+    :return: A dictionary of aggregate name -> merged aggregate, in the same form as the aggregates of stream_analysis.py
+    '''
+    if workers == 1 or len(paths) <= 1:
+        return reduce(merge_aggregates, map(aggregate_file, paths), {})
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Bigger chunks mean fewer round trips between the processes when there are hundreds of small files
+        chunksize = max(1, len(paths) // (4 * (workers or os.cpu_count() or 1)))
+        # The results come back in the order of the paths (not the order the files finish in), which keeps the merge
+        # of the quantile sketches reproducible
+        return reduce(merge_aggregates, executor.map(aggregate_file, paths, chunksize=chunksize), {})
+
+def parse_arguments(argv=None):
+    '''
+    Parse the command line arguments of the multi-file mode
+
+    :param argv: The list of arguments (sys.argv[1:] when omitted)
+    :return: The parsed arguments, with "path_pattern", "workers" and "questions"
+    '''
+    parser = argparse.ArgumentParser(description="Aggregate many restaurant sales csv files in parallel")
+    parser.add_argument("path_pattern", help="directory of csv files, or a glob pattern")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument(
+        "--questions", type=int, nargs="+", choices=sorted(stream_analysis.question_printers),
+        default=sorted(stream_analysis.question_printers), help="questions to print, in order (default: all)",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    paths = find_csv_files(arguments.path_pattern)
+    if not paths:
+        print(f"No csv files found for {arguments.path_pattern}")
+        return
+
+    aggregates = aggregate_files(paths, arguments.workers)
+    if not aggregates:
+        print(f"No records found in the {len(paths)} csv files")
+        return
+
+    print(f"Aggregated {len(paths)} csv files\n")
+    totals = stream_analysis.finalise_aggregates(aggregates)
+    for question in arguments.questions:
+        stream_analysis.question_printers[question](totals)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+'''
+Composable filter pipeline, with the predicates fused into a single pass
+
+Drilling down with the curried filters of sales_data.py means nesting them, like
+create_filter_function_by_header("City")("London")(create_filter_function_by_header("Payment Method")("Cash")(data)),
+where every stage walks through the records again and builds another list(filter(...)) of them.
+
+Here each filter is a predicate (a function taking a record and returning True or False) made in the same curried
+style, and create_filter_pipeline() fuses any number of them into one predicate. The records are then walked
+through once, lazily: the pipeline returns an iterator, so no intermediate list is built, and the result can be fed
+straight to reduce() or to the group-by functions of sales_data.py (or turned into a list when one is needed).
+
+Equality predicates on several headers are fused further: create_predicate_by_headers() compares all the fields in
+one go through operator.itemgetter (a single tuple comparison per record, done in C).
+
+Usage: python pipeline.py [PATH] [--where City=London] [--where "Payment Method=Cash,Gift Card"] [--month 2022-12]
+'''
+
+from functools import reduce
+from operator import itemgetter
+import argparse
+
+from sales_data import (
+    fixed_to_float, get_month_from_record, get_record_quantity_fixed, get_record_revenue_fixed, parse_CSV_stream,
+    read_CSV_header, QUANTITY_SCALE, REVENUE_SCALE,
+)
+
+def create_predicate_by_headers(headers):
+    '''
+    Create a predicate on the values of several headers at once
+
+    :param headers: A tuple of the headers to be compared, like ("City", "Payment Method")
+    :return: A function that takes a tuple of the values (in the same order as the headers) and returns the predicate
+    '''
+    get_fields = itemgetter(*headers)
+
+    def create_predicate_by_values(values):
+        '''
+        Create the predicate matching the records holding the designated values
+
+        :param values: A tuple of values, one for each header, like ("London", "Cash")
+        :return: A function that takes a record and returns True if it holds every value
+        '''
+        # itemgetter() of a single header returns the field itself rather than a tuple of one
+        expected = values[0] if len(headers) == 1 else tuple(values)
+        return lambda record: get_fields(record) == expected
+    return create_predicate_by_values
+
+def create_predicate_by_header(header):
+    '''
+    Create a predicate on the value of a header, like create_filter_function_by_header() without the filtering
+
+    :param header: The header to be compared
+    :return: A function that takes the value (or a set/list/tuple of values, any of them matching) and returns the predicate
+    '''
+    def create_predicate_by_value(value):
+        if isinstance(value, (set, frozenset, list, tuple)):
+            values = frozenset(value)
+            return lambda record: record[header] in values
+        return lambda record: record[header] == value
+    return create_predicate_by_value
+
+def create_month_predicate(month):
+    '''
+    Create a predicate on the year & month of the "Date" field, like "2022-12" (see get_month_from_record())
+    '''
+    return lambda record: get_month_from_record(record) == month
+
+def fuse_predicates(predicates):
+    '''
+    Fuse a list of predicates into one predicate, checking them in order and stopping at the first one that fails
+
+    :param predicates: A list of predicates (the records all match when it is empty)
+    :return: A single predicate
+    '''
+    predicates = tuple(predicates)
+    if not predicates:
+        return lambda record: True
+    if len(predicates) == 1:
+        return predicates[0]
+    if len(predicates) == 2:
+        first, second = predicates
+        return lambda record: first(record) and second(record)
+    return lambda record: all(predicate(record) for predicate in predicates)
+
+def create_filter_pipeline(*predicates):
+    '''
+    Create a pipeline filtering the data on every predicate in a single, lazy pass
+
+    :param predicates: Any number of predicates, like create_predicate_by_header("City")("London")
+    :return: A function that takes the data (a list of dictionaries, or a stream of them) and returns an iterator of the matching records
+    '''
+    matches = fuse_predicates(predicates)
+
+    def get_filtered_records(data):
+        '''
+        Filter the data parameter on the fused predicate, without building any list
+
+        :param data: The data of the csv file (in the form of a list of dictionaries, or a stream of them)
+        :return: An iterator of the matching records
+        '''
+        return filter(matches, data)
+    return get_filtered_records
+
+def create_condition_predicates(conditions):
+    '''
+    Create the predicates of the parsed --where conditions, fusing every single-value condition into one predicate
+
+    :param conditions: A list of (header, set of values) tuples from parse_condition()
+    :return: A list of predicates, the fused equality predicate (if any) first
+    '''
+    equalities = [(header, next(iter(values))) for header, values in conditions if len(values) == 1]
+    predicates = [create_predicate_by_header(header)(values) for header, values in conditions if len(values) > 1]
+    if equalities:
+        headers, values = zip(*equalities)
+        predicates.insert(0, create_predicate_by_headers(headers)(values))
+    return predicates
+
+def parse_condition(text):
+    '''
+    Parse a --where condition like "City=London" or "Payment Method=Cash,Gift Card" into a (header, set of values) tuple
+
+    Used as the argparse type of the --where options of every command line (see check_condition_headers() for the headers)
+    '''
+    header, separator, values = text.partition("=")
+    if not separator or not header or not values:
+        raise argparse.ArgumentTypeError("expected HEADER=VALUE[,VALUE...]")
+    return (header, set(values.split(",")))
+
+def check_condition_headers(parser, path, conditions):
+    '''
+    Check that the headers of the parsed --where conditions are in the csv file, exiting through parser.error() otherwise
+
+    :param parser: The argparse parser of the command line
+    :param path: The file path to the CSV file
+    :param conditions: A list of (header, set of values) tuples from parse_condition()
+    '''
+    if not conditions:
+        return
+    try:
+        header = read_CSV_header(path)
+    except OSError as error:
+        parser.error(f"cannot read {path}: {error.strerror}")
+    unknown_headers = sorted({condition_header for condition_header, _ in conditions}.difference(header))
+    if unknown_headers:
+        parser.error(f"unknown --where header(s) {', '.join(unknown_headers)}, expected one of {', '.join(header)}")
+
+def parse_arguments(argv=None):
+    '''
+    Parse the command line arguments of the drill-down
+
+    :param argv: The list of arguments (sys.argv[1:] when omitted)
+    :return: The parsed arguments, with "path", "where" and "month"
+    '''
+    parser = argparse.ArgumentParser(description="Drill down into the sales records with several conditions in a single pass")
+    parser.add_argument("path", nargs="?", default="restaurant_sales_data.csv", help="path to the csv file (default: %(default)s)")
+    parser.add_argument("--where", type=parse_condition, action="append", default=[], help="keep only HEADER=VALUE[,VALUE...] (repeatable)")
+    parser.add_argument("--month", default=None, help="keep only the year & month, like 2022-12")
+    arguments = parser.parse_args(argv)
+    check_condition_headers(parser, arguments.path, arguments.where)
+    return arguments
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    predicates = create_condition_predicates(arguments.where)
+    if arguments.month:
+        predicates.append(create_month_predicate(arguments.month))
+
+    # The streamed records are filtered & summed on the fly (as fixed-point integers), so only the running totals are kept
+    totals = reduce(
+        lambda totals, record: (totals[0] + 1, totals[1] + get_record_quantity_fixed(record), totals[2] + get_record_revenue_fixed(record)),
+        create_filter_pipeline(*predicates)(parse_CSV_stream(arguments.path)),
+        (0, 0, 0),
+    )
+    print(f"Records: {totals[0]}")
+    print(f"Quantity: {fixed_to_float(totals[1], QUANTITY_SCALE):.2f}")
+    print(f"Revenue: ${fixed_to_float(totals[2], REVENUE_SCALE):.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+'''
+Streaming quantile sketches (KLL), for the percentiles of the quantity & revenue of each product and city
+
+An exact median or 99th percentile needs every value of the group sorted. A KLL sketch keeps a few hundred of them
+instead, whatever the number of records: the values are added to a buffer (level 0), and whenever a level is full it
+is sorted and every other value is promoted to the next level, where each value stands for twice as many records.
+The rank of any value is then known within about 1 % of the number of records (for the default k = 200).
+
+Sketches are merged by concatenating their levels and compacting again, so the sketches of different files or worker
+processes merge into the sketch of all their records (like the partial sums of multi_file.py). Every other compaction
+keeps the odd rather than the even values (instead of tossing a coin), so the same records always give the same sketch.
+
+The sketch is a dictionary, like
+{"k": 200, "count": number of values added, "levels": [[values], [values], ...], "compactions": number of compactions so far}
+(the parity of "compactions" decides which values of the next compaction are promoted)
+'''
+
+from functools import reduce
+import math
+
+DEFAULT_K = 200
+# The smallest level never holds fewer values than this
+MINIMUM_CAPACITY = 8
+# Each level below the top one holds about 2/3 of the values of the level above it
+CAPACITY_DECAY = 2 / 3
+DEFAULT_PERCENTILES = (0.5, 0.9, 0.99)
+
+def create_quantile_sketch(k=DEFAULT_K):
+    '''
+    Create an empty sketch
+
+    :param k: The number of values held by the top level (a bigger k is more accurate and takes more memory)
+    :return: A dictionary of the "k", the "count" and the "levels" of the sketch
+    '''
+    return {"k": k, "count": 0, "levels": [[]], "compactions": 0}
+
+def get_level_capacity(sketch, level):
+    '''
+    Get the number of values the designated level can hold before it is compacted
+    '''
+    depth = len(sketch["levels"]) - level - 1
+    return max(MINIMUM_CAPACITY, math.ceil(sketch["k"] * CAPACITY_DECAY ** depth))
+
+def compact_level(sketch, level):
+    '''
+    Sort the values of the designated level and promote every other one of them to the next level
+    '''
+    levels = sketch["levels"]
+    if level + 1 == len(levels):
+        levels.append([])
+    values = sorted(levels[level])
+    offset = sketch["compactions"] % 2
+    sketch["compactions"] += 1
+    # An odd value out stays on the level, so the total weight of the sketch does not change. It is taken from the
+    # end opposite to the values promoted (the largest one when the lower value of each pair is promoted, the
+    # smallest one otherwise), so neither end of the values is always left behind at the lower weight
+    kept = [values.pop(offset - 1)] if len(values) % 2 else []
+    levels[level + 1].extend(values[offset::2])
+    levels[level] = kept
+
+def compact_sketch(sketch):
+    '''
+    Compact every full level of the sketch, from the bottom up (a compaction may fill up the level above it)
+    '''
+    level = 0
+    while level < len(sketch["levels"]):
+        if len(sketch["levels"][level]) >= get_level_capacity(sketch, level):
+            compact_level(sketch, level)
+        level += 1
+    return sketch
+
+def is_sketch_full(sketch):
+    '''
+    Check whether any level of the sketch holds more values than it can
+    '''
+    return any(len(values) >= get_level_capacity(sketch, level) for level, values in enumerate(sketch["levels"]))
+
+def add_to_quantile_sketch(sketch, value):
+    '''
+    A function to be passed in as argument to reduce() for adding a value to a sketch
+
+    :param sketch: The sketch, updated in place
+    :param value: The number to be added
+    :return: The sketch
+    '''
+    sketch["levels"][0].append(value)
+    sketch["count"] += 1
+    if len(sketch["levels"][0]) >= get_level_capacity(sketch, 0):
+        compact_sketch(sketch)
+    return sketch
+
+def merge_quantile_sketches(left, right):
+    '''
+    Merge two sketches into a new sketch of the values of both
+
+    :param left: A sketch
+    :param right: A sketch with the same k
+    :return: A new sketch
+    '''
+    if left["k"] != right["k"]:
+        raise ValueError(f"Cannot merge sketches with k {left['k']} and {right['k']}")
+    level_count = max(len(left["levels"]), len(right["levels"]))
+    merged = {
+        "k": left["k"],
+        "count": left["count"] + right["count"],
+        "levels": [
+            (left["levels"][level] if level < len(left["levels"]) else [])
+            + (right["levels"][level] if level < len(right["levels"]) else [])
+            for level in range(level_count)
+        ],
+        "compactions": left["compactions"] + right["compactions"],
+    }
+    while is_sketch_full(merged):
+        compact_sketch(merged)
+    return merged
+
+def get_quantiles(sketch, fractions=DEFAULT_PERCENTILES):
+    '''
+    Estimate the quantiles of the values added to the sketch
+
+    :param sketch: A sketch
+    :param fractions: The quantiles to estimate, between 0 and 1, like (0.5, 0.9, 0.99) for the median, p90 & p99
+    :return: A dictionary of fraction -> estimated value (None for every fraction if the sketch is empty)
+    '''
+    # Each value of level h stands for 2 ** h of the values added
+    weighted_values = sorted((value, 1 << level) for level, values in enumerate(sketch["levels"]) for value in values)
+    total_weight = sum(weight for _, weight in weighted_values)
+    if not total_weight:
+        return {fraction: None for fraction in fractions}
+
+    quantiles = {}
+    cumulative_weight = 0
+    position = 0
+    for fraction in sorted(fractions):
+        target = fraction * total_weight
+        while position < len(weighted_values) - 1 and cumulative_weight + weighted_values[position][1] < target:
+            cumulative_weight += weighted_values[position][1]
+            position += 1
+        quantiles[fraction] = weighted_values[position][0]
+    return {fraction: quantiles[fraction] for fraction in fractions}
+
+def create_quantile_accumulator(key_function, value_function, k=DEFAULT_K):
+    '''
+    Create an accumulator that keeps a quantile sketch of the values of each group, like the quantity of each product
+
+    :param key_function: A function that takes a record and returns the value to group the record under
+    :param value_function: A function that takes a record and returns the number to be added to the sketch of its group
+    :param k: The k of the sketches
+    :return: A function (aggregate, record) -> aggregate to be passed in to reduce(), the aggregate being a dictionary of group value -> sketch
+    '''
+    def accumulate(aggregate, record):
+        '''
+        Add the value of the record parameter to the sketch of its group
+        '''
+        key = key_function(record)
+        if key not in aggregate:
+            aggregate[key] = create_quantile_sketch(k)
+        add_to_quantile_sketch(aggregate[key], value_function(record))
+        return aggregate
+    return accumulate
+
+def build_quantile_sketch(values, k=DEFAULT_K):
+    '''
+    Build the sketch of an iterable of numbers in one pass
+    '''
+    return reduce(add_to_quantile_sketch, values, create_quantile_sketch(k))
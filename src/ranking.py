@@ -0,0 +1,91 @@
+'''
+Top-K ranking with bounded heaps
+
+Sorting every group (or every record) just to print the first few of them is O(n log n) work and keeps a fully sorted
+copy around. heapq keeps at most k items at a time instead, which is O(n log k).
+
+- find_top_k() ranks any aggregate (a dictionary of group value -> total, like the ones of the group aggregate functions)
+- find_top_k_groups() aggregates the data by any grouping key and ranks the groups in one go
+- create_top_k_accumulator() keeps a running top k of the records while they arrive (to be passed in to reduce(),
+  like the accumulators in sales_data.py), e.g. the orders with the highest revenue from parse_CSV_stream()
+'''
+
+from functools import reduce
+from itertools import count
+import heapq
+
+from sales_data import create_group_aggregate_function
+
+def get_item_value(item):
+    '''
+    Get the value of a (group value, total) item, the default ranking key of find_top_k()
+    '''
+    return item[1]
+
+def find_top_k(aggregate, k, key_function=get_item_value):
+    '''
+    Find the k highest ranked items of an aggregate
+
+    :param aggregate: A dictionary of group value -> total, or an iterable of items (like a list of tuples)
+    :param k: The number of items to keep
+    :param key_function: A function that takes an item and returns the number it is ranked by (the total by default)
+    :return: A list of at most k items, highest first (items with the same rank keep their original order, the same as sorted())
+    '''
+    items = aggregate.items() if isinstance(aggregate, dict) else aggregate
+    return heapq.nlargest(k, items, key=key_function)
+
+def find_top_k_groups(data, key_function, value_function, k):
+    '''
+    Aggregate the data by the designated grouping key and find the k groups with the highest totals
+
+    :param data: The data of the csv file (in the form of a list of dictionaries, or a stream of them)
+    :param key_function: A function that takes a record and returns the value to group the record under, like lambda record: record["Product"]
+    :param value_function: A function that takes a record and returns the number to be summed, like get_record_revenue_fixed (or count_record)
+    :param k: The number of groups to keep
+    :return: A list of at most k (group value, total) tuples, highest first
+    '''
+    return find_top_k(create_group_aggregate_function(key_function)(value_function)(data), k)
+
+def create_top_k_accumulator(k, key_function):
+    '''
+    Create an accumulator that keeps the k highest ranked records seen so far
+
+    :param k: The number of records to keep
+    :param key_function: A function that takes a record and returns the number it is ranked by, like get_record_revenue_fixed
+    :return: A function (heap, record) -> heap to be passed in to reduce() with an empty list, see get_running_top_k() to read the heap
+    '''
+    # The arrival order breaks the ties, so the records themselves (dictionaries) are never compared
+    arrival_order = count()
+
+    def accumulate(heap, record):
+        '''
+        Push the record parameter into the heap, dropping the lowest ranked record once there are more than k
+        '''
+        # A later record with the same rank as the lowest kept one is not kept, the same as heapq.nlargest()
+        entry = (key_function(record), -next(arrival_order), record)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif heap and entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+        return heap
+    return accumulate
+
+def get_running_top_k(heap):
+    '''
+    Get the records kept by a top k accumulator, highest first
+
+    :param heap: The heap built by the accumulator from create_top_k_accumulator()
+    :return: A list of (rank, record) tuples, highest first
+    '''
+    return [(rank, record) for rank, _, record in sorted(heap, reverse=True)]
+
+def find_top_k_records(records, k, key_function):
+    '''
+    Find the k highest ranked records of a (possibly streamed) collection, keeping only k records in memory
+
+    :param records: An iterable of records, like the generator from parse_CSV_stream()
+    :param k: The number of records to keep
+    :param key_function: A function that takes a record and returns the number it is ranked by
+    :return: A list of (rank, record) tuples, highest first
+    '''
+    return get_running_top_k(reduce(create_top_k_accumulator(k, key_function), records, []))
@@ -0,0 +1,236 @@
+'''
+On-disk cache of the results of the questions, keyed by the fingerprint of the columns they read
+
+Every run of a question streams and sums the whole csv file again, even when the file has not changed since the
+last run. Here the result of each question (the aggregates its printer reads, see stream_analysis.py) is kept in a
+directory next to the csv file, like "restaurant_sales_data.csv.results", and is used again as long as the data it
+was computed from has not changed.
+
+The key of a result is the SHA-256 of the name of the analysis, its parameters (like the --where conditions of the
+runner) and the fingerprints of the columns it reads. Each column has its own fingerprint (the SHA-256 of all its
+values), so changing the "Manager" of a row only invalidates the results reading the "Manager" column (Question 3),
+while the others are still used. The columns are keyed by their sanitised headers, the same names the questions read. The fingerprints are stored in the index of the cache with the size & modification
+time of the csv file, and are only calculated again (in one pass over the file) when either of them changes.
+
+The cache is capped both in number of results and in bytes, and the least recently used results are evicted first.
+
+Layout of the cache directory:
+- index.json: the key of the csv file, the fingerprint of each column, and the size, columns & last use of each result
+- <key>.pickle: each result
+'''
+
+from itertools import islice
+import csv
+import hashlib
+import json
+import os
+import pickle
+import time
+
+from sales_data import sanitise_data_input
+
+# Version 2: the results of Question 5 hold the overall "total_revenue" (see stream_analysis.finalise_aggregates())
+# Version 3: the fingerprints are keyed by the sanitised headers, and hash every field of the short rows
+RESULT_CACHE_VERSION = 3
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 << 20
+# The number of rows hashed together, so the digests are updated once per chunk rather than once per field
+FINGERPRINT_CHUNK_SIZE = 65536
+# Hashed in place of the fields missing from a short row, so they are not mistaken for empty fields
+MISSING_FIELD = "\x00"
+
+def get_default_cache_directory(path):
+    '''
+    Get the cache directory used for the csv file when none is designated, like "restaurant_sales_data.csv.results"
+    '''
+    return path + ".results"
+
+def get_file_key(path):
+    '''
+    Get the size and modification time of the csv file, to notice when it changes without reading it
+    '''
+    status = os.stat(path)
+    return {"size": status.st_size, "mtime_ns": status.st_mtime_ns}
+
+def calculate_column_fingerprints(path):
+    '''
+    Calculate the fingerprint of every column of a csv file in a single pass
+
+    :param path: The file path to the CSV file
+    :return: A dictionary of (sanitised) header -> SHA-256 (hex digest) of the values of the column, in order
+    '''
+    with open(path, newline="", encoding="utf-8-sig") as csv_file:
+        reader = csv.reader(csv_file)
+        header = [sanitise_data_input(h) for h in next(reader, [])]
+        digests = [hashlib.sha256() for _ in header]
+        width = len(header)
+        # Blank lines are skipped, as csv.DictReader does, and every row is padded (or cut) to one field per header:
+        # zip(*chunk) stops at the shortest row, which would leave the later columns of the chunk out of their hash
+        rows = ((row + [MISSING_FIELD] * (width - len(row)))[:width] for row in reader if row)
+        for chunk in iter(lambda: list(islice(rows, FINGERPRINT_CHUNK_SIZE)), []):
+            for digest, values in zip(digests, zip(*chunk)):
+                digest.update("\x1f".join(values).encode("utf-8"))
+                digest.update(b"\x1e")
+    return {name: digest.hexdigest() for name, digest in zip(header, digests)}
+
+def get_index_path(cache_directory):
+    return os.path.join(cache_directory, "index.json")
+
+def get_result_path(cache_directory, key):
+    return os.path.join(cache_directory, key + ".pickle")
+
+def read_index(cache_directory):
+    '''
+    Read the index of a cache directory
+
+    :return: The index, or an empty one if there is no (usable) index
+    '''
+    try:
+        with open(get_index_path(cache_directory)) as index_file:
+            index = json.load(index_file)
+    except (FileNotFoundError, ValueError):
+        index = {}
+    if index.get("version") != RESULT_CACHE_VERSION:
+        return {"version": RESULT_CACHE_VERSION, "source": None, "columns": {}, "entries": {}}
+    return index
+
+def remove_entry(cache, key):
+    '''
+    Remove a result from the cache (both its entry in the index and its file)
+    '''
+    cache["index"]["entries"].pop(key, None)
+    try:
+        os.remove(get_result_path(cache["directory"], key))
+    except FileNotFoundError:
+        pass
+
+def refresh_fingerprints(cache):
+    '''
+    Calculate the column fingerprints again if the csv file changed, and remove the results of the columns that changed
+
+    A result whose columns all kept the same fingerprint is still valid, even though the file changed.
+    '''
+    index = cache["index"]
+    file_key = get_file_key(cache["path"])
+    if index["source"] == file_key:
+        return
+    columns = calculate_column_fingerprints(cache["path"])
+    for key, entry in list(index["entries"].items()):
+        if any(columns.get(header) != fingerprint for header, fingerprint in entry["columns"].items()):
+            remove_entry(cache, key)
+    index["source"] = file_key
+    index["columns"] = columns
+
+def create_result_cache(path, cache_directory=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+    '''
+    Open the result cache of a csv file, creating its directory if needed
+
+    :param path: The file path to the CSV file
+    :param cache_directory: The cache directory (get_default_cache_directory() when omitted)
+    :param max_entries: The maximum number of results kept
+    :param max_bytes: The maximum total size of the results kept
+    :return: A dictionary of the "path", the "directory", the "index" and the limits of the cache
+    '''
+    cache_directory = cache_directory or get_default_cache_directory(path)
+    os.makedirs(cache_directory, exist_ok=True)
+    cache = {
+        "path": path,
+        "directory": cache_directory,
+        "index": read_index(cache_directory),
+        "max_entries": max_entries,
+        "max_bytes": max_bytes,
+    }
+    refresh_fingerprints(cache)
+    return cache
+
+def get_result_key(cache, analysis, parameters, columns):
+    '''
+    Get the key of the result of an analysis
+
+    :param cache: A cache from create_result_cache()
+    :param analysis: The name of the analysis, like "question_3"
+    :param parameters: The parameters of the analysis (anything JSON can hold, with sets turned into sorted lists)
+    :param columns: The headers of the columns the analysis reads (including the ones it filters on)
+    :return: A tuple of two elements, (the key, a dictionary of header -> fingerprint of the columns)
+    '''
+    fingerprints = {header: cache["index"]["columns"].get(header) for header in sorted(columns)}
+    text = json.dumps([analysis, parameters, fingerprints], sort_keys=True)
+    return (hashlib.sha256(text.encode("utf-8")).hexdigest(), fingerprints)
+
+def read_result(cache, key):
+    '''
+    Read a result from the cache, marking it as the most recently used
+
+    :return: A tuple of two elements, (True, the result) if the result is cached, (False, None) otherwise
+    '''
+    entry = cache["index"]["entries"].get(key)
+    if entry is None:
+        return (False, None)
+    try:
+        with open(get_result_path(cache["directory"], key), "rb") as result_file:
+            result = pickle.load(result_file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        remove_entry(cache, key)
+        return (False, None)
+    entry["last_used"] = time.time()
+    return (True, result)
+
+def evict_results(cache):
+    '''
+    Remove the least recently used results until the cache is within both of its limits
+    '''
+    entries = cache["index"]["entries"]
+    total_bytes = sum(entry["size"] for entry in entries.values())
+    for key in sorted(entries, key=lambda key: entries[key]["last_used"]):
+        if len(entries) <= cache["max_entries"] and total_bytes <= cache["max_bytes"]:
+            break
+        total_bytes -= entries[key]["size"]
+        remove_entry(cache, key)
+
+def write_result(cache, key, fingerprints, result):
+    '''
+    Write a result to the cache (through a temporary file, so a half written result is never read), then evict the
+    least recently used results if the cache is over its limits
+    '''
+    result_path = get_result_path(cache["directory"], key)
+    with open(result_path + ".tmp", "wb") as result_file:
+        pickle.dump(result, result_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(result_path + ".tmp", result_path)
+    cache["index"]["entries"][key] = {"size": os.path.getsize(result_path), "columns": fingerprints, "last_used": time.time()}
+    evict_results(cache)
+
+def save_index(cache):
+    '''
+    Save the index of the cache (through a temporary file, like the results)
+    '''
+    index_path = get_index_path(cache["directory"])
+    with open(index_path + ".tmp", "w") as index_file:
+        json.dump(cache["index"], index_file)
+    os.replace(index_path + ".tmp", index_path)
+
+def memoize_results(cache, requests, compute_missing):
+    '''
+    Get the results of several analyses from the cache, computing the missing ones together
+
+    :param cache: A cache from create_result_cache()
+    :param requests: A dictionary of analysis name -> (parameters, columns), see get_result_key()
+    :param compute_missing: A function that takes the list of the analysis names missing from the cache and returns
+                            a dictionary of analysis name -> result for them (so they can share a single pass over the file)
+    :return: A dictionary of analysis name -> result
+    '''
+    keys = {name: get_result_key(cache, name, parameters, columns) for name, (parameters, columns) in requests.items()}
+    results = {}
+    for name, (key, _) in keys.items():
+        found, result = read_result(cache, key)
+        if found:
+            results[name] = result
+
+    missing = [name for name in requests if name not in results]
+    if missing:
+        computed = compute_missing(missing)
+        for name in missing:
+            key, fingerprints = keys[name]
+            write_result(cache, key, fingerprints, computed[name])
+            results[name] = computed[name]
+    save_index(cache)
+    return results
@@ -0,0 +1,537 @@
+'''
+Shared helpers for the question modules in src (parsing, sanitising and grouping the sales data)
+
+The question modules originally filter the dataset once per unique value of a header, which scans the whole
+dataset again for every value. The group-by functions here partition (or aggregate) the records in a single pass
+instead, while keeping the same curried style as create_filter_function_by_header().
+'''
+
+from decimal import Decimal, InvalidOperation
+from functools import reduce, lru_cache
+import re
+import csv
+
+from instrumentation import instrument_function, is_instrumentation_enabled, timed_stage
+from indexes import create_indexed_filter_function_by_header
+
+# Compiled once, rather than every time a field is sanitised
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Maximum number of raw strings remembered by sanitise_categorical_input()
+SANITISE_CACHE_SIZE = 4096
+
+# Headers whose values are (mostly) unique for each record, so memoizing their sanitised values is not worth it
+NUMERIC_HEADERS = ("Order ID", "Price", "Quantity")
+
+# Fixed-point scales (powers of 10): prices in cents & quantities in hundredths, so a revenue is in 1/10000 of the currency
+PRICE_SCALE = 100
+QUANTITY_SCALE = 100
+REVENUE_SCALE = PRICE_SCALE * QUANTITY_SCALE
+
+def parse_CSV(path):
+    '''
+    Parse a CSV file given a file path
+
+    :param path: The file path to the CSV file 
+    :return: A tuple of two elements, (a list of headers, a list of dictionaries containing the data)
+    '''
+    with open(path, newline="") as csv_file:
+        read_dictionary = csv.DictReader(csv_file)
+        return (read_dictionary.fieldnames, list(read_dictionary))
+
+def read_CSV_header(path):
+    '''
+    Read only the header of a CSV file
+
+    :param path: The file path to the CSV file
+    :return: The list of the sanitised headers of the file (empty for an empty file)
+    '''
+    with open(path, newline="", encoding="utf-8-sig") as csv_file:
+        return [sanitise_data_input(h) for h in next(csv.reader(csv_file), [])]
+
+def parse_CSV_stream(path, columns=None, field_filters=None):
+    '''
+    Parse a CSV file given a file path lazily, yielding one sanitised record at a time
+
+    Only the current record is held in memory, so this can be fed into the accumulators below for files larger than
+    the available memory. The file is closed once the records are exhausted (or the generator is closed).
+
+    :param path: The file path to the CSV file
+    :param columns: The (sanitised) headers to keep in each record, all of them when omitted (see create_projected_record_sanitiser())
+    :param field_filters: An optional dictionary of header -> predicate on the sanitised value, the rows failing any of them are skipped
+    :return: A generator of dictionaries containing the sanitised data, one for each record
+    '''
+    with open(path, newline="", encoding="utf-8-sig") as csv_file:
+        reader = csv.reader(csv_file)
+        sanitise_record = create_projected_record_sanitiser(next(reader, []), columns, field_filters)
+        # The records are consumed by the caller as they are read, so only the sanitising of each one is timed here
+        if is_instrumentation_enabled():
+            sanitise_record = instrument_function("sales_data", "sanitise", lambda row: 1)(sanitise_record)
+        # Blank lines are skipped (as csv.DictReader does), and so are the rows failing a field filter
+        yield from filter(None, map(sanitise_record, filter(None, reader)))
+
+def parse_CSV_sanitised(path, columns=None, field_filters=None):
+    '''
+    Parse a CSV file given a file path and sanitise it, replacing parse_CSV() followed by sanitise_data_input() on every key and value
+
+    :param path: The file path to the CSV file
+    :param columns: The (sanitised) headers to keep in each record, all of them when omitted (see create_projected_record_sanitiser())
+    :param field_filters: An optional dictionary of header -> predicate on the sanitised value, the rows failing any of them are dropped
+    :return: A tuple of two elements, (a list of all the sanitised headers of the file, a list of dictionaries containing the sanitised data)
+    '''
+    with timed_stage("sales_data", "parse_CSV") as stage, open(path, newline="", encoding="utf-8-sig") as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, [])
+        sanitise_record = create_projected_record_sanitiser(header, columns, field_filters)
+        # Only wrapped while the instrumentation is on, so the records are not slowed down otherwise
+        if is_instrumentation_enabled():
+            sanitise_record = instrument_function("sales_data", "sanitise", lambda row: 1)(sanitise_record)
+        sanitised_data = list(filter(None, map(sanitise_record, filter(None, reader))))
+        stage["rows"] = len(sanitised_data)
+    return ([sanitise_data_input(h) for h in header], sanitised_data)
+
+def sanitise_data_input(entry: str):
+    '''
+    Sanitise the input string parameter
+
+    :param entry: A string to be sanitised 
+    :return: A string argument, with any leading & trailing whitespaces removed and also any additional whitespaces between words removed
+
+    Example: 
+    Pass in: "   Hello   World!        "
+    Returns: "Hello World!"
+    '''
+    return " ".join(WHITESPACE_PATTERN.split(entry)).strip()
+
+# The categorical fields (manager, city, product, etc.) only have a handful of unique values repeated in every record,
+# so their sanitised values are remembered instead of running the regex again (least recently used ones are dropped)
+sanitise_categorical_input = lru_cache(maxsize=SANITISE_CACHE_SIZE)(sanitise_data_input)
+
+def create_record_sanitiser(header):
+    '''
+    Create a function to sanitise the rows of a csv file, with the header keys sanitised only once for the whole file
+
+    :param header: The (raw) list of headers of the csv file
+    :return: A function that takes a row (list of raw strings) and returns a dictionary of sanitised header -> sanitised value
+    '''
+    sanitised_header = [sanitise_data_input(h) for h in header]
+    # Decide the sanitiser for each column once, rather than for each field
+    value_sanitisers = [
+        sanitise_data_input if h in NUMERIC_HEADERS else sanitise_categorical_input
+        for h in sanitised_header
+    ]
+    def sanitise_record(row):
+        '''
+        Sanitise the row parameter (list of raw strings in the same order as the header) into a dictionary
+        '''
+        return {h: sanitise(value) for h, sanitise, value in zip(sanitised_header, value_sanitisers, row)}
+    return sanitise_record
+
+def create_projected_record_sanitiser(header, columns=None, field_filters=None):
+    '''
+    Create a function to sanitise only the designated columns of the rows of a csv file, dropping the rows failing a field filter
+
+    The fields of the filters are sanitised & checked first, so a dropped row never has its other fields sanitised or a
+    dictionary built, and the fields of the columns not kept are never sanitised at all.
+
+    :param header: The (raw) list of headers of the csv file
+    :param columns: The (sanitised) headers to keep in each record, in any order (all of them when omitted)
+    :param field_filters: An optional dictionary of (sanitised) header -> function taking the sanitised value and returning True to keep the row
+    :return: A function that takes a row (list of raw strings) and returns a dictionary of the kept headers -> sanitised value, or None if the row is dropped
+    '''
+    if columns is None and not field_filters:
+        return create_record_sanitiser(header)
+
+    sanitised_header = [sanitise_data_input(h) for h in header]
+    unknown_headers = set(columns or ()).union(field_filters or ()).difference(sanitised_header)
+    # An empty file has no header (and no rows to sanitise), so it is not checked
+    if header and unknown_headers:
+        raise ValueError(f"Unknown headers: {', '.join(sorted(unknown_headers))}")
+
+    def get_sanitiser(h):
+        return sanitise_data_input if h in NUMERIC_HEADERS else sanitise_categorical_input
+
+    # (header, position in the row, sanitiser) of each kept column, in the order of the file
+    kept_columns = [
+        (h, position, get_sanitiser(h)) for position, h in enumerate(sanitised_header)
+        if columns is None or h in columns
+    ]
+    # (position in the row, sanitiser, predicate) of each filtered field
+    filtered_fields = [
+        (sanitised_header.index(h), get_sanitiser(h), predicate) for h, predicate in (field_filters or {}).items()
+    ]
+
+    def sanitise_record(row):
+        '''
+        Check the filtered fields of the row parameter, then sanitise only its kept columns into a dictionary
+        '''
+        for position, sanitise, predicate in filtered_fields:
+            if position >= len(row) or not predicate(sanitise(row[position])):
+                return None
+        # Fields missing from a short row are left out, the same as create_record_sanitiser()
+        return {h: sanitise(row[position]) for h, position, sanitise in kept_columns if position < len(row)}
+    return sanitise_record
+
+def create_value_filter(values):
+    '''
+    Create a field filter (for the field_filters of parse_CSV_sanitised()) keeping the rows holding one of the designated values
+    '''
+    values = frozenset([values] if isinstance(values, str) else values)
+    return lambda value: value in values
+
+def create_analysis_context(path, columns=None, field_filters=None):
+    '''
+    Parse & sanitise a CSV file once into a context that can be shared by the analyses of every question
+
+    :param path: The file path to the CSV file
+    :param columns: The (sanitised) headers to keep in each record, all of them when omitted
+    :param field_filters: An optional dictionary of header -> predicate on the sanitised value, the rows failing any of them are dropped
+    :return: A dictionary with the "header", the sanitised "data", the lazily built "get_unique_values" & "get_value_filter_functions"
+             (see create_filter_registry()), and the functions reading the records (see create_data_context())
+    '''
+    header, sanitised_data = parse_CSV_sanitised(path, columns, field_filters)
+    return create_data_context(path, header, sanitised_data)
+
+def create_data_context(path, header, data):
+    '''
+    Create the context of data that is already sanitised, with a new (empty) filter registry
+
+    Besides the filter registry, the question modules only read the records of a context through its functions:
+    - "group_by_header": like create_group_by_function_by_header()
+    - "get_field_values": like get_field_values()
+    - "get_total_quantity_fixed" & "get_total_revenue_fixed": like get_total_quantity_fixed() & get_total_revenue_fixed()
+    so the same analyses run on a context whose records are the rows of a columnar table (see columnar.create_table_context())
+
+    :param path: The file path to the CSV file the data was read from
+    :param header: The list of sanitised headers
+    :param data: The sanitised data (in the form of a list of dictionaries)
+    :return: A dictionary in the same form as the one returned by create_analysis_context()
+    '''
+    # The filter functions of the categorical headers are answered from bitmap indexes of the data (see indexes.py)
+    get_unique_values, get_value_filter_functions = create_filter_registry(
+        data, create_indexed_filter_function_by_header(data, create_filter_function_by_header)
+    )
+    return {
+        "path": path,
+        "header": header,
+        "data": data,
+        "get_unique_values": get_unique_values,
+        "get_value_filter_functions": get_value_filter_functions,
+        "group_by_header": create_group_by_function_by_header,
+        "get_field_values": get_field_values,
+        "get_total_quantity_fixed": get_total_quantity_fixed,
+        "get_total_revenue_fixed": get_total_revenue_fixed,
+    }
+
+def calculate_sum(accumulator, value):
+    '''
+    A function to be passed in as argument to reduce() for calculating summation of values
+    '''
+    return accumulator + value
+
+'''
+Fixed-point (integer) value functions
+
+Summing floats gives a result that depends on the order of the additions (and drifts over millions of records), so the
+totals of a sharded or multi-process run could differ from the ones of a serial run in the last digits. The prices
+and quantities are parsed from their decimal strings straight into integers instead (no float in between), so the
+sums are exact and the same in any order. fixed_to_float() only converts the final totals back, for printing.
+'''
+@lru_cache(maxsize=SANITISE_CACHE_SIZE)
+def parse_fixed_point(text, scale):
+    '''
+    Parse a decimal string into an integer number of 1/scale units, like parse_fixed_point("3.49", 100) -> 349
+
+    :param text: A decimal string, like "200.4"
+    :param scale: The number of units in 1 (a power of 10)
+    :return: The integer value, always exact
+    :raises ValueError: When the text is not a number, or has more decimals than the scale holds (like "1.005" in hundredths)
+    '''
+    sign, digits = ("-", text[1:]) if text.startswith("-") else ("", text.lstrip("+"))
+    whole, _, fraction = digits.partition(".")
+    decimals = len(str(scale)) - 1
+    if (whole.isdigit() or (not whole and fraction)) and (fraction.isdigit() or not fraction) and len(fraction) <= decimals:
+        value = int(whole or "0") * scale + int(fraction.ljust(decimals, "0") or "0")
+        return -value if sign else value
+    # Anything else (trailing zeros, an exponent, ...) goes through Decimal, which never rounds through a float
+    try:
+        value = Decimal(text) * scale
+    except InvalidOperation:
+        value = None
+    if value is None or not value.is_finite():
+        raise ValueError(f"Not a decimal number: {text!r}")
+    if value != value.to_integral_value():
+        raise ValueError(f"{text!r} has more decimals than a scale of {scale} can hold exactly")
+    return int(value)
+
+def get_record_price_fixed(record):
+    '''
+    Get the value of the "Price" field of the record parameter in cents (PRICE_SCALE)
+    '''
+    return parse_fixed_point(record["Price"], PRICE_SCALE)
+
+def get_record_quantity_fixed(record):
+    '''
+    Get the value of the "Quantity" field of the record parameter in hundredths (QUANTITY_SCALE)
+    '''
+    return parse_fixed_point(record["Quantity"], QUANTITY_SCALE)
+
+def get_record_revenue_fixed(record):
+    '''
+    Get the revenue of the record parameter in 1/10000 of the currency (REVENUE_SCALE), exactly
+    '''
+    return get_record_price_fixed(record) * get_record_quantity_fixed(record)
+
+def get_total_quantity_fixed(records):
+    '''
+    Sum the "Quantity" of a collection of records (list of dictionaries) exactly, in hundredths (QUANTITY_SCALE)
+    '''
+    return reduce(calculate_sum, map(get_record_quantity_fixed, records), 0)
+
+def get_total_revenue_fixed(records):
+    '''
+    Sum the revenue of a collection of records (list of dictionaries) exactly, in 1/10000 of the currency (REVENUE_SCALE)
+    '''
+    return reduce(calculate_sum, map(get_record_revenue_fixed, records), 0)
+
+def fixed_to_float(value, scale):
+    '''
+    Convert a fixed-point total back into a float, like fixed_to_float(349, PRICE_SCALE) -> 3.49
+    '''
+    return value / scale
+
+def get_field_values(records, header):
+    '''
+    Get the (sanitised) values of a field for each of a collection of records (list of dictionaries), in the same order
+    '''
+    return [record[header] for record in records]
+
+def count_record(record):
+    '''
+    Count the record parameter as 1, to be used as a value function when counting records per group
+    '''
+    return 1
+
+'''
+This function is used to create various functions to be applied to the csv data for filtering purposes
+
+Function currying is utilised, where the outer function(?) returns another function reference to be applied for
+more specification of the filtering criteria
+
+create_filter_function_by_header() is to designate the header (or column of the csv file) where the filtering is to be performed.
+create_filter_function_by_value() is to designate the value to be compared against the entries of the csv file to filter the records.
+get_filtered_list() is the actual function that returns the actual filtered list based on the specified predicates/criteria
+'''
+def create_filter_function_by_header(header):
+    '''
+    Create a function to filter the data of the csv file based on the designated header
+
+    :param header: The header to be used as a predicate for filtering the records
+    :return: A function for filtering the data of the csv file based on the designated value
+    '''
+    def create_filter_function_by_value(value):
+        '''
+        Create a function to filter the data of the csv file based on the designated value
+
+        :param value: The value to be used as a predicate for filtering the records
+        :return: A function to obtain a list of dictionaries containing the filtered records
+        '''
+        def get_filtered_list(data):
+            '''
+            Filter the data parameter (list of dictionaries) based on the predicates designated by the two outer functions
+
+            :param data: The data of the csv file to be filtered (in the form of a list of dictionaries)
+            :return: A list of dictionaries containing only the records for the designated header and value
+            '''
+            return list((filter(lambda x: x[header] == value, data)))
+        return get_filtered_list
+    
+    return create_filter_function_by_value
+
+'''
+The group-by functions follow the same currying approach as create_filter_function_by_header()
+
+create_group_by_function() is to designate how the grouping key is obtained from each record.
+get_grouped_records() is the actual function that walks through the data once and returns a dictionary of key -> list of records
+
+So instead of building one filter function per unique value and applying every one of them to the whole dataset,
+a single call of get_grouped_records() gives the same lists of records, keyed by their value.
+'''
+def create_group_by_function(key_function):
+    '''
+    Create a function to group the data of the csv file based on the designated key function
+
+    :param key_function: A function that takes a record (dictionary) and returns the value to group the record under
+    :return: A function to obtain a dictionary of value -> list of records sharing that value
+    '''
+    def get_grouped_records(data):
+        '''
+        Partition the data parameter into groups in one pass, based on the key function designated by the outer function
+
+        :param data: The data of the csv file to be grouped (in the form of a list of dictionaries)
+        :return: A dictionary of value -> list of dictionaries, in the order each value is first encountered
+        '''
+        groups = {}
+        for record in data:
+            groups.setdefault(key_function(record), []).append(record)
+        return groups
+    return get_grouped_records
+
+def create_group_by_function_by_header(header):
+    '''
+    Create a function to group the data of the csv file based on the designated header
+
+    :param header: The header whose values are used to group the records
+    :return: A function to obtain a dictionary of value -> list of records for the designated header
+    '''
+    return create_group_by_function(lambda record: record[header])
+
+def create_group_aggregate_function(key_function):
+    '''
+    Create a function to aggregate the data of the csv file per group, without building the lists of records
+
+    :param key_function: A function that takes a record (dictionary) and returns the value to group the record under
+    :return: A function for aggregating the data of each group based on the designated value function
+    '''
+    def create_group_aggregate_function_by_value(value_function):
+        '''
+        Create a function to aggregate the data of each group based on the designated value function
+
+        :param value_function: A function that takes a record (dictionary) and returns the number to be summed
+        :return: A function to obtain a dictionary of group value -> summation of value_function over the group
+        '''
+        def get_grouped_aggregate(data):
+            '''
+            Sum value_function over each group of the data parameter in one pass
+
+            :param data: The data of the csv file to be aggregated (in the form of a list of dictionaries)
+            :return: A dictionary of value -> aggregated sum, in the order each value is first encountered
+            '''
+            return reduce(create_group_accumulator(key_function, value_function), data, {})
+        return get_grouped_aggregate
+    return create_group_aggregate_function_by_value
+
+def create_group_aggregate_function_by_header(header):
+    '''
+    Create a function to aggregate the data of the csv file per unique value of the designated header
+
+    :param header: The header whose values are used to group the records
+    :return: A function for aggregating the data of each group based on the designated value function
+    '''
+    return create_group_aggregate_function(lambda record: record[header])
+
+def get_month_from_date(date):
+    '''
+    Get the year & month of a "DD-MM-YYYY" date, like "2022-11" from "07-11-2022"
+
+    The year is kept so that the same month of different years is not grouped together, and the keys sort chronologically
+    '''
+    return date[6:10] + "-" + date[3:5]
+
+def get_month_from_record(record):
+    '''
+    Get the year & month of the "Date" field of the record parameter, like "2022-11" from "07-11-2022" (see get_month_from_date())
+    '''
+    return get_month_from_date(record["Date"])
+
+'''
+Accumulators are the incremental version of the group aggregate functions above, to be passed in to reduce()
+together with an initial (empty) aggregate, like reduce(accumulator, records, {})
+
+Since reduce() consumes its iterable one record at a time, an accumulator can be fed with parse_CSV_stream() to
+aggregate a file without keeping its records in memory. combine_accumulators() lets several aggregates be
+computed in the same single pass over the records.
+'''
+def create_group_accumulator(key_function, value_function):
+    '''
+    Create an accumulator that sums value_function for each group designated by key_function
+
+    :param key_function: A function that takes a record (dictionary) and returns the value to group the record under
+    :param value_function: A function that takes a record (dictionary) and returns the number to be summed
+    :return: A function (aggregate, record) -> aggregate, where aggregate is a dictionary of group value -> running sum
+    '''
+    def accumulate(aggregate, record):
+        '''
+        Add the value of the record parameter to the running sum of its group in the aggregate parameter
+        '''
+        key = key_function(record)
+        aggregate[key] = calculate_sum(aggregate.get(key, 0), value_function(record))
+        return aggregate
+    return accumulate
+
+def create_group_set_accumulator(key_function, value_function):
+    '''
+    Create an accumulator that collects the unique values of value_function for each group designated by key_function
+
+    :param key_function: A function that takes a record (dictionary) and returns the value to group the record under
+    :param value_function: A function that takes a record (dictionary) and returns the value to be collected
+    :return: A function (aggregate, record) -> aggregate, where aggregate is a dictionary of group value -> set of values
+    '''
+    def accumulate(aggregate, record):
+        '''
+        Add the value of the record parameter to the set of its group in the aggregate parameter
+        '''
+        aggregate.setdefault(key_function(record), set()).add(value_function(record))
+        return aggregate
+    return accumulate
+
+def combine_accumulators(name_to_accumulator):
+    '''
+    Combine several accumulators so that all of them are updated in the same pass over the records
+
+    :param name_to_accumulator: A dictionary of name -> accumulator
+    :return: A function (aggregates, record) -> aggregates, where aggregates is a dictionary of name -> aggregate of that accumulator
+    '''
+    def accumulate(aggregates, record):
+        '''
+        Feed the record parameter to every accumulator, each one updating its own aggregate in the aggregates parameter
+        '''
+        for name, accumulator in name_to_accumulator.items():
+            aggregates[name] = accumulator(aggregates.get(name, {}), record)
+        return aggregates
+    return accumulate
+
+'''
+The filter registry replaces the eagerly built header_to_values & header_to_unique_value_filter_func dictionaries
+
+Instead of building the unique values and the filter functions for every header up front (including "Order ID", where
+there would be one filter function per record), they are only built for a header the first time it is asked for,
+and then kept for the next time.
+'''
+def create_filter_registry(data, create_filter_function=create_filter_function_by_header, get_values=get_field_values):
+    '''
+    Create a registry of unique values & filter functions for the data parameter, built lazily for each header
+
+    :param data: The data of the csv file (in the form of a list of dictionaries)
+    :param create_filter_function: The curried function used to create the filter functions (like the bitmap index based one in indexes.py)
+    :param get_values: The function (records, header) -> values of the field for each record (see get_field_values())
+    :return: A tuple of two functions, (get_unique_values(header), get_value_filter_functions(header))
+    '''
+    header_to_values = {}
+    header_to_unique_value_filter_func = {}
+
+    def get_unique_values(header):
+        '''
+        Get the unique values for the designated header, in the order they are first encountered in the data
+
+        :param header: The header (column) of the csv file
+        :return: A list of the unique values under the header
+        '''
+        if header not in header_to_values:
+            header_to_values[header] = list(dict.fromkeys(get_values(data, header)))
+        return header_to_values[header]
+
+    def get_value_filter_functions(header):
+        '''
+        Get the list of filter functions for each unique value of the designated header (in the same order as get_unique_values())
+
+        :param header: The header (column) of the csv file
+        :return: A list of functions, each one obtaining the list of records for one unique value when applied on the data
+        '''
+        if header not in header_to_unique_value_filter_func:
+            header_to_unique_value_filter_func[header] = list(
+                map(create_filter_function(header), get_unique_values(header))
+            )
+        return header_to_unique_value_filter_func[header]
+
+    return (get_unique_values, get_value_filter_functions)
@@ -0,0 +1,243 @@
+'''
+Local HTTP service answering the five questions (and ad-hoc group-bys) as JSON from a warm in-memory dataset
+
+Each question module is a one-shot script that parses the csv file again on every run. Here the file is streamed once
+when the service starts: the same pass feeds the accumulators of stream_analysis.py (the answers of the questions)
+and builds the cube of cube.py (for any roll-up or slice), and every request is answered from them. The results of
+the requests are kept in a small LRU cache, and everything is reloaded (in a worker thread, while the previous data
+keeps being served) once the csv file changes on disk.
+
+Endpoints (GET only):
+- /health: the number of records and when they were loaded
+- /questions: the answers of all the questions
+- /questions/<1 - 5>: the answer of one question
+- /query?by=City&by=Month&measure=revenue&where=Purchase Type=Online: a roll-up of the cube (see cube.query_cube()),
+  where "measure" is one of quantity, revenue or count, and "where" is DIMENSION=VALUE[,VALUE...] (repeatable)
+
+Usage: python service.py [PATH] [--host 127.0.0.1] [--port 8080] [--cache-size 256]
+'''
+
+from collections import OrderedDict
+from datetime import datetime
+from functools import reduce
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import asyncio
+import json
+import os
+
+from sales_data import combine_accumulators, parse_CSV_stream
+import cube
+import stream_analysis
+
+DEFAULT_CACHE_SIZE = 256
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+def get_file_key(path):
+    '''
+    Get the (size, modification time) of a file, to notice when it changes without reading it
+    '''
+    status = os.stat(path)
+    return (status.st_size, status.st_mtime_ns)
+
+def load_dataset(path):
+    '''
+    Stream the csv file once into the question aggregates and the cube
+
+    :param path: The file path to the CSV file
+    :return: A dictionary of the "file_key", the finalised "aggregates", the "cube", the "record_count" and "loaded_at"
+    '''
+    file_key = get_file_key(path)
+    accumulators = {**stream_analysis.question_accumulators, "cube_cells": cube.add_record_to_cells}
+    aggregates = reduce(combine_accumulators(accumulators), parse_CSV_stream(path), {})
+    cube_cells = aggregates.pop("cube_cells", {})
+    return {
+        "file_key": file_key,
+        "aggregates": stream_analysis.finalise_aggregates(aggregates),
+        "cube": {"dimensions": list(cube.CUBE_DIMENSIONS), "cells": cube_cells},
+        "record_count": sum(cell[2] for cell in cube_cells.values()),
+        "loaded_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+def to_json_value(value):
+    '''
+    Convert an aggregate into values JSON can hold: tuple keys become nested objects (like city -> month -> revenue),
+    and sets become sorted lists
+    '''
+    if isinstance(value, set):
+        return sorted(value)
+    if not isinstance(value, dict):
+        return value
+
+    converted = {}
+    for key, item in value.items():
+        if isinstance(key, tuple):
+            nested = converted
+            for part in key[:-1]:
+                nested = nested.setdefault(str(part), {})
+            nested[str(key[-1])] = to_json_value(item)
+        else:
+            converted[str(key)] = to_json_value(item)
+    return converted
+
+def answer_question(dataset, question):
+    '''
+    Get the answer of a question from the loaded dataset, as a JSON-ready dictionary of aggregate name -> aggregate
+    '''
+    aggregates = dataset["aggregates"]
+    return {name: to_json_value(aggregates.get(name, {})) for name in stream_analysis.question_aggregate_names[question]}
+
+def answer_query(dataset, parameters):
+    '''
+    Answer an ad-hoc roll-up of the cube
+
+    :param dataset: The loaded dataset
+    :param parameters: The parsed query string, a dictionary of name -> list of values ("by", "measure" and "where")
+    :return: A JSON-ready dictionary with the "by", the "measure" and the rolled up "values"
+    :raises ValueError: When a dimension, measure or filter is not valid
+    '''
+    dimensions = parameters.get("by", [])
+    measure = parameters.get("measure", ["revenue"])[-1]
+    unknown_dimensions = [dimension for dimension in dimensions if dimension not in cube.CUBE_DIMENSIONS]
+    if not dimensions or unknown_dimensions:
+        raise ValueError(f"'by' must be one or more of {', '.join(cube.CUBE_DIMENSIONS)}")
+    if measure not in cube.CUBE_MEASURES:
+        raise ValueError(f"'measure' must be one of {', '.join(cube.CUBE_MEASURES)}")
+
+    filters = {}
+    for condition in parameters.get("where", []):
+        dimension, separator, values = condition.partition("=")
+        if not separator or dimension not in cube.CUBE_DIMENSIONS:
+            raise ValueError("'where' must be DIMENSION=VALUE[,VALUE...]")
+        filters[dimension] = set(values.split(","))
+
+    values = cube.query_cube(dataset["cube"], dimensions, measure, filters)
+    return {"by": dimensions, "measure": measure, "values": to_json_value(values)}
+
+def route_request(dataset, target):
+    '''
+    Answer a GET request from the loaded dataset
+
+    :param dataset: The loaded dataset
+    :param target: The request target, like "/questions/2" or "/query?by=City"
+    :return: A tuple of two elements, (the HTTP status, the JSON-ready body)
+    '''
+    url = urlsplit(target)
+    parts = [part for part in url.path.split("/") if part]
+    if parts == ["health"]:
+        return (200, {"status": "ok", "records": dataset["record_count"], "loaded_at": dataset["loaded_at"]})
+    if parts == ["questions"]:
+        return (200, {str(question): answer_question(dataset, question) for question in stream_analysis.question_aggregate_names})
+    if len(parts) == 2 and parts[0] == "questions" and parts[1].isdigit() and int(parts[1]) in stream_analysis.question_aggregate_names:
+        return (200, answer_question(dataset, int(parts[1])))
+    if parts == ["query"]:
+        try:
+            return (200, answer_query(dataset, parse_qs(url.query)))
+        except ValueError as error:
+            return (400, {"error": str(error)})
+    return (404, {"error": f"No such endpoint: {url.path}"})
+
+def create_service_state(path, cache_size=DEFAULT_CACHE_SIZE):
+    '''
+    Create the state shared by the requests: the loaded dataset, the cache of results and the reload lock
+    '''
+    return {"path": path, "dataset": load_dataset(path), "cache": OrderedDict(), "cache_size": cache_size, "reload_lock": asyncio.Lock()}
+
+async def refresh_dataset(state):
+    '''
+    Reload the dataset (and empty the cache) if the csv file changed since it was loaded
+
+    The file is only reloaded by one request at a time, in a worker thread, so the other requests keep being answered
+    from the previous dataset meanwhile.
+    '''
+    if get_file_key(state["path"]) == state["dataset"]["file_key"]:
+        return
+    async with state["reload_lock"]:
+        if get_file_key(state["path"]) != state["dataset"]["file_key"]:
+            state["dataset"] = await asyncio.get_running_loop().run_in_executor(None, load_dataset, state["path"])
+            state["cache"].clear()
+
+def get_cached_response(state, target):
+    '''
+    Get the encoded response of a request target from the LRU cache, answering and caching it first if needed
+
+    :return: A tuple of two elements, (the HTTP status, the JSON body as bytes)
+    '''
+    cache = state["cache"]
+    if target in cache:
+        cache.move_to_end(target)
+        return cache[target]
+
+    status, body = route_request(state["dataset"], target)
+    response = (status, json.dumps(body).encode("utf-8"))
+    cache[target] = response
+    # The least recently used result is dropped once the cache is full
+    if len(cache) > state["cache_size"]:
+        cache.popitem(last=False)
+    return response
+
+async def handle_connection(state, reader, writer):
+    '''
+    Read one HTTP request from the connection and write its JSON response (the connection is then closed)
+    '''
+    try:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        # The headers are read and ignored, the requests have no body
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+
+        if len(request_line) != 3:
+            status, body = (400, json.dumps({"error": "Malformed request"}).encode("utf-8"))
+        elif request_line[0] != "GET":
+            status, body = (405, json.dumps({"error": "Only GET is supported"}).encode("utf-8"))
+        else:
+            await refresh_dataset(state)
+            status, body = get_cached_response(state, request_line[1])
+    except (ConnectionError, asyncio.IncompleteReadError):
+        writer.close()
+        return
+    except Exception as error:
+        status, body = (500, json.dumps({"error": str(error)}).encode("utf-8"))
+
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+    )
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+
+async def serve(path, host, port, cache_size=DEFAULT_CACHE_SIZE):
+    '''
+    Load the dataset and answer the requests until the service is stopped
+    '''
+    state = create_service_state(path, cache_size)
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(state, reader, writer), host, port)
+    print(f"Serving {state['dataset']['record_count']} records of {path} on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+def parse_arguments(argv=None):
+    '''
+    Parse the command line arguments of the service
+
+    :param argv: The list of arguments (sys.argv[1:] when omitted)
+    :return: The parsed arguments, with "path", "host", "port" and "cache_size"
+    '''
+    parser = argparse.ArgumentParser(description="Serve the restaurant sales analyses as JSON from a warm in-memory dataset")
+    parser.add_argument("path", nargs="?", default="restaurant_sales_data.csv", help="path to the csv file (default: %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="number of results kept in the cache (default: %(default)s)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    try:
+        asyncio.run(serve(arguments.path, arguments.host, arguments.port, arguments.cache_size))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
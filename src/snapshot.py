@@ -0,0 +1,200 @@
+'''
+Persistent binary snapshot of the columnar table, for a fast start up
+
+Parsing the csv file, sanitising every field and converting the numbers is the same work on every run as long as the
+file does not change. load_table() keeps the result of parse_CSV_columnar() in a snapshot file next to the csv file
+and memory-maps it on the next runs, so the columns are used straight from the snapshot without being parsed again.
+
+The snapshot is keyed by the size, the modification time and the SHA-256 of the csv file, and is rebuilt
+automatically whenever the file does not match it (see source_matches(): the file is only hashed again when its size
+is the same but its modification time is not, so a warm start never reads the csv file). A snapshot that cannot be
+read (truncated, corrupt, or written on a platform of another byte order) is rebuilt as well.
+
+Layout of the snapshot file:
+- SNAPSHOT_MAGIC (8 bytes), then the length of the metadata (8 bytes, little endian)
+- the metadata as JSON: the key of the csv file, the header, the dictionaries of the encoded columns,
+  and the type code, offset & size of every column
+- the raw bytes of every column (array.array in native byte order), each aligned to 8 bytes
+'''
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+
+from columnar import parse_CSV_columnar
+
+# Version 2: "Price" and "Quantity" are fixed-point integer columns (so the snapshots of version 1 are rebuilt)
+SNAPSHOT_MAGIC = b"SALESNP2"
+ALIGNMENT = 8
+
+def get_default_snapshot_path(path):
+    '''
+    Get the snapshot path used for the csv file when none is designated, like "restaurant_sales_data.csv.snapshot"
+    '''
+    return path + ".snapshot"
+
+def calculate_file_hash(path, chunk_size=1 << 20):
+    '''
+    Calculate the SHA-256 (hex digest) of the content of a file, reading it in chunks
+    '''
+    digest = hashlib.sha256()
+    with open(path, "rb") as source_file:
+        for chunk in iter(lambda: source_file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_source_key(path):
+    '''
+    Get the key of the csv file that a snapshot must match to be used
+
+    :param path: The file path to the CSV file
+    :return: A dictionary of the "size", "mtime_ns" and "sha256" of the file
+    '''
+    status = os.stat(path)
+    return {"size": status.st_size, "mtime_ns": status.st_mtime_ns, "sha256": calculate_file_hash(path)}
+
+def source_matches(path, source_key):
+    '''
+    Check whether the csv file still matches the key stored with a snapshot (or a cube)
+
+    The size & modification time are compared first, and the file is only hashed when the size is the same but the
+    modification time is not (like a file copied or touched without being changed).
+
+    :param path: The file path to the CSV file
+    :param source_key: A key from get_source_key()
+    :return: True if the file has the same content as when the key was taken
+    '''
+    status = os.stat(path)
+    if status.st_size != source_key.get("size"):
+        return False
+    if status.st_mtime_ns == source_key.get("mtime_ns"):
+        return True
+    return calculate_file_hash(path) == source_key.get("sha256")
+
+def write_snapshot(snapshot_path, table, source_key):
+    '''
+    Write the table to a snapshot file (through a temporary file, so a half written snapshot is never read)
+
+    :param snapshot_path: The file path to the snapshot
+    :param table: A table returned by parse_CSV_columnar()
+    :param source_key: The key of the csv file the table was parsed from (see get_source_key())
+    '''
+    column_layout = []
+    offset = 0
+    for header in table["header"]:
+        column = table["columns"][header]
+        nbytes = len(column) * column.itemsize
+        column_layout.append({"header": header, "typecode": column.typecode, "offset": offset, "nbytes": nbytes})
+        offset += -(-nbytes // ALIGNMENT) * ALIGNMENT
+
+    metadata = json.dumps({
+        "source": source_key,
+        "byteorder": sys.byteorder,
+        "header": table["header"],
+        "length": table["length"],
+        "dictionaries": table["dictionaries"],
+        "columns": column_layout,
+    }).encode("utf-8")
+    # The column data starts aligned as well, so every column can be cast from the memory map directly
+    metadata += b" " * (-(len(SNAPSHOT_MAGIC) + 8 + len(metadata)) % ALIGNMENT)
+
+    temporary_path = snapshot_path + ".tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        snapshot_file.write(SNAPSHOT_MAGIC)
+        snapshot_file.write(len(metadata).to_bytes(8, "little"))
+        snapshot_file.write(metadata)
+        for layout in column_layout:
+            snapshot_file.write(table["columns"][layout["header"]].tobytes())
+            snapshot_file.write(b"\0" * (-layout["nbytes"] % ALIGNMENT))
+    os.replace(temporary_path, snapshot_path)
+
+def read_snapshot_metadata(mapped):
+    '''
+    Read & check the metadata at the start of a memory-mapped snapshot
+
+    :param mapped: The memory map of the snapshot file
+    :return: A tuple of two elements, (the metadata, the offset of the column data), or None if the snapshot is not
+             valid (corrupt, truncated, or written on a platform of another byte order)
+    '''
+    metadata_start = len(SNAPSHOT_MAGIC) + 8
+    if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC or len(mapped) < metadata_start:
+        return None
+    data_start = metadata_start + int.from_bytes(mapped[len(SNAPSHOT_MAGIC):metadata_start], "little")
+    try:
+        metadata = json.loads(mapped[metadata_start:data_start])
+        is_valid = (
+            data_start <= len(mapped)
+            and metadata["byteorder"] == sys.byteorder
+            and isinstance(metadata["source"], dict)
+            and all(key in metadata for key in ("header", "length", "dictionaries"))
+            and all(data_start + layout["offset"] + layout["nbytes"] <= len(mapped) for layout in metadata["columns"])
+        )
+    except (ValueError, KeyError, TypeError):
+        # Undecodable or malformed metadata (UnicodeDecodeError and JSONDecodeError are both ValueError)
+        return None
+    return (metadata, data_start) if is_valid else None
+
+def read_snapshot(snapshot_path):
+    '''
+    Memory-map a snapshot file as a table, the columns being memoryviews over the mapped file (nothing is copied)
+
+    :param snapshot_path: The file path to the snapshot
+    :return: A tuple of two elements, (the key of the csv file stored in the snapshot, the table), or None if the file is not a valid snapshot
+    '''
+    try:
+        with open(snapshot_path, "rb") as snapshot_file:
+            mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    metadata = read_snapshot_metadata(mapped)
+    if metadata is None:
+        mapped.close()
+        return None
+    metadata, data_start = metadata
+
+    view = memoryview(mapped)
+    try:
+        columns = {
+            layout["header"]: view[data_start + layout["offset"]:data_start + layout["offset"] + layout["nbytes"]].cast(layout["typecode"])
+            for layout in metadata["columns"]
+        }
+    except (ValueError, TypeError):
+        # A column that cannot be cast (an unknown type code, or a size that is not a multiple of it)
+        view.release()
+        mapped.close()
+        return None
+    table = {
+        "header": metadata["header"],
+        "length": metadata["length"],
+        "columns": columns,
+        "dictionaries": metadata["dictionaries"],
+        # Keeping a reference to the memory map for as long as the table (and its columns) are used
+        "snapshot": mapped,
+    }
+    return (metadata["source"], table)
+
+def load_table(path, snapshot_path=None):
+    '''
+    Load the columnar table of a csv file from its snapshot, (re)building the snapshot first if it does not match the file
+
+    :param path: The file path to the CSV file
+    :param snapshot_path: The file path to the snapshot (get_default_snapshot_path() when omitted)
+    :return: A table in the same form as the one returned by parse_CSV_columnar()
+    '''
+    snapshot_path = snapshot_path or get_default_snapshot_path(path)
+
+    snapshot = read_snapshot(snapshot_path)
+    if snapshot is not None and source_matches(path, snapshot[0]):
+        return snapshot[1]
+    if snapshot is not None:
+        # The columns are views over the memory map, so they are released before it can be closed
+        for column in snapshot[1]["columns"].values():
+            column.release()
+        snapshot[1]["snapshot"].close()
+
+    table = parse_CSV_columnar(path)
+    write_snapshot(snapshot_path, table, get_source_key(path))
+    return table
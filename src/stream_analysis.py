@@ -0,0 +1,255 @@
+'''
+Streaming mode for Questions 1 - 5
+
+The question modules parse the whole csv file into a list and then build a sanitised copy of it, so the memory
+needed grows with the size of the file. Here the sanitised records are streamed from parse_CSV_stream() into one
+combined accumulator, so every question is answered in a single pass while only the (small) aggregates are kept
+in memory.
+
+Usage: python stream_analysis.py [path to csv file]
+'''
+
+from functools import reduce
+import sys
+
+from sales_data import (
+    parse_CSV_stream,
+    calculate_sum,
+    combine_accumulators,
+    create_group_accumulator,
+    create_group_set_accumulator,
+    get_record_quantity_fixed,
+    get_record_revenue_fixed,
+    get_month_from_record,
+    count_record,
+    fixed_to_float,
+    QUANTITY_SCALE,
+    REVENUE_SCALE,
+)
+from quantiles import create_quantile_accumulator, get_quantiles
+
+# Dict of aggregate name -> accumulator, all of them are fed with every record in the same pass
+# The quantities & revenues are summed as fixed-point integers, so the totals are exact whatever the order of the
+# records (or the way they are split between files & processes), see finalise_aggregates()
+question_accumulators = {
+    "product_quantity": create_group_accumulator(lambda record: record["Product"], get_record_quantity_fixed),
+    "product_revenue": create_group_accumulator(lambda record: record["Product"], get_record_revenue_fixed),
+    "product_prices": create_group_set_accumulator(lambda record: record["Product"], lambda record: record["Price"]),
+    "city_revenue": create_group_accumulator(lambda record: record["City"], get_record_revenue_fixed),
+    "city_month_revenue": create_group_accumulator(lambda record: (record["City"], get_month_from_record(record)), get_record_revenue_fixed),
+    "manager_revenue": create_group_accumulator(lambda record: record["Manager"], get_record_revenue_fixed),
+    "payment_count": create_group_accumulator(lambda record: record["Payment Method"], count_record),
+    "purchase_count": create_group_accumulator(lambda record: record["Purchase Type"], count_record),
+    "month_revenue": create_group_accumulator(get_month_from_record, get_record_revenue_fixed),
+    # Quantile sketches of the quantity & revenue of each order, for the percentiles of each product and city
+    "product_quantity_quantiles": create_quantile_accumulator(lambda record: record["Product"], get_record_quantity_fixed),
+    "product_revenue_quantiles": create_quantile_accumulator(lambda record: record["Product"], get_record_revenue_fixed),
+    "city_quantity_quantiles": create_quantile_accumulator(lambda record: record["City"], get_record_quantity_fixed),
+    "city_revenue_quantiles": create_quantile_accumulator(lambda record: record["City"], get_record_revenue_fixed),
+}
+
+# Dict of aggregate name -> fixed-point scale of its totals (the other aggregates are counts or sets)
+fixed_point_scales = {
+    "product_quantity": QUANTITY_SCALE,
+    "product_revenue": REVENUE_SCALE,
+    "city_revenue": REVENUE_SCALE,
+    "city_month_revenue": REVENUE_SCALE,
+    "manager_revenue": REVENUE_SCALE,
+    "month_revenue": REVENUE_SCALE,
+}
+
+# Dict of aggregate name -> fixed-point scale of the values of its quantile sketches
+quantile_scales = {
+    "product_quantity_quantiles": QUANTITY_SCALE,
+    "product_revenue_quantiles": REVENUE_SCALE,
+    "city_quantity_quantiles": QUANTITY_SCALE,
+    "city_revenue_quantiles": REVENUE_SCALE,
+}
+
+def get_scaled_quantiles(sketch, scale):
+    '''
+    Get the median, p90 & p99 of a quantile sketch of fixed-point values, as floats
+
+    :return: A dictionary of fraction (0.5, 0.9, 0.99) -> value
+    '''
+    return {fraction: fixed_to_float(value, scale) for fraction, value in get_quantiles(sketch).items()}
+
+def finalise_aggregates(aggregates):
+    '''
+    Convert the fixed-point totals of the accumulated aggregates into floats, to be printed with question_printers
+
+    :param aggregates: The aggregates accumulated with question_accumulators (and merged, if any)
+    :return: A new dictionary of aggregate name -> dictionary of group value -> total, with the quantities & revenues as
+             floats (and the quantile sketches as dictionaries of fraction -> value), plus the overall "total_revenue"
+             (a float) when the monthly revenue was accumulated
+    '''
+    totals = {}
+    for name, aggregate in aggregates.items():
+        if name in fixed_point_scales:
+            totals[name] = {key: fixed_to_float(total, fixed_point_scales[name]) for key, total in aggregate.items()}
+        elif name in quantile_scales:
+            totals[name] = {key: get_scaled_quantiles(sketch, quantile_scales[name]) for key, sketch in aggregate.items()}
+        else:
+            totals[name] = aggregate
+    # Summed in fixed-point before converting, rather than adding up the (rounded) monthly floats
+    if "month_revenue" in aggregates:
+        totals["total_revenue"] = fixed_to_float(reduce(calculate_sum, aggregates["month_revenue"].values(), 0), REVENUE_SCALE)
+    return totals
+
+def print_percentiles(title, percentiles, unit=""):
+    '''
+    Print the median, p90 & p99 of each group of the finalised quantiles (see finalise_aggregates())
+    '''
+    print(title)
+    for group in sorted(percentiles):
+        values = percentiles[group]
+        print(f"{group:<20} | p50: {unit}{values[0.5]:>9.2f} | p90: {unit}{values[0.9]:>9.2f} | p99: {unit}{values[0.99]:>9.2f}")
+    print()
+
+def print_question_1(aggregates):
+    '''
+    Print the best selling product in terms of quantity and revenue (Question 1) from the streamed aggregates
+    '''
+    product_quantity = aggregates["product_quantity"]
+    product_revenue = aggregates["product_revenue"]
+
+    print("Analysis based on Product (Question 1)")
+    print("--------------------------------------")
+    best_quantity_product = max(product_quantity.items(), key=lambda x: x[1])
+    best_revenue_product = max(product_revenue.items(), key=lambda x: x[1])
+    print(f"Top seller by quantity: {best_quantity_product[0]} ({best_quantity_product[1]:.2f} units sold)")
+    print(f"Top seller by revenue: {best_revenue_product[0]} (${best_revenue_product[1]:.2f} revenue)")
+    print()
+    for product in sorted(product_quantity):
+        print(f"{product:<20} | Qty: {product_quantity[product]:>8.2f} | Rev: ${product_revenue[product]:>10.2f}")
+    print()
+    print("Products' Unique Prices")
+    for product in sorted(aggregates["product_prices"]):
+        print(f"{product}: {aggregates['product_prices'][product]}")
+    print()
+    # Only the streamed aggregates have the quantile sketches
+    if "product_quantity_quantiles" in aggregates:
+        print_percentiles("Quantity per order of each product", aggregates["product_quantity_quantiles"])
+        print_percentiles("Revenue per order of each product", aggregates["product_revenue_quantiles"], "$")
+
+def print_question_2(aggregates):
+    '''
+    Print the revenue of each branch location / city (Question 2) from the streamed aggregates
+    '''
+    city_revenue = aggregates["city_revenue"]
+    months_recorded = len(aggregates["month_revenue"])
+
+    print("Analysis based on Branch Location / City (Question 2)")
+    print("-----------------------------------------------------")
+    print("Total revenue for each branch location (city)")
+    for city, revenue in city_revenue.items():
+        print(f"{city}: ${revenue:.2f} generated")
+    print()
+
+    print("Average monthly revenue for each branch location (city)")
+    for city, revenue in city_revenue.items():
+        print(f"{city}: ${revenue / months_recorded:.2f} generated")
+    print()
+
+    print("The most profitable branch (city) for the restaurant company in terms of revenue: ", end="")
+    print(max(city_revenue.items(), key=lambda x: x[1])[0])
+    print()
+
+    print("Monthly Revenue for Branch Location in each City")
+    for city in city_revenue:
+        for month in sorted(aggregates["month_revenue"]):
+            print(f"{city}: ${aggregates['city_month_revenue'].get((city, month), 0):.2f} (Month {month})")
+    print()
+    if "city_quantity_quantiles" in aggregates:
+        print_percentiles("Quantity per order in each city", aggregates["city_quantity_quantiles"])
+        print_percentiles("Revenue per order in each city", aggregates["city_revenue_quantiles"], "$")
+
+def print_question_3(aggregates):
+    '''
+    Print the revenue generated by each manager and the best performing one (Question 3) from the streamed aggregates
+    '''
+    manager_revenue = aggregates["manager_revenue"]
+
+    print("Analysis based on Manager (Question 3)")
+    print("--------------------------------------")
+    print("Revenue generated by each manager:")
+    for manager, revenue in manager_revenue.items():
+        print(f"{manager}: ${revenue:.2f} generated")
+
+    best_manager = max(manager_revenue.items(), key=lambda x: x[1])
+    print("\nBest Performing Manager")
+    print(f"{best_manager[0]} because his revenue is the highest (${best_manager[1]:.2f})")
+    print()
+
+def print_question_4(aggregates):
+    '''
+    Print the customer preference on payment method and purchase type (Question 4) from the streamed aggregates
+    '''
+    for category, name in [("Payment Method", "payment_count"), ("Purchase Type", "purchase_count")]:
+        counts = aggregates[name]
+        total_customers = reduce(lambda acc, val: acc + val, counts.values(), 0)
+        most_preferred = max(counts.items(), key=lambda x: x[1])
+
+        print(f"=== CUSTOMER PREFERENCE BY {category.upper()} ===")
+        print(f"\n Most Preferred: {most_preferred[0]} ({(most_preferred[1] / total_customers) * 100:.2f}%)\n")
+        print("Full Breakdown (Quantity + Percentage):")
+        for val in sorted(counts):
+            print(f"{val:15} | {counts[val]:4d} customers | {(counts[val] / total_customers) * 100:6.2f}%")
+        print()
+
+def print_question_5(aggregates):
+    '''
+    Print the revenue for each month and the difference between the months (Question 5) from the streamed aggregates
+    '''
+    sorted_month_aggregate_on_revenue = sorted(aggregates["month_revenue"].items(), key=lambda x: x[0])
+
+    print("Analysis based on Sales Period (Question 5)")
+    print("-------------------------------------------")
+    print("Total revenue generated for each month")
+    for month, revenue in sorted_month_aggregate_on_revenue:
+        print(f"{month}: ${revenue:.2f} generated")
+    print()
+
+    print(f"Total Revenue Generated (Overall): ${aggregates['total_revenue']:.2f}\n")
+
+    print("Revenue performance for each month (difference)")
+    for current, following in zip(sorted_month_aggregate_on_revenue, sorted_month_aggregate_on_revenue[1:]):
+        diff = following[1] - current[1]
+        percentage = (diff / current[1]) * 100
+        sign = "+" if diff >= 0 else ""
+        print(f"Revenue performance from month ({current[0]}) to month ({following[0]}): {sign}{percentage:.2f} %")
+    print()
+
+# Dict of question number -> function printing the answer from the aggregates
+question_printers = {
+    1: print_question_1,
+    2: print_question_2,
+    3: print_question_3,
+    4: print_question_4,
+    5: print_question_5,
+}
+
+# Dict of question number -> the names of the aggregates its printer reads
+question_aggregate_names = {
+    1: ("product_quantity", "product_revenue", "product_prices", "product_quantity_quantiles", "product_revenue_quantiles"),
+    2: ("city_revenue", "city_month_revenue", "month_revenue", "city_quantity_quantiles", "city_revenue_quantiles"),
+    3: ("manager_revenue",),
+    4: ("payment_count", "purchase_count"),
+    5: ("month_revenue", "total_revenue"),
+}
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "restaurant_sales_data.csv"
+
+    # A single pass over the streamed records, only the aggregates are kept in memory
+    aggregates = reduce(combine_accumulators(question_accumulators), parse_CSV_stream(path), {})
+    if not aggregates:
+        print(f"No records found in {path}")
+        return
+
+    totals = finalise_aggregates(aggregates)
+    for print_question in question_printers.values():
+        print_question(totals)
+
+if __name__ == "__main__":
+    main()
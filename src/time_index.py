@@ -0,0 +1,141 @@
+'''
+Parsed "Date" column with a year-aware time-bucket index
+
+Filtering the records of a month means slicing it out of every "Date" string again for every month. Here each unique
+"DD-MM-YYYY" date is parsed only once into an ordinal day number (datetime.date.toordinal()), the records are ordered
+by that day number once, and every day, ISO week, month, quarter and year is indexed as a range of positions in that
+order.
+
+The bucket keys are strings that sort chronologically:
+- "day": "2022-11-07"
+- "week": "2022-W45" (ISO week, so the year is the ISO year of the week)
+- "month": "2022-11"
+- "quarter": "2022-Q4"
+- "year": "2022"
+
+The index is a dictionary, like:
+{
+    "ordinals": [day number of each record],
+    "order": [positions of the records, ordered by day],
+    "buckets": {granularity -> {bucket key -> (start, end) range in "order"}}
+}
+'''
+
+from datetime import date
+from functools import lru_cache
+
+TIME_GRANULARITIES = ("day", "week", "month", "quarter", "year")
+
+@lru_cache(maxsize=4096)
+def parse_date_ordinal(date_string):
+    '''
+    Parse a "DD-MM-YYYY" date into its ordinal day number (each unique date string is only parsed once)
+    '''
+    day, month, year = date_string.split("-")
+    return date(int(year), int(month), int(day)).toordinal()
+
+def create_date_range_filter(first_day=None, last_day=None):
+    '''
+    Create a field filter on the "Date" field (for the field_filters of parse_CSV_sanitised()) keeping a range of days
+
+    :param first_day: The first day to keep, like "2022-11-07" (no lower bound when omitted)
+    :param last_day: The last day to keep, like "2022-11-30" (no upper bound when omitted)
+    :return: A function that takes a "DD-MM-YYYY" date and returns True if it is within the range
+    '''
+    first_ordinal = date.fromisoformat(first_day).toordinal() if first_day else None
+    last_ordinal = date.fromisoformat(last_day).toordinal() if last_day else None
+    def is_within_range(date_string):
+        ordinal = parse_date_ordinal(date_string)
+        return (first_ordinal is None or ordinal >= first_ordinal) and (last_ordinal is None or ordinal <= last_ordinal)
+    return is_within_range
+
+def get_time_bucket_keys(ordinal):
+    '''
+    Get the bucket key of every granularity for an ordinal day number
+
+    :param ordinal: An ordinal day number (see parse_date_ordinal())
+    :return: A dictionary of granularity -> bucket key, like {"day": "2022-11-07", "week": "2022-W45", "month": "2022-11", ...}
+    '''
+    day = date.fromordinal(ordinal)
+    iso_year, iso_week, _ = day.isocalendar()
+    return {
+        "day": day.isoformat(),
+        "week": f"{iso_year}-W{iso_week:02d}",
+        "month": f"{day.year}-{day.month:02d}",
+        "quarter": f"{day.year}-Q{(day.month - 1) // 3 + 1}",
+        "year": f"{day.year}",
+    }
+
+def create_time_index_from_ordinals(ordinals):
+    '''
+    Create the time-bucket index from the ordinal day number of each record
+
+    :param ordinals: A sequence of ordinal day numbers, one for each record
+    :return: A dictionary describing the index (see the module docstring for its structure)
+    '''
+    # sorted() is stable, so the records of the same day keep their original order
+    order = sorted(range(len(ordinals)), key=ordinals.__getitem__)
+    buckets = {granularity: {} for granularity in TIME_GRANULARITIES}
+
+    # Walking through the records in order of their day, each bucket is a contiguous range of positions
+    start = 0
+    while start < len(order):
+        ordinal = ordinals[order[start]]
+        end = start + 1
+        while end < len(order) and ordinals[order[end]] == ordinal:
+            end += 1
+        # The keys are only computed once for each day, then the ranges of the coarser buckets are extended to cover it
+        for granularity, key in get_time_bucket_keys(ordinal).items():
+            bucket_start, _ = buckets[granularity].get(key, (start, end))
+            buckets[granularity][key] = (bucket_start, end)
+        start = end
+
+    return {"ordinals": ordinals, "order": order, "buckets": buckets}
+
+def create_time_index(dates):
+    '''
+    Create the time-bucket index of the sanitised data, parsing the "Date" field of each record
+
+    :param dates: The (sanitised) "Date" of each record, like ["07-11-2022", ...]
+    :return: A dictionary describing the index (see the module docstring for its structure)
+    '''
+    return create_time_index_from_ordinals([parse_date_ordinal(date_string) for date_string in dates])
+
+def get_time_index(context):
+    '''
+    Get the time-bucket index of the data of an analysis context, creating it on first use and keeping it in the context
+
+    :param context: The dataset loaded by create_analysis_context() (or a columnar table context, the dates are read through its "get_field_values")
+    :return: The time-bucket index of context["data"]
+    '''
+    if "time_index" not in context:
+        context["time_index"] = create_time_index(context["get_field_values"](context["data"], "Date"))
+    return context["time_index"]
+
+def get_time_bucket_keys_in_order(time_index, granularity):
+    '''
+    Get the bucket keys of the designated granularity, in chronological order
+    '''
+    return sorted(time_index["buckets"][granularity])
+
+def get_time_bucket_positions(time_index, granularity, key):
+    '''
+    Get the positions of the records in the designated bucket (in order of their day)
+
+    :return: A generator of positions in the data, empty if there is no such bucket
+    '''
+    start, end = time_index["buckets"][granularity].get(key, (0, 0))
+    order = time_index["order"]
+    return (order[position] for position in range(start, end))
+
+def get_time_bucket_records(data, time_index, granularity, key):
+    '''
+    Get the records in the designated bucket, like filtering the data on a month, without scanning it
+
+    :param data: The data that the index was built from
+    :param time_index: The time-bucket index of the data
+    :param granularity: One of TIME_GRANULARITIES
+    :param key: The bucket key, like "2022-11" for a month
+    :return: A list of dictionaries of the records in the bucket
+    '''
+    return [data[position] for position in get_time_bucket_positions(time_index, granularity, key)]
@@ -0,0 +1,175 @@
+'''
+Rolling-window time series of the daily revenue, for trailing-window dashboards
+
+Question 5 compares whole months. Here the records are walked through once (in order of their day, through the
+time-bucket index of time_index.py) to build a dense daily series for each city, product or manager (days without
+sales are 0), and the rolling sums, averages and period-over-period changes are computed from that series with a
+sliding window: each step adds the day entering the window and removes the day leaving it, so a window never goes
+back to the records (or to the other days of the window).
+
+The daily totals are fixed-point integers (the revenue in 1/REVENUE_SCALE of the currency, see sales_data.py), so
+adding and removing days is exact and a window without sales is exactly 0. They are converted back when printing.
+
+The daily series are a dictionary, like:
+{
+    "days": ["2022-11-07", "2022-11-08", ...],  (every day from the first to the last day of the data)
+    "series": {group value -> [total of each day]}
+}
+
+Usage: python time_series.py [PATH] [--by City] [--windows 7 30]
+'''
+
+from datetime import date
+import argparse
+
+from sales_data import create_analysis_context, fixed_to_float, get_record_revenue_fixed, REVENUE_SCALE
+from time_index import get_time_index
+
+# The dimensions the daily series can be grouped by
+SERIES_HEADERS = ("City", "Product", "Manager")
+DEFAULT_WINDOWS = (7, 30)
+
+def create_daily_series(data, time_index, key_function, value_function=get_record_revenue_fixed):
+    '''
+    Sum value_function for each group and each day, in a single pass over the data
+
+    :param data: The data that the index was built from
+    :param time_index: The time-bucket index of the data (see time_index.get_time_index())
+    :param key_function: A function that takes a record and returns the value to group the record under, like lambda record: record["City"]
+    :param value_function: A function that takes a record and returns the number to be summed (the fixed-point revenue by default)
+    :return: A dictionary of the "days" and the "series" (see the module docstring)
+    '''
+    ordinals = time_index["ordinals"]
+    if not ordinals:
+        return {"days": [], "series": {}}
+
+    order = time_index["order"]
+    first_day = ordinals[order[0]]
+    day_count = ordinals[order[-1]] - first_day + 1
+
+    series = {}
+    for position in order:
+        record = data[position]
+        group_series = series.setdefault(key_function(record), [0] * day_count)
+        group_series[ordinals[position] - first_day] += value_function(record)
+
+    days = [date.fromordinal(first_day + offset).isoformat() for offset in range(day_count)]
+    return {"days": days, "series": series}
+
+def create_daily_series_by_header(header):
+    '''
+    Curried form of create_daily_series() grouping the records by the value of a header (one of SERIES_HEADERS)
+
+    :return: A function (data, time_index, value_function=get_record_revenue_fixed) -> daily series
+    '''
+    def get_daily_series(data, time_index, value_function=get_record_revenue_fixed):
+        return create_daily_series(data, time_index, lambda record: record[header], value_function)
+    return get_daily_series
+
+def calculate_rolling_sums(values, window):
+    '''
+    Calculate the trailing sum over the last window values, for each position of the series
+
+    :param values: The daily totals of a series
+    :param window: The number of days in the window (the first window - 1 sums cover the days available so far)
+    :return: A list of the rolling sums, one for each day
+    '''
+    rolling_sums = []
+    total = 0
+    for position, value in enumerate(values):
+        # The day entering the window is added, and the day leaving it is removed
+        total += value
+        if position >= window:
+            total -= values[position - window]
+        rolling_sums.append(total)
+    return rolling_sums
+
+def calculate_rolling_averages(rolling_sums, window):
+    '''
+    Calculate the trailing daily average from the rolling sums of calculate_rolling_sums()
+
+    :param rolling_sums: The rolling sums of a series over the window
+    :param window: The number of days in the window
+    :return: A list of the averages per day, dividing by the days covered so far until the window is full
+    '''
+    return [total / min(position + 1, window) for position, total in enumerate(rolling_sums)]
+
+def calculate_period_over_period_changes(rolling_sums, window):
+    '''
+    Calculate the percentage change of each window against the previous window of the same length (the window days before)
+
+    :param rolling_sums: The rolling sums of a series over the window
+    :param window: The number of days in the window
+    :return: A list of the changes in percent, None where there is no full previous window or it had no revenue
+    '''
+    return [
+        None if position < 2 * window - 1 or not rolling_sums[position - window]
+        else (total - rolling_sums[position - window]) / rolling_sums[position - window] * 100
+        for position, total in enumerate(rolling_sums)
+    ]
+
+def create_rolling_series(values, windows=DEFAULT_WINDOWS):
+    '''
+    Calculate the rolling sums, averages and period-over-period changes of a daily series for each window
+
+    :param values: The daily totals of a series
+    :param windows: The window lengths, in days
+    :return: A dictionary of window -> {"sum": [...], "average": [...], "change": [...]}, one value for each day
+    '''
+    rolling_series = {}
+    for window in windows:
+        rolling_sums = calculate_rolling_sums(values, window)
+        rolling_series[window] = {
+            "sum": rolling_sums,
+            "average": calculate_rolling_averages(rolling_sums, window),
+            "change": calculate_period_over_period_changes(rolling_sums, window),
+        }
+    return rolling_series
+
+def print_trailing_window_summary(daily_series, header, windows=DEFAULT_WINDOWS, scale=REVENUE_SCALE):
+    '''
+    Print the trailing windows ending on the last day of the data, for every group of the daily series
+
+    :param scale: The fixed-point scale of the daily totals, they are divided by it for printing
+    '''
+    if not daily_series["days"]:
+        print("No records found")
+        return
+
+    print(f"Trailing revenue by {header} up to {daily_series['days'][-1]}")
+    for group, values in daily_series["series"].items():
+        rolling_series = create_rolling_series(values, windows)
+        print(f"{group}:")
+        for window in windows:
+            change = rolling_series[window]["change"][-1]
+            change_text = "n/a" if change is None else f"{'+' if change >= 0 else ''}{change:.2f} %"
+            print(
+                f"    {window} days: ${fixed_to_float(rolling_series[window]['sum'][-1], scale):.2f} "
+                f"(${fixed_to_float(rolling_series[window]['average'][-1], scale):.2f} per day, {change_text} on the previous {window} days)"
+            )
+    print()
+
+def parse_arguments(argv=None):
+    '''
+    Parse the command line arguments of the time series summary
+
+    :param argv: The list of arguments (sys.argv[1:] when omitted)
+    :return: The parsed arguments, with "path", "by" and "windows"
+    '''
+    parser = argparse.ArgumentParser(description="Print the trailing-window revenue of each city, product or manager")
+    parser.add_argument("path", nargs="?", default="restaurant_sales_data.csv", help="path to the csv file (default: %(default)s)")
+    parser.add_argument("--by", choices=SERIES_HEADERS, default="City", help="dimension of the series (default: %(default)s)")
+    parser.add_argument("--windows", type=int, nargs="+", default=list(DEFAULT_WINDOWS), help="window lengths in days (default: 7 30)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    if any(window <= 0 for window in arguments.windows):
+        raise SystemExit("The window lengths must be positive")
+
+    context = create_analysis_context(arguments.path)
+    daily_series = create_daily_series_by_header(arguments.by)(context["data"], get_time_index(context))
+    print_trailing_window_summary(daily_series, arguments.by, arguments.windows)
+
+if __name__ == "__main__":
+    main()
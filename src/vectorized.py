@@ -0,0 +1,163 @@
+'''
+Vectorized revenue & quantity aggregation
+
+The aggregates work on a table from parse_CSV_columnar() (or loaded from its snapshot), where the sums for every group
+are computed at once on the dictionary-encoded codes with NumPy, without going through a dictionary per record. The
+quantity & revenue columns are fixed-point integers, and they are summed as int64 with numpy.add.at() (numpy.bincount()
+would turn the weights into float64, so it only counts the records), so the totals are exact and finalised (converted
+back) like the ones of stream_analysis.py.
+
+The question modules switch over through create_table_context(): the context of columnar.create_table_context(), with
+its "get_total_quantity_fixed" & "get_total_revenue_fixed" replaced by the ones of create_total_function(). Those keep
+the signature of sales_data.get_total_revenue_fixed() (a collection of records -> its exact total), which is what the
+calculate_total_revenue() & get_total() of the question modules call, so Question1.py to Question5.py run unchanged on
+the vectorized sums.
+
+NumPy is optional: when it is not installed, the same results are computed with the plain Python fallbacks.
+'''
+
+from array import array
+
+from columnar import (
+    aggregate_by_codes, combine_grouping_codes, create_column_total_function, create_table_context as create_columnar_context,
+    get_grouping_codes, get_revenue_column,
+)
+from sales_data import fixed_to_float, get_month_from_date, PRICE_SCALE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def as_numpy_array(column):
+    '''
+    View an array.array column (or a memoryview column of a snapshot) as a NumPy array without copying it
+    '''
+    typecode = column.typecode if isinstance(column, array) else column.format
+    return np.frombuffer(column, dtype=np.dtype(typecode))
+
+def bincount_by_codes(codes, values, weights=None):
+    '''
+    Count the records of each group with numpy.bincount() and sum their (integer) weights exactly with numpy.add.at(),
+    falling back to aggregate_by_codes() without NumPy
+
+    :param codes: A sequence of integer codes, one for each record
+    :param values: The list of values that the codes index into
+    :param weights: An optional sequence of integers (like a fixed-point column), one for each record (the records are counted when it is omitted)
+    :return: A dictionary of value -> sum of the weights (or number of records) for the value, skipping empty groups
+    '''
+    if np is None:
+        return aggregate_by_codes(codes, values, weights)
+
+    code_array = as_numpy_array(codes) if isinstance(codes, (array, memoryview)) else np.asarray(codes)
+    counts = np.bincount(code_array, minlength=len(values))
+    if weights is None:
+        return {value: int(count) for value, count in zip(values, counts) if count > 0}
+
+    weight_array = as_numpy_array(weights) if isinstance(weights, (array, memoryview)) else np.asarray(weights, dtype=np.int64)
+    totals = np.zeros(len(values), dtype=np.int64)
+    np.add.at(totals, code_array, weight_array)
+    return {value: int(total) for value, total, count in zip(values, totals, counts) if count > 0}
+
+def get_revenue_weights(table):
+    '''
+    Calculate the fixed-point revenue (quantity * price) of every record of the table, as one vectorized multiplication when NumPy is available
+    '''
+    if np is None:
+        return get_revenue_column(table)
+    return as_numpy_array(table["columns"]["Quantity"]) * as_numpy_array(table["columns"]["Price"])
+
+def create_total_function(weights):
+    '''
+    Create a drop-in for sales_data.get_total_quantity_fixed() / get_total_revenue_fixed() summing a fixed-point column
+    of a table over the records of a table context (row positions), as a single NumPy gather & sum when NumPy is available
+
+    :param weights: A fixed-point column of the table (like the "Quantity" column, or get_revenue_weights())
+    :return: A function that takes a collection of records (row positions) and returns the exact total of the column over them
+    '''
+    if np is None:
+        return create_column_total_function(weights)
+
+    weight_array = as_numpy_array(weights) if isinstance(weights, (array, memoryview)) else np.asarray(weights, dtype=np.int64)
+    def calculate_total(records):
+        # The whole table (range(length)) is summed as it is, any other collection of positions is gathered first
+        if records == range(len(weight_array)):
+            return int(weight_array.sum())
+        return int(weight_array[np.fromiter(records, dtype=np.intp, count=len(records))].sum())
+    return calculate_total
+
+def create_table_context(path, table):
+    '''
+    Create the context of a table for the question modules (see columnar.create_table_context()), summing the
+    quantities & revenues with create_total_function()
+
+    :param path: The file path to the CSV file the table was parsed from
+    :param table: A table returned by parse_CSV_columnar() (or loaded from its snapshot)
+    :return: A dictionary in the same form as the one returned by sales_data.create_analysis_context()
+    '''
+    return {
+        **create_columnar_context(path, table),
+        "get_total_quantity_fixed": create_total_function(table["columns"]["Quantity"]),
+        "get_total_revenue_fixed": create_total_function(get_revenue_weights(table)),
+    }
+
+def calculate_group_total_revenue(table, header, value_function=None):
+    '''
+    Calculate the total revenue for each unique value of the designated header of the table
+
+    :param table: A table returned by parse_CSV_columnar()
+    :param header: A dictionary-encoded header of the table, like "City"
+    :param value_function: An optional function to derive a coarser grouping from the values (see get_grouping_codes())
+    :return: A dictionary of value -> total revenue (in 1/REVENUE_SCALE of the currency)
+    '''
+    return bincount_by_codes(*get_grouping_codes(table, header, value_function), get_revenue_weights(table))
+
+def calculate_group_total_quantity(table, header, value_function=None):
+    '''
+    Calculate the total quantity for each unique value of the designated header of the table
+
+    :param table: A table returned by parse_CSV_columnar()
+    :param header: A dictionary-encoded header of the table, like "Product"
+    :param value_function: An optional function to derive a coarser grouping from the values (see get_grouping_codes())
+    :return: A dictionary of value -> total quantity (in 1/QUANTITY_SCALE)
+    '''
+    return bincount_by_codes(*get_grouping_codes(table, header, value_function), table["columns"]["Quantity"])
+
+def calculate_group_record_count(table, header, value_function=None):
+    '''
+    Count the records for each unique value of the designated header of the table
+
+    :param table: A table returned by parse_CSV_columnar()
+    :param header: A dictionary-encoded header of the table, like "Payment Method"
+    :param value_function: An optional function to derive a coarser grouping from the values (see get_grouping_codes())
+    :return: A dictionary of value -> number of records
+    '''
+    return bincount_by_codes(*get_grouping_codes(table, header, value_function))
+
+def get_question_aggregates(table):
+    '''
+    Calculate the aggregates of every question from the table, in the same form as the ones accumulated by stream_analysis.py
+
+    :param table: A table returned by parse_CSV_columnar() (or loaded from a snapshot)
+    :return: A dictionary of aggregate name -> dictionary of group value -> total (the quantities & revenues in fixed-point),
+             to be converted with stream_analysis.finalise_aggregates() and printed with stream_analysis.question_printers
+    '''
+    revenue = get_revenue_weights(table)
+    month_grouping = get_grouping_codes(table, "Date", get_month_from_date)
+    product_codes, products = get_grouping_codes(table, "Product")
+
+    product_prices = {}
+    for product_code, price in set(zip(product_codes, table["columns"]["Price"])):
+        product_prices.setdefault(products[product_code], set()).add(str(fixed_to_float(price, PRICE_SCALE)))
+
+    return {
+        "product_quantity": calculate_group_total_quantity(table, "Product"),
+        "product_revenue": bincount_by_codes(product_codes, products, revenue),
+        "product_prices": product_prices,
+        "city_revenue": calculate_group_total_revenue(table, "City"),
+        "city_month_revenue": bincount_by_codes(*combine_grouping_codes(get_grouping_codes(table, "City"), month_grouping), revenue),
+        "manager_revenue": calculate_group_total_revenue(table, "Manager"),
+        "payment_count": calculate_group_record_count(table, "Payment Method"),
+        "purchase_count": calculate_group_record_count(table, "Purchase Type"),
+        "month_revenue": bincount_by_codes(*month_grouping, revenue),
+    }
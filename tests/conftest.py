@@ -0,0 +1,42 @@
+'''
+Shared fixtures of the tests
+
+The modules of the package live in src/ and import each other by name (like "from sales_data import ..."), so src/
+is put on the path the same way running them from that directory does.
+'''
+
+import os
+import shutil
+import sys
+
+import pytest
+
+SOURCE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SOURCE_DIRECTORY)
+
+from sales_data import parse_CSV_sanitised
+
+SALES_CSV_PATH = os.path.join(SOURCE_DIRECTORY, "restaurant_sales_data.csv")
+
+@pytest.fixture
+def sales_csv_path():
+    '''
+    The file path to the sample csv file shipped with the package (never to be written to)
+    '''
+    return SALES_CSV_PATH
+
+@pytest.fixture
+def sales_records():
+    '''
+    The sanitised records of the sample csv file, the plain record path every other path is checked against
+    '''
+    return parse_CSV_sanitised(SALES_CSV_PATH)[1]
+
+@pytest.fixture
+def sales_csv_copy(tmp_path):
+    '''
+    A copy of the sample csv file in a temporary directory, for the tests that change the file or write next to it
+    '''
+    path = str(tmp_path / "sales.csv")
+    shutil.copyfile(SALES_CSV_PATH, path)
+    return path
@@ -0,0 +1,66 @@
+'''
+Precomputed OLAP cube (cube.py): roll-ups and slices checked against the records, and the saved cube
+'''
+
+import os
+
+from cube import build_cube, get_default_cube_path, get_question_aggregates, load_cube, query_cube, read_cube
+from sales_data import (
+    count_record, create_group_aggregate_function, fixed_to_float, get_month_from_record, get_record_quantity_fixed,
+    get_record_revenue_fixed, parse_CSV_sanitised, QUANTITY_SCALE, REVENUE_SCALE,
+)
+
+def get_record_totals(records, key_function, value_function, scale):
+    totals = create_group_aggregate_function(key_function)(value_function)(records)
+    return {key: fixed_to_float(total, scale) if scale else total for key, total in totals.items()}
+
+def test_roll_ups_match_the_records(sales_records):
+    cube = build_cube(sales_records)
+    assert query_cube(cube, ["City"]) == get_record_totals(sales_records, lambda record: record["City"], get_record_revenue_fixed, REVENUE_SCALE)
+    assert query_cube(cube, ["Product"], "quantity") == get_record_totals(
+        sales_records, lambda record: record["Product"], get_record_quantity_fixed, QUANTITY_SCALE
+    )
+    assert query_cube(cube, ["City", "Month"]) == get_record_totals(
+        sales_records, lambda record: (record["City"], get_month_from_record(record)), get_record_revenue_fixed, REVENUE_SCALE
+    )
+    assert query_cube(cube, ["Payment Method"], "count") == get_record_totals(
+        sales_records, lambda record: record["Payment Method"], count_record, None
+    )
+
+def test_slices_match_the_filtered_records(sales_records):
+    cube = build_cube(sales_records)
+    filters = {"City": "London", "Purchase Type": {"Online", "Drive-thru"}}
+    records = [record for record in sales_records if record["City"] == "London" and record["Purchase Type"] in {"Online", "Drive-thru"}]
+    assert records
+    assert query_cube(cube, ["Manager"], filters=filters) == get_record_totals(
+        records, lambda record: record["Manager"], get_record_revenue_fixed, REVENUE_SCALE
+    )
+    assert query_cube(cube, ["City"], filters={"City": "Atlantis"}) == {}
+
+def test_question_aggregates_match_the_records(sales_records):
+    aggregates = get_question_aggregates(build_cube(sales_records))
+    assert aggregates["total_revenue"] == fixed_to_float(sum(map(get_record_revenue_fixed, sales_records)), REVENUE_SCALE)
+    assert aggregates["month_revenue"] == get_record_totals(sales_records, get_month_from_record, get_record_revenue_fixed, REVENUE_SCALE)
+    expected_prices = {}
+    for record in sales_records:
+        expected_prices.setdefault(record["Product"], set()).add(record["Price"])
+    assert aggregates["product_prices"] == expected_prices
+
+def test_saved_cube_is_used_until_the_file_changes(sales_csv_copy):
+    cube_path = get_default_cube_path(sales_csv_copy)
+    cube = load_cube(sales_csv_copy)
+    assert read_cube(cube_path)[1] == cube
+    assert load_cube(sales_csv_copy) == cube
+
+    with open(sales_csv_copy, "a", newline="") as csv_file:
+        csv_file.write("99999,31-12-2022,Fries,3.49,1.5,Online,Cash,Tom Jackson,London\n")
+    assert load_cube(sales_csv_copy) == build_cube(parse_CSV_sanitised(sales_csv_copy)[1])
+
+def test_unreadable_cube_is_rebuilt(sales_csv_copy, sales_records):
+    cube_path = get_default_cube_path(sales_csv_copy)
+    load_cube(sales_csv_copy)
+    with open(cube_path, "wb") as cube_file:
+        cube_file.write(b"not a pickle")
+    assert read_cube(cube_path) is None
+    assert load_cube(sales_csv_copy) == build_cube(sales_records)
+    assert os.path.exists(cube_path)
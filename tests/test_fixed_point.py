@@ -0,0 +1,61 @@
+'''
+Fixed-point money arithmetic (sales_data.parse_fixed_point() and the fixed-point totals of each analysis path)
+'''
+
+from decimal import Decimal
+
+import pytest
+
+from columnar import create_table_context, parse_CSV_columnar
+from sales_data import (
+    create_analysis_context, fixed_to_float, get_record_revenue_fixed, get_total_quantity_fixed, get_total_revenue_fixed,
+    parse_fixed_point, PRICE_SCALE, QUANTITY_SCALE, REVENUE_SCALE,
+)
+import vectorized
+
+@pytest.mark.parametrize("text, scale, expected", [
+    ("3.49", 100, 349),
+    ("200.4", 100, 20040),
+    ("12", 100, 1200),
+    (".5", 100, 50),
+    ("-2.95", 100, -295),
+    ("+1.1", 100, 110),
+    ("1.500", 100, 150),
+    ("1e2", 100, 10000),
+    ("0.0001", 10000, 1),
+])
+def test_parse_fixed_point_is_exact(text, scale, expected):
+    assert parse_fixed_point(text, scale) == expected
+
+@pytest.mark.parametrize("text", ["1.005", "0.001", "3.14159"])
+def test_parse_fixed_point_rejects_too_many_decimals(text):
+    with pytest.raises(ValueError, match="more decimals"):
+        parse_fixed_point(text, 100)
+
+@pytest.mark.parametrize("text", ["", "abc", "1.2.3", "nan", "inf", "-"])
+def test_parse_fixed_point_rejects_non_numbers(text):
+    with pytest.raises(ValueError):
+        parse_fixed_point(text, 100)
+
+def test_fixed_to_float_rounds_to_the_nearest_cent():
+    # 0.1 + 0.2 drifts as floats, but not as cents
+    total = parse_fixed_point("0.1", PRICE_SCALE) + parse_fixed_point("0.2", PRICE_SCALE)
+    assert total == 30
+    assert fixed_to_float(total, PRICE_SCALE) == 0.3
+
+def test_record_revenue_is_the_exact_product(sales_records):
+    for record in sales_records:
+        expected = Decimal(record["Price"]) * Decimal(record["Quantity"]) * REVENUE_SCALE
+        assert get_record_revenue_fixed(record) == expected
+
+def test_totals_do_not_depend_on_the_order_of_the_records(sales_records):
+    assert get_total_revenue_fixed(sales_records) == get_total_revenue_fixed(reversed(sales_records))
+    assert get_total_quantity_fixed(sales_records) == get_total_quantity_fixed(sorted(sales_records, key=lambda record: record["Quantity"]))
+
+def test_table_contexts_have_the_same_totals_as_the_records(sales_csv_path, sales_records):
+    expected_quantity = sum(Decimal(record["Quantity"]) for record in sales_records) * QUANTITY_SCALE
+    expected_revenue = sum(Decimal(record["Price"]) * Decimal(record["Quantity"]) for record in sales_records) * REVENUE_SCALE
+    table = parse_CSV_columnar(sales_csv_path)
+    for context in (create_analysis_context(sales_csv_path), create_table_context(sales_csv_path, table), vectorized.create_table_context(sales_csv_path, table)):
+        assert context["get_total_quantity_fixed"](context["data"]) == expected_quantity
+        assert context["get_total_revenue_fixed"](context["data"]) == expected_revenue
@@ -0,0 +1,41 @@
+'''
+Single-pass group-by engine (sales_data.py and the table contexts of columnar.py), checked against per-value filters
+'''
+
+from columnar import create_table_context, parse_CSV_columnar
+from sales_data import (
+    count_record, create_filter_function_by_header, create_group_aggregate_function_by_header,
+    create_group_by_function_by_header, get_record_revenue_fixed, get_total_revenue_fixed,
+)
+
+GROUPED_HEADERS = ("City", "Product", "Manager", "Payment Method", "Purchase Type", "Date")
+
+def test_groups_match_the_filters(sales_records):
+    for header in GROUPED_HEADERS:
+        groups = create_group_by_function_by_header(header)(sales_records)
+        assert list(groups) == list(dict.fromkeys(record[header] for record in sales_records))
+        for value, records in groups.items():
+            assert records == create_filter_function_by_header(header)(value)(sales_records)
+
+def test_group_aggregates_match_the_filtered_totals(sales_records):
+    for header in GROUPED_HEADERS:
+        revenue = create_group_aggregate_function_by_header(header)(get_record_revenue_fixed)(sales_records)
+        counts = create_group_aggregate_function_by_header(header)(count_record)(sales_records)
+        for value in revenue:
+            records = create_filter_function_by_header(header)(value)(sales_records)
+            assert revenue[value] == get_total_revenue_fixed(records)
+            assert counts[value] == len(records)
+
+def test_empty_data_has_no_groups():
+    assert create_group_by_function_by_header("City")([]) == {}
+    assert create_group_aggregate_function_by_header("City")(count_record)([]) == {}
+
+def test_table_groups_match_the_record_groups(sales_csv_path, sales_records):
+    context = create_table_context(sales_csv_path, parse_CSV_columnar(sales_csv_path))
+    for header in ("City", "Product", "Manager", "Payment Method", "Purchase Type"):
+        record_groups = create_group_by_function_by_header(header)(sales_records)
+        table_groups = context["group_by_header"](header)(context["data"])
+        assert list(table_groups) == list(record_groups)
+        for value, positions in table_groups.items():
+            assert [sales_records[position] for position in positions] == record_groups[value]
+            assert context["get_total_revenue_fixed"](positions) == get_total_revenue_fixed(record_groups[value])
@@ -0,0 +1,62 @@
+'''
+HyperLogLog distinct counts (hyperloglog.py): estimates, merging and the --by option
+'''
+
+from functools import reduce
+
+import pytest
+
+from hyperloglog import (
+    add_to_hyperloglog, count_distinct_in_file, create_hyperloglog, estimate_cardinality, get_distinct_counts,
+    merge_hyperloglogs, parse_arguments, EXACT_COUNT_HEADERS,
+)
+from sales_data import create_group_by_function_by_header
+
+# The standard error is 1.04 / sqrt(4096) (about 1.6 %) for the default precision, the bound is about three times that
+MAXIMUM_RELATIVE_ERROR = 0.05
+
+def build_hyperloglog(values, precision=12):
+    return reduce(add_to_hyperloglog, values, create_hyperloglog(precision))
+
+@pytest.mark.parametrize("count", [1000, 20000, 100000])
+def test_estimate_is_within_the_error(count):
+    assert abs(estimate_cardinality(build_hyperloglog(range(count))) - count) <= MAXIMUM_RELATIVE_ERROR * count
+
+def test_small_counts_are_almost_exact():
+    assert abs(estimate_cardinality(build_hyperloglog(f"order-{n}" for n in range(100))) - 100) <= 2
+    assert estimate_cardinality(create_hyperloglog()) == 0
+
+def test_duplicates_are_not_counted_again():
+    assert build_hyperloglog(list(range(5000)) * 3) == build_hyperloglog(range(5000))
+
+def test_merge_is_the_sketch_of_the_union():
+    left = build_hyperloglog(range(0, 30000))
+    right = build_hyperloglog(range(20000, 50000))
+    assert merge_hyperloglogs(left, right) == build_hyperloglog(range(50000))
+    assert merge_hyperloglogs(left, right) == merge_hyperloglogs(right, left)
+
+def test_sketches_of_another_precision_are_not_merged():
+    with pytest.raises(ValueError):
+        merge_hyperloglogs(create_hyperloglog(12), create_hyperloglog(10))
+    with pytest.raises(ValueError):
+        create_hyperloglog(3)
+
+def test_file_counts_match_the_records(sales_csv_path, sales_records):
+    counts = count_distinct_in_file(sales_csv_path, ["City"])
+    for header, count in get_distinct_counts(counts["columns"]).items():
+        expected = len({record[header] for record in sales_records})
+        if header in EXACT_COUNT_HEADERS:
+            assert count == expected, header
+        else:
+            assert abs(count - expected) <= max(2, MAXIMUM_RELATIVE_ERROR * expected), header
+
+    orders_by_city = get_distinct_counts(counts["City"])
+    for city, records in create_group_by_function_by_header("City")(sales_records).items():
+        expected = len({record["Order ID"] for record in records})
+        assert abs(orders_by_city[city] - expected) <= max(2, MAXIMUM_RELATIVE_ERROR * expected), city
+
+def test_unknown_group_header_is_an_argument_error(sales_csv_path, capsys):
+    with pytest.raises(SystemExit):
+        parse_arguments([sales_csv_path, "--by", "Cty"])
+    assert "unknown --by header(s) Cty" in capsys.readouterr().err
+    assert parse_arguments([sales_csv_path, "--by", "City"]).paths == [sales_csv_path]
@@ -0,0 +1,84 @@
+'''
+Incremental re-aggregation of append-only csv files (incremental.py): appends, partial lines and rewrites
+'''
+
+from functools import reduce
+
+from incremental import update_aggregates
+from sales_data import combine_accumulators, parse_CSV_stream
+import stream_analysis
+
+def read_lines(path):
+    with open(path, "rb") as csv_file:
+        return csv_file.read().splitlines(keepends=True)
+
+def write_bytes(path, content, mode="wb"):
+    with open(path, mode) as csv_file:
+        csv_file.write(content)
+
+def aggregate_whole_file(path):
+    '''
+    The aggregates of a single streamed pass over the whole file, the plain record path
+    '''
+    return stream_analysis.finalise_aggregates(
+        reduce(combine_accumulators(stream_analysis.question_accumulators), parse_CSV_stream(path), {})
+    )
+
+def test_appended_records_are_the_only_ones_read(sales_csv_path, tmp_path):
+    lines = read_lines(sales_csv_path)
+    path = str(tmp_path / "sales.csv")
+    write_bytes(path, b"".join(lines[:100]))
+
+    checkpoint, new_record_count = update_aggregates(path)
+    assert new_record_count == 99
+    write_bytes(path, b"".join(lines[100:]), "ab")
+    checkpoint, new_record_count = update_aggregates(path, checkpoint)
+
+    assert new_record_count == len(lines) - 100
+    assert checkpoint["record_count"] == len(lines) - 1
+    assert stream_analysis.finalise_aggregates(checkpoint["aggregates"]) == aggregate_whole_file(sales_csv_path)
+
+def test_nothing_appended_reads_nothing(sales_csv_copy):
+    checkpoint, _ = update_aggregates(sales_csv_copy)
+    updated_checkpoint, new_record_count = update_aggregates(sales_csv_copy, checkpoint)
+    assert new_record_count == 0
+    assert updated_checkpoint["offset"] == checkpoint["offset"]
+
+def test_partial_last_line_is_left_for_the_next_run(sales_csv_path, tmp_path):
+    lines = read_lines(sales_csv_path)
+    path = str(tmp_path / "sales.csv")
+    write_bytes(path, b"".join(lines[:50]) + lines[50][:10])
+
+    checkpoint, new_record_count = update_aggregates(path)
+    assert new_record_count == 49
+    write_bytes(path, lines[50][10:] + b"".join(lines[51:]), "ab")
+    checkpoint, _ = update_aggregates(path, checkpoint)
+
+    assert stream_analysis.finalise_aggregates(checkpoint["aggregates"]) == aggregate_whole_file(sales_csv_path)
+
+def test_rewritten_file_is_aggregated_again(sales_csv_copy):
+    checkpoint, _ = update_aggregates(sales_csv_copy)
+    # The same size and header, but a record before the offset changed
+    content = b"".join(read_lines(sales_csv_copy))
+    write_bytes(sales_csv_copy, content[:-200] + content[-200:].replace(b"Berlin", b"Bergen", 1))
+
+    checkpoint, new_record_count = update_aggregates(sales_csv_copy, checkpoint)
+    assert new_record_count == checkpoint["record_count"]
+    assert stream_analysis.finalise_aggregates(checkpoint["aggregates"]) == aggregate_whole_file(sales_csv_copy)
+
+def test_shorter_file_is_aggregated_again(sales_csv_copy):
+    checkpoint, _ = update_aggregates(sales_csv_copy)
+    lines = read_lines(sales_csv_copy)
+    write_bytes(sales_csv_copy, b"".join(lines[:-10]))
+
+    checkpoint, new_record_count = update_aggregates(sales_csv_copy, checkpoint)
+    assert new_record_count == len(lines) - 11
+    assert stream_analysis.finalise_aggregates(checkpoint["aggregates"]) == aggregate_whole_file(sales_csv_copy)
+
+def test_changed_header_is_aggregated_again(sales_csv_copy):
+    checkpoint, _ = update_aggregates(sales_csv_copy)
+    lines = read_lines(sales_csv_copy)
+    write_bytes(sales_csv_copy, lines[0].replace(b"Order ID", b"Order Id") + b"".join(lines[1:]))
+
+    checkpoint, new_record_count = update_aggregates(sales_csv_copy, checkpoint)
+    assert new_record_count == len(lines) - 1
@@ -0,0 +1,66 @@
+'''
+Bitmap indexes of the categorical columns (indexes.py), checked against a linear filter of the records
+'''
+
+from itertools import combinations
+
+from indexes import (
+    create_bitmap_index, create_indexed_filter_function_by_header, get_records_from_bitmap, get_row_ids, get_value_bitmap,
+    INDEXED_HEADERS,
+)
+from sales_data import create_analysis_context, create_filter_function_by_header
+
+def filter_linearly(records, header, values):
+    return [record for record in records if record[header] in values]
+
+def test_row_ids_are_the_set_bits():
+    assert list(get_row_ids(0)) == []
+    assert list(get_row_ids(0b1000000101)) == [0, 2, 9]
+    assert list(get_row_ids(1 << 200)) == [200]
+
+def test_every_value_matches_a_linear_filter(sales_records):
+    index = create_bitmap_index(sales_records)
+    for header in INDEXED_HEADERS:
+        values = {record[header] for record in sales_records}
+        assert set(index[header]) == values
+        for value in values:
+            assert get_records_from_bitmap(sales_records, get_value_bitmap(index, header, value)) == filter_linearly(sales_records, header, {value})
+
+def test_sets_of_values_match_a_linear_filter(sales_records):
+    index = create_bitmap_index(sales_records)
+    cities = sorted({record["City"] for record in sales_records})
+    for size in (2, 3):
+        for values in combinations(cities, size):
+            bitmap = get_value_bitmap(index, "City", set(values))
+            assert get_records_from_bitmap(sales_records, bitmap) == filter_linearly(sales_records, "City", set(values))
+
+def test_composite_filters_match_a_linear_filter(sales_records):
+    index = create_bitmap_index(sales_records)
+    bitmap = get_value_bitmap(index, "City", "London") & get_value_bitmap(index, "Payment Method", {"Cash", "Gift Card"})
+    expected = [
+        record for record in sales_records if record["City"] == "London" and record["Payment Method"] in {"Cash", "Gift Card"}
+    ]
+    assert expected
+    assert get_records_from_bitmap(sales_records, bitmap) == expected
+
+def test_unknown_value_matches_nothing(sales_records):
+    index = create_bitmap_index(sales_records)
+    assert get_value_bitmap(index, "City", "Atlantis") == 0
+    assert get_records_from_bitmap(sales_records, get_value_bitmap(index, "City", {"Atlantis"})) == []
+
+def test_indexed_filters_match_the_scanning_filters(sales_records):
+    create_indexed_filter = create_indexed_filter_function_by_header(sales_records, create_filter_function_by_header)
+    for header in INDEXED_HEADERS + ("Date",):
+        for value in {record[header] for record in sales_records}:
+            expected = create_filter_function_by_header(header)(value)(sales_records)
+            assert create_indexed_filter(header)(value)(sales_records) == expected
+    # Other data than the indexed one is scanned
+    subset = sales_records[::3]
+    assert create_indexed_filter("City")("London")(subset) == filter_linearly(subset, "City", {"London"})
+
+def test_context_filter_registry_matches_a_linear_filter(sales_csv_path, sales_records):
+    context = create_analysis_context(sales_csv_path)
+    for header in ("City", "Product"):
+        filter_functions = context["get_value_filter_functions"](header)
+        for value, get_filtered_list in zip(context["get_unique_values"](header), filter_functions):
+            assert get_filtered_list(context["data"]) == filter_linearly(sales_records, header, {value})
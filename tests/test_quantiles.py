@@ -0,0 +1,80 @@
+'''
+KLL quantile sketches (quantiles.py): rank error of the estimates, and merging
+'''
+
+from functools import reduce
+import math
+import random
+
+import pytest
+
+from quantiles import build_quantile_sketch, create_quantile_sketch, get_quantiles, merge_quantile_sketches
+from sales_data import combine_accumulators, create_group_by_function_by_header, get_record_quantity_fixed, parse_CSV_stream
+import stream_analysis
+
+VALUE_COUNT = 100000
+FRACTIONS = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+# The documented rank error is about 1 % of the values for the default k, the bound leaves room for the worst fraction
+MAXIMUM_RANK_ERROR = 0.02
+
+def get_shuffled_values(seed=0):
+    '''
+    The values 0 to VALUE_COUNT - 1 in a random order, so the rank of a value is the value itself
+    '''
+    values = list(range(VALUE_COUNT))
+    random.Random(seed).shuffle(values)
+    return values
+
+def assert_within_rank_error(quantiles):
+    for fraction, value in quantiles.items():
+        assert abs(value - fraction * VALUE_COUNT) <= MAXIMUM_RANK_ERROR * VALUE_COUNT, fraction
+
+def test_sketch_stays_small():
+    sketch = build_quantile_sketch(get_shuffled_values())
+    assert sketch["count"] == VALUE_COUNT
+    assert sum(map(len, sketch["levels"])) < 1000
+
+def test_quantiles_are_within_the_rank_error():
+    assert_within_rank_error(get_quantiles(build_quantile_sketch(get_shuffled_values()), FRACTIONS))
+
+def test_sorted_input_is_within_the_rank_error():
+    assert_within_rank_error(get_quantiles(build_quantile_sketch(range(VALUE_COUNT)), FRACTIONS))
+
+def test_small_sketches_are_exact():
+    sketch = build_quantile_sketch([5, 1, 4, 2, 3])
+    assert get_quantiles(sketch, (0.2, 0.6, 1.0)) == {0.2: 1, 0.6: 3, 1.0: 5}
+
+def test_empty_sketch_has_no_quantiles():
+    assert get_quantiles(create_quantile_sketch()) == {0.5: None, 0.9: None, 0.99: None}
+
+def test_merged_sketches_are_within_the_rank_error():
+    values = get_shuffled_values()
+    parts = [values[start:start + VALUE_COUNT // 8] for start in range(0, VALUE_COUNT, VALUE_COUNT // 8)]
+    merged = reduce(merge_quantile_sketches, map(build_quantile_sketch, parts))
+    assert merged["count"] == VALUE_COUNT
+    assert_within_rank_error(get_quantiles(merged, FRACTIONS))
+
+def test_merging_does_not_change_its_inputs():
+    left = build_quantile_sketch(range(1000))
+    right = build_quantile_sketch(range(1000, 3000))
+    left_levels = [list(values) for values in left["levels"]]
+    merge_quantile_sketches(left, right)
+    assert left["levels"] == left_levels
+
+def test_the_same_merges_give_the_same_sketch():
+    parts = [get_shuffled_values(seed)[:20000] for seed in range(3)]
+    first = reduce(merge_quantile_sketches, map(build_quantile_sketch, parts))
+    second = reduce(merge_quantile_sketches, map(build_quantile_sketch, parts))
+    assert first == second
+
+def test_sketches_of_another_k_are_not_merged():
+    with pytest.raises(ValueError):
+        merge_quantile_sketches(create_quantile_sketch(200), create_quantile_sketch(100))
+
+def test_streamed_percentiles_match_the_records(sales_csv_path, sales_records):
+    # Each product has far fewer orders than k, so its sketch holds every value and the percentiles are exact
+    aggregates = reduce(combine_accumulators(stream_analysis.question_accumulators), parse_CSV_stream(sales_csv_path), {})
+    for product, records in create_group_by_function_by_header("Product")(sales_records).items():
+        quantities = sorted(map(get_record_quantity_fixed, records))
+        for fraction, value in get_quantiles(aggregates["product_quantity_quantiles"][product]).items():
+            assert value == quantities[math.ceil(fraction * len(quantities)) - 1]
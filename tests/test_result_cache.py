@@ -0,0 +1,118 @@
+'''
+Fingerprint-keyed result cache (result_cache.py): hits, invalidation by column, and eviction
+'''
+
+from functools import reduce
+import os
+
+from analysis_runner import get_cache_requests
+from result_cache import calculate_column_fingerprints, create_result_cache, get_result_path, memoize_results
+from sales_data import (
+    combine_accumulators, create_group_aggregate_function_by_header, fixed_to_float, get_record_revenue_fixed,
+    parse_CSV_sanitised, parse_CSV_stream, read_CSV_header, REVENUE_SCALE,
+)
+import stream_analysis
+
+def get_question_results(path, questions, computed, **cache_options):
+    '''
+    Get the results of the questions through the cache, recording the names of the analyses that had to be computed
+    '''
+    def compute_missing(names):
+        computed.extend(names)
+        totals = stream_analysis.finalise_aggregates(
+            reduce(combine_accumulators(stream_analysis.question_accumulators), parse_CSV_stream(path), {})
+        )
+        return {
+            name: {aggregate_name: totals[aggregate_name] for aggregate_name in stream_analysis.question_aggregate_names[int(name[-1])]}
+            for name in names
+        }
+    cache = create_result_cache(path, **cache_options)
+    return memoize_results(cache, get_cache_requests(questions, []), compute_missing)
+
+def rewrite_file(path, old, new):
+    '''
+    Replace some bytes of a file, moving its modification time so the change is noticed
+    '''
+    with open(path, "rb") as csv_file:
+        content = csv_file.read()
+    assert old in content
+    with open(path, "wb") as csv_file:
+        csv_file.write(content.replace(old, new))
+    status = os.stat(path)
+    os.utime(path, ns=(status.st_atime_ns, status.st_mtime_ns + 10 ** 9))
+
+def get_manager_revenue(path):
+    '''
+    The revenue of each manager from the plain record path
+    '''
+    revenue = create_group_aggregate_function_by_header("Manager")(get_record_revenue_fixed)(parse_CSV_sanitised(path)[1])
+    return {manager: fixed_to_float(total, REVENUE_SCALE) for manager, total in revenue.items()}
+
+def test_results_are_computed_once(sales_csv_copy):
+    computed = []
+    first = get_question_results(sales_csv_copy, [3, 4], computed)
+    second = get_question_results(sales_csv_copy, [3, 4], computed)
+    assert computed == ["question_3", "question_4"]
+    assert first == second
+    assert second["question_3"]["manager_revenue"] == get_manager_revenue(sales_csv_copy)
+
+def test_touched_file_keeps_the_results(sales_csv_copy):
+    computed = []
+    get_question_results(sales_csv_copy, [3, 4], computed)
+    rewrite_file(sales_csv_copy, b"Fries", b"Fries")
+    get_question_results(sales_csv_copy, [3, 4], computed)
+    assert computed == ["question_3", "question_4"]
+
+def test_only_the_results_of_a_changed_column_are_invalidated(sales_csv_copy):
+    computed = []
+    get_question_results(sales_csv_copy, [3, 4], computed)
+    rewrite_file(sales_csv_copy, b"Walter Muller", b"Walter Miller")
+
+    results = get_question_results(sales_csv_copy, [3, 4], computed)
+    assert computed == ["question_3", "question_4", "question_3"]
+    assert results["question_3"]["manager_revenue"] == get_manager_revenue(sales_csv_copy)
+
+def test_parameters_are_part_of_the_key(sales_csv_copy):
+    cache = create_result_cache(sales_csv_copy)
+    unfiltered = get_cache_requests([3], [])
+    filtered = get_cache_requests([3], [("City", {"London"})])
+    computed = []
+    memoize_results(cache, unfiltered, lambda names: computed.extend(names) or {name: name for name in names})
+    memoize_results(cache, filtered, lambda names: computed.extend(names) or {name: name for name in names})
+    assert computed == ["question_3", "question_3"]
+
+def test_fingerprints_are_keyed_by_the_sanitised_headers(tmp_path):
+    path = str(tmp_path / "sales.csv")
+    with open(path, "w", newline="") as csv_file:
+        csv_file.write(" Order   ID ,Manager \n1,Tom Jackson\n2,Pablo Perez\n")
+    assert sorted(calculate_column_fingerprints(path)) == sorted(read_CSV_header(path))
+
+def test_fields_after_a_short_row_are_fingerprinted(tmp_path):
+    path = str(tmp_path / "sales.csv")
+    with open(path, "w", newline="") as csv_file:
+        csv_file.write("Order ID,Manager,City\n1,Tom Jackson\n2,Pablo Perez,Madrid\n")
+    fingerprints = calculate_column_fingerprints(path)
+    rewrite_file(path, b"Madrid", b"Lisbon")
+    changed_fingerprints = calculate_column_fingerprints(path)
+    assert changed_fingerprints["City"] != fingerprints["City"]
+    assert changed_fingerprints["Manager"] == fingerprints["Manager"]
+
+def test_corrupt_result_is_computed_again(sales_csv_copy):
+    computed = []
+    get_question_results(sales_csv_copy, [3], computed)
+    cache = create_result_cache(sales_csv_copy)
+    (key,) = cache["index"]["entries"]
+    with open(get_result_path(cache["directory"], key), "wb") as result_file:
+        result_file.write(b"not a pickle")
+
+    results = get_question_results(sales_csv_copy, [3], computed)
+    assert computed == ["question_3", "question_3"]
+    assert results["question_3"]["manager_revenue"] == get_manager_revenue(sales_csv_copy)
+
+def test_least_recently_used_results_are_evicted(sales_csv_copy):
+    computed = []
+    get_question_results(sales_csv_copy, [3], computed, max_entries=1)
+    get_question_results(sales_csv_copy, [4], computed, max_entries=1)
+    get_question_results(sales_csv_copy, [4], computed, max_entries=1)
+    get_question_results(sales_csv_copy, [3], computed, max_entries=1)
+    assert computed == ["question_3", "question_4", "question_3"]
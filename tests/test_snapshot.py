@@ -0,0 +1,90 @@
+'''
+Binary snapshot of the columnar table (snapshot.py): warm loads, staleness and corruption recovery
+'''
+
+import os
+
+import pytest
+
+from columnar import get_record
+from sales_data import parse_CSV_sanitised, parse_fixed_point, PRICE_SCALE, QUANTITY_SCALE
+from snapshot import get_default_snapshot_path, load_table, read_snapshot
+
+def assert_table_matches_the_records(table, records):
+    assert table["length"] == len(records)
+    for index, record in enumerate(records):
+        table_record = get_record(table, index)
+        assert parse_fixed_point(table_record.pop("Price"), PRICE_SCALE) == parse_fixed_point(record["Price"], PRICE_SCALE)
+        assert parse_fixed_point(table_record.pop("Quantity"), QUANTITY_SCALE) == parse_fixed_point(record["Quantity"], QUANTITY_SCALE)
+        assert table_record == {header: value for header, value in record.items() if header not in ("Price", "Quantity")}
+
+def rewrite_file(path, old, new):
+    '''
+    Replace some bytes of a file, keeping its size, and move its modification time so the change is noticed
+    '''
+    with open(path, "rb") as csv_file:
+        content = csv_file.read()
+    assert len(old) == len(new) and old in content
+    with open(path, "wb") as csv_file:
+        csv_file.write(content.replace(old, new, 1))
+    status = os.stat(path)
+    os.utime(path, ns=(status.st_atime_ns, status.st_mtime_ns + 10 ** 9))
+
+def test_snapshot_is_written_then_mapped(sales_csv_copy, sales_records):
+    cold_table = load_table(sales_csv_copy)
+    assert "snapshot" not in cold_table
+    assert os.path.exists(get_default_snapshot_path(sales_csv_copy))
+
+    warm_table = load_table(sales_csv_copy)
+    assert "snapshot" in warm_table
+    assert_table_matches_the_records(cold_table, sales_records)
+    assert_table_matches_the_records(warm_table, sales_records)
+
+def test_appended_file_rebuilds_the_snapshot(sales_csv_copy):
+    load_table(sales_csv_copy)
+    with open(sales_csv_copy, "a", newline="") as csv_file:
+        csv_file.write("99999,31-12-2022,Fries,3.49,1.5,Online,Cash,Tom Jackson,London\n")
+
+    table = load_table(sales_csv_copy)
+    assert_table_matches_the_records(table, parse_CSV_sanitised(sales_csv_copy)[1])
+    assert "snapshot" in load_table(sales_csv_copy)
+
+def test_same_size_rewrite_rebuilds_the_snapshot(sales_csv_copy):
+    load_table(sales_csv_copy)
+    rewrite_file(sales_csv_copy, b"London", b"Lisbon")
+
+    assert_table_matches_the_records(load_table(sales_csv_copy), parse_CSV_sanitised(sales_csv_copy)[1])
+
+def test_touched_file_keeps_the_snapshot(sales_csv_copy):
+    load_table(sales_csv_copy)
+    source_key = read_snapshot(get_default_snapshot_path(sales_csv_copy))[0]
+    rewrite_file(sales_csv_copy, b"London", b"London")
+
+    # The content hash still matches, so the mapped snapshot is used
+    assert "snapshot" in load_table(sales_csv_copy)
+    assert read_snapshot(get_default_snapshot_path(sales_csv_copy))[0] == source_key
+
+@pytest.mark.parametrize("corrupt", [
+    lambda content: b"",
+    lambda content: content[:len(content) // 2],
+    lambda content: content[:20],
+    lambda content: b"garbage" * 100,
+    lambda content: content[:16] + b"\xff" * 32 + content[48:],
+], ids=["empty", "truncated", "truncated metadata", "garbage", "corrupt metadata"])
+def test_corrupt_snapshot_is_rebuilt(sales_csv_copy, sales_records, corrupt):
+    load_table(sales_csv_copy)
+    snapshot_path = get_default_snapshot_path(sales_csv_copy)
+    with open(snapshot_path, "rb") as snapshot_file:
+        content = snapshot_file.read()
+    with open(snapshot_path, "wb") as snapshot_file:
+        snapshot_file.write(corrupt(content))
+
+    assert read_snapshot(snapshot_path) is None
+    assert_table_matches_the_records(load_table(sales_csv_copy), sales_records)
+    assert read_snapshot(snapshot_path) is not None
+
+def test_empty_file_gives_an_empty_table(tmp_path):
+    path = str(tmp_path / "empty.csv")
+    open(path, "w").close()
+    assert load_table(path)["length"] == 0
+    assert load_table(path)["length"] == 0
@@ -0,0 +1,56 @@
+'''
+Streaming parser and single-pass aggregation (sales_data.parse_CSV_stream() and stream_analysis.py), checked against
+the records parsed as a list
+'''
+
+from functools import reduce
+from itertools import islice
+import types
+
+import pytest
+
+from sales_data import (
+    combine_accumulators, count_record, create_group_aggregate_function_by_header, create_value_filter, fixed_to_float,
+    get_record_revenue_fixed, parse_CSV_stream, REVENUE_SCALE,
+)
+import stream_analysis
+
+def test_stream_yields_the_same_records(sales_csv_path, sales_records):
+    records = parse_CSV_stream(sales_csv_path)
+    assert isinstance(records, types.GeneratorType)
+    assert list(records) == sales_records
+
+def test_stream_is_lazy(sales_csv_path, sales_records):
+    records = parse_CSV_stream(sales_csv_path)
+    assert list(islice(records, 3)) == sales_records[:3]
+    records.close()
+
+def test_projection_and_filters_match_the_records(sales_csv_path, sales_records):
+    columns = ["City", "Price", "Quantity"]
+    records = list(parse_CSV_stream(sales_csv_path, columns, {"Payment Method": create_value_filter({"Cash"})}))
+    expected = [
+        {header: record[header] for header in columns} for record in sales_records if record["Payment Method"] == "Cash"
+    ]
+    assert records == expected
+
+def test_unknown_projected_header_is_rejected(sales_csv_path):
+    with pytest.raises(ValueError, match="Unknown headers"):
+        list(parse_CSV_stream(sales_csv_path, ["Cty"]))
+
+@pytest.mark.parametrize("content", ["", "Order ID,Date,Product,Price,Quantity,Purchase Type,Payment Method,Manager,City\n", "\n\n"])
+def test_empty_files_stream_no_records(tmp_path, content):
+    path = tmp_path / "sales.csv"
+    path.write_text(content)
+    assert list(parse_CSV_stream(str(path))) == []
+    assert list(parse_CSV_stream(str(path), ["City"])) == []
+
+def test_streamed_aggregates_match_the_records(sales_csv_path, sales_records):
+    aggregates = reduce(combine_accumulators(stream_analysis.question_accumulators), parse_CSV_stream(sales_csv_path), {})
+    totals = stream_analysis.finalise_aggregates(aggregates)
+
+    for name, header in [("city_revenue", "City"), ("manager_revenue", "Manager"), ("product_revenue", "Product")]:
+        expected = create_group_aggregate_function_by_header(header)(get_record_revenue_fixed)(sales_records)
+        assert aggregates[name] == expected
+        assert totals[name] == {key: fixed_to_float(total, REVENUE_SCALE) for key, total in expected.items()}
+    assert totals["total_revenue"] == fixed_to_float(sum(map(get_record_revenue_fixed, sales_records)), REVENUE_SCALE)
+    assert aggregates["payment_count"] == create_group_aggregate_function_by_header("Payment Method")(count_record)(sales_records)
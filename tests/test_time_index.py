@@ -0,0 +1,64 @@
+'''
+Time-bucket index of the "Date" column (time_index.py), checked against filtering the records on their dates
+'''
+
+from datetime import date
+
+from columnar import create_table_context, parse_CSV_columnar
+from sales_data import create_analysis_context, get_month_from_record
+from time_index import (
+    create_date_range_filter, create_time_index, get_time_bucket_keys, get_time_bucket_keys_in_order, get_time_bucket_records,
+    get_time_index, parse_date_ordinal,
+)
+
+def get_day(record):
+    day, month, year = record["Date"].split("-")
+    return date(int(year), int(month), int(day))
+
+def test_bucket_keys_are_year_aware():
+    assert get_time_bucket_keys(date(2022, 11, 7).toordinal()) == {
+        "day": "2022-11-07", "week": "2022-W45", "month": "2022-11", "quarter": "2022-Q4", "year": "2022",
+    }
+    # The first days of 2022 belong to the last ISO week of 2021
+    assert get_time_bucket_keys(date(2022, 1, 1).toordinal())["week"] == "2021-W52"
+    assert parse_date_ordinal("01-01-2023") == date(2023, 1, 1).toordinal()
+
+def test_month_buckets_match_a_filter_on_the_records(sales_records):
+    time_index = create_time_index([record["Date"] for record in sales_records])
+    months = sorted({get_month_from_record(record) for record in sales_records})
+    assert get_time_bucket_keys_in_order(time_index, "month") == months
+    for month in months:
+        expected = [record for record in sales_records if get_month_from_record(record) == month]
+        records = get_time_bucket_records(sales_records, time_index, "month", month)
+        # The records of a bucket are in order of their day (the records of the same day keep their order)
+        assert records == sorted(expected, key=get_day)
+
+def test_every_granularity_covers_every_record_once(sales_records):
+    time_index = create_time_index([record["Date"] for record in sales_records])
+    for granularity, buckets in time_index["buckets"].items():
+        positions = [
+            position for key in get_time_bucket_keys_in_order(time_index, granularity)
+            for position in get_time_bucket_records(range(len(sales_records)), time_index, granularity, key)
+        ]
+        assert sorted(positions) == list(range(len(sales_records))), granularity
+        for key in buckets:
+            for record in get_time_bucket_records(sales_records, time_index, granularity, key):
+                assert get_time_bucket_keys(get_day(record).toordinal())[granularity] == key
+
+def test_missing_bucket_is_empty(sales_records):
+    time_index = create_time_index([record["Date"] for record in sales_records])
+    assert get_time_bucket_records(sales_records, time_index, "month", "1999-01") == []
+
+def test_date_range_filter_matches_the_days(sales_records):
+    is_within_range = create_date_range_filter("2022-11-15", "2022-11-30")
+    expected = [record for record in sales_records if date(2022, 11, 15) <= get_day(record) <= date(2022, 11, 30)]
+    assert expected
+    assert [record for record in sales_records if is_within_range(record["Date"])] == expected
+    assert all(map(create_date_range_filter(), (record["Date"] for record in sales_records)))
+
+def test_record_and_table_contexts_have_the_same_index(sales_csv_path):
+    record_context = create_analysis_context(sales_csv_path)
+    table_context = create_table_context(sales_csv_path, parse_CSV_columnar(sales_csv_path))
+    assert get_time_index(record_context) == get_time_index(table_context)
+    # The index is kept in the context
+    assert get_time_index(record_context) is get_time_index(record_context)